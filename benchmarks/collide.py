@@ -0,0 +1,111 @@
+""" Compare RiceRocks' collision broad phase with the plain nested loop.
+
+Run from the repository root:
+
+    python benchmarks/collide.py [--missiles N] [--frames N] [ROCKS ...]
+
+Both strategies run the same exact circle test on the same scene, so the
+report also checks that they find the same number of hits.
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "ricerocks")]
+
+import spatial  # noqa: E402
+
+WIDTH, HEIGHT = 800, 600
+COLLISION_CELL = 100
+ROCK_RADIUS, MISSILE_RADIUS = 40, 2
+
+
+class Body:
+    """ Stand-in for a Sprite with just what the collision code reads. """
+
+    def __init__(self, pos, radius):
+        self.pos = pos
+        self.radius = radius
+
+    def get_position(self):
+        return self.pos
+
+    def get_radius(self):
+        return self.radius
+
+    def collide(self, other_object):
+        other = other_object.get_position()
+        return self.radius + other_object.get_radius() > math.sqrt(
+            (self.pos[0] - other[0]) ** 2 + (self.pos[1] - other[1]) ** 2)
+
+
+def scatter(count, radius, rng):
+    """ Return count bodies spread uniformly over the canvas. """
+    return [Body([rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT)], radius)
+            for _ in range(count)]
+
+
+def nested_loop(group, other_group):
+    """ Count colliding pairs the way group_collide used to. """
+    hits = 0
+    for sprite in group:
+        for other_sprite in other_group:
+            if sprite.collide(other_sprite):
+                hits += 1
+    return hits
+
+
+def broad_phase(group, other_group, grid):
+    """ Count colliding pairs among the grid's candidates only. """
+    hits = 0
+    for sprite, other_sprite in grid.candidate_pairs(group, other_group):
+        if sprite.collide(other_sprite):
+            hits += 1
+    return hits
+
+
+def measure(func, frames):
+    """ Return the best per-call time of func in milliseconds. """
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat=3, number=frames)) / frames * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rocks", nargs="*", type=int,
+                        default=[12, 500, 5000])
+    parser.add_argument("--missiles", type=int, default=60,
+                        help="missiles alive per frame (default: 60)")
+    parser.add_argument("--frames", type=int, default=5,
+                        help="frames timed per repetition (default: 5)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    grid = spatial.SpatialHash(COLLISION_CELL, WIDTH, HEIGHT)
+    print("%8s %9s %14s %14s %8s" % (
+        "rocks", "missiles", "nested (ms)", "grid (ms)", "speedup"))
+    for count in args.rocks:
+        rng = random.Random(args.seed)
+        rocks = scatter(count, ROCK_RADIUS, rng)
+        missiles = scatter(args.missiles, MISSILE_RADIUS, rng)
+
+        expected = nested_loop(rocks, missiles)
+        found = broad_phase(rocks, missiles, grid)
+        if found != expected:
+            sys.exit("Mismatch at %i rocks: %i hits vs %i"
+                     % (count, found, expected))
+
+        nested = measure(lambda: nested_loop(rocks, missiles), args.frames)
+        hashed = measure(lambda: broad_phase(rocks, missiles, grid),
+                         args.frames)
+        print("%8i %9i %14.3f %14.3f %7.1fx" % (
+            count, args.missiles, nested, hashed, nested / hashed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+""" Measure how many RiceRocks ticks the headless engine runs per second.
+
+Run from the repository root:
+
+    python benchmarks/engine.py [--ticks N] [--seed N] [--rocks N]
+
+The ship turns and fires on a fixed pattern so rocks, missiles and
+explosions are all alive, which is what a typical game looks like.
+--rocks drops that many rocks at once instead, as a stress test.
+
+"default" is the engine as the game builds it, which only keeps groups
+of STORE_MIN_CAPACITY sprites or more in NumPy stores; "ecs" never uses
+a store, and "store", run when NumPy is available, puts every group in
+one, to check where the threshold should be.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "ricerocks")]
+
+import engine  # noqa: E402
+import spawn  # noqa: E402
+import store  # noqa: E402
+
+TARGET = 10000  # Ticks per second
+
+
+def play(game, ticks):
+    """ Run ticks of scripted play and return the elapsed seconds. """
+    game.start()
+    game.press("left")
+    begin = time.time()
+    for count in range(ticks):
+        if count % 10 == 0:
+            game.press("fire")
+        game.tick()
+        if not game.started:
+            game.start()
+            game.press("left")
+    return time.time() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=60000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rocks", type=int, default=0)
+    args = parser.parse_args()
+
+    default = engine.STORE_MIN_CAPACITY
+    backends = [("default", True, default), ("ecs", False, default)]
+    if store.available():
+        backends.append(("store", True, 0))
+    for name, use_store, store_min_capacity in backends:
+        engine.STORE_MIN_CAPACITY = store_min_capacity
+        schedule = spawn.Burst(args.rocks) if args.rocks else None
+        game = engine.Engine(seed=args.seed, use_store=use_store,
+                             schedule=schedule)
+        elapsed = play(game, args.ticks)
+        rate = args.ticks / elapsed
+        print("%-7s %9.0f ticks/s  %s (target %i)" % (
+            name, rate, "ok" if rate >= TARGET else "SLOW", TARGET))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+""" Measure what one frame of each game costs, and catch regressions.
+
+Run from the repository root:
+
+    python benchmarks/frames.py [--frames N] [--save] [SCENARIO ...]
+
+Every game runs on the headless simplegui backend, so a frame is the
+game's draw handler plus whatever timers fire during it, drawn on a
+canvas that only records calls. Each scenario puts a game in a defined
+state first, then times every frame and reports latency percentiles and
+peak bytes: how far the memory traced during a frame rose above where it
+started, averaged over frames (Python 3 only). That is a proxy for what
+a frame allocates, in bytes, not a count of allocations.
+
+--save writes the results to the baseline file. Otherwise, when the
+baseline exists, the run fails if a scenario's p99 frame time grew by
+more than --threshold, and by at least --min-delta ms so that timer
+noise on sub-microsecond frames is not a failure. Timings depend on the
+machine, so keep one baseline per machine.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT]
+
+from common import headless  # noqa: E402
+
+headless.install()
+
+BASELINE = os.path.join(ROOT, "benchmarks", "frames-baseline.json")
+THRESHOLD = .25  # Allowed p99 growth over the baseline
+MIN_DELTA = .05  # ms of p99 growth that is always tolerated
+STRESS_ROCKS = 150
+
+clock = getattr(time, "perf_counter", time.time)
+
+
+def load(game):
+    """ Import a game on the headless backend; return it and its frame. """
+    # Ahead of this folder, which has modules with the same names
+    sys.path.insert(0, os.path.join(ROOT, game))
+    module = __import__(game)
+    frame = headless.frames[-1]
+    frame.run(1)  # The loading screen finishes on the first frame
+    return module, frame
+
+
+def ricerocks_stress():
+    """ A crowd of rocks around a ship that spins and keeps firing. """
+    ricerocks, frame = load("ricerocks")
+    engine = sys.modules["engine"]  # The game's, not benchmarks/engine.py
+    game = ricerocks.game
+    game.pools["rocks"].capacity = STRESS_ROCKS
+    frame.click((engine.WIDTH / 2, engine.HEIGHT / 2))  # On the splash
+    frame.key_down("left")
+
+    def step(index):
+        game.lives = engine.LIVES  # Nobody wants a game over here
+        while len(game.sprites["rocks"]) < STRESS_ROCKS:
+            game.spawn_rock()
+        if index % 10 == 0:
+            frame.key_down("space")
+
+    # Make sure the load is the one measured: a game in play, firing
+    for index in range(30):
+        step(index)
+        frame.run(1)
+    # Missiles in this crowd hit a rock at once, so count the shots
+    if not game.started or not game.shots_fired:
+        raise RuntimeError("ricerocks_stress: the ship is not firing")
+    return frame, step
+
+
+def pong_rally():
+    """ Both paddles return a ball moving at VEL_LIMIT. """
+    pong, frame = load("pong")
+    frame.run(60 * 5)  # Wait out the countdown
+    pong.ball.set("vx", pong.VEL_LIMIT * (
+        1 if pong.ball.get("vx") > 0 else -1))
+
+    def step(index):
+        # Paddles follow the ball, so the rally never ends
+        y = min(max(pong.ball.get("y"), pong.HALF_PAD_HEIGHT),
+                pong.HEIGHT - pong.HALF_PAD_HEIGHT)
+        for paddle in pong.paddles:
+            paddle.set("y", y)
+    return frame, step
+
+
+def blackjack_mid_hand():
+    """ A hand in play, after the player hit once. """
+    blackjack, frame = load("blackjack")
+    frame.button("Deal").click()
+    frame.button("Hit").click()
+    return frame, None
+
+
+def memoji_exposed():
+    """ A board with every tile face up. """
+    memoji, frame = load("memoji")
+    for tile in memoji.my_tiles:
+        tile.expose_tile()
+    return frame, None
+
+
+def stopwatch_running():
+    """ The stopwatch counting, with its 100 ms timer firing. """
+    stopwatch, frame = load("stopwatch")
+    frame.button("Start").click()
+    return frame, None
+
+
+SCENARIOS = [
+    ("ricerocks_stress", ricerocks_stress),
+    ("pong_rally", pong_rally),
+    ("blackjack_mid_hand", blackjack_mid_hand),
+    ("memoji_exposed", memoji_exposed),
+    ("stopwatch_running", stopwatch_running)]
+
+
+def percentile(ordered, fraction):
+    """ Return the nearest-rank percentile of a sorted list. """
+    index = int(round(fraction * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def measure(frame, step, frames, warmup):
+    """ Return the frame times in ms and the mean peak bytes per frame,
+    how far traced memory rose above its level at the frame's start. """
+    for index in range(warmup):
+        if step:
+            step(index)
+        frame.run(1)
+
+    times = []
+    for index in range(frames):
+        if step:
+            step(index)
+        begin = clock()
+        frame.run(1)
+        times.append((clock() - begin) * 1000)
+
+    peak = None
+    if tracemalloc is not None:
+        samples = min(frames, 200)
+        total = 0
+        tracemalloc.start()
+        for index in range(samples):
+            if step:
+                step(index)
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            frame.run(1)
+            total += tracemalloc.get_traced_memory()[1] - current
+        tracemalloc.stop()
+        peak = total // samples
+    return times, peak
+
+
+def summarize(times, peak):
+    ordered = sorted(times)
+    return {"p50": percentile(ordered, .50), "p95": percentile(ordered, .95),
+            "p99": percentile(ordered, .99), "max": ordered[-1],
+            "mean": sum(times) / len(times), "peak_bytes": peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                        help="any of: %s (default: all)" % ", ".join(
+                            name for name, _ in SCENARIOS))
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA)
+    parser.add_argument("--save", action="store_true",
+                        help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    chosen = [(name, setup) for name, setup in SCENARIOS
+              if not args.scenarios or name in args.scenarios]
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results, regressions = {}, []
+    print("%-20s %8s %8s %8s %8s %10s" % (
+        "scenario", "p50 ms", "p95 ms", "p99 ms", "max ms", "peak bytes"))
+    for name, setup in chosen:
+        random.seed(args.seed)
+        frame, step = setup()
+        result = summarize(*measure(frame, step, args.frames, args.warmup))
+        results[name] = result
+        line = "%-20s %8.3f %8.3f %8.3f %8.3f %10s" % (
+            name, result["p50"], result["p95"], result["p99"],
+            result["max"], result["peak_bytes"])
+
+        previous = baseline.get(name)
+        if previous and not args.save:
+            limit = max(previous["p99"] * (1 + args.threshold),
+                        previous["p99"] + args.min_delta)
+            if result["p99"] > limit:
+                regressions.append(name)
+                line += "  REGRESSION (p99 limit %.3f)" % limit
+        print(line)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=1, sort_keys=True)
+        print("Saved baseline to %s" % args.baseline)
+    elif not baseline:
+        print("No baseline at %s; run with --save to make one" % args.baseline)
+    if regressions:
+        sys.exit("p99 frame time regressed in: %s" % ", ".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+""" Follow Blackjack bankrolls over whole sessions, across processes.
+
+simulate.py counts rounds at one bet each; this module replays the
+money instead. Every session starts with the GUI's cash and plays the
+table's betting rules to the letter (rules.py): the entry bet is set
+again whenever the cash seen is a multiple of STARTING_CASH, even in the
+middle of a round, and the raises offered are rescaled before a round
+only while the cash is at least RAISE_CASH, keeping stale offers below.
+A session is ruined once the player cannot pay the entry bet, which may
+happen with money left, and ends after a number of rounds otherwise.
+
+Each round, after the deal, a bettor picks a raise:
+
+    bettor(table, hand, upcard) -> amount
+
+where table is the session's Table, and amount one of table.raises,
+table.cash to go all in, or 0; a raise the player cannot afford is
+refused, as in the GUI. The hand is then played by a strategy of
+simulate.py.
+
+Sessions are split in shards seeded as simulate.py does, and run on a
+process pool. Every shard that finishes prints a JSON line with the
+running results, so long runs can be watched as they go: the risk of
+ruin by round, the percentiles of the final bankrolls, and those of the
+rounds played before ruin:
+
+    PYTHONPATH=. python blackjack/bankroll.py --bettor small --sessions 5000
+
+Bettors are named in BETTORS, or given as module:function.
+"""
+
+import argparse
+import bisect
+import importlib
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+import rules
+import simulate
+
+SESSIONS = 2000
+ROUNDS = 1000  # Rounds a session lasts, unless the player is ruined
+SHARD = 100  # Sessions per task sent to a worker
+CURVE_POINTS = 10  # Rounds at which the risk of ruin is reported
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class Table:
+    """ The player's money at the table, as the GUI keeps track of it. """
+
+    def __init__(self, cash=rules.STARTING_CASH):
+        self.cash = cash
+        self.entry_bet = rules.INITIAL_BET
+        self.raises = list(rules.RAISES)
+        self.stake = 0  # What the player put in the round in play
+        self.look()
+
+    def look(self):
+        """ Do what the GUI's draw handler does with the cash it sees. """
+        self.entry_bet = rules.next_entry_bet(self.cash, self.entry_bet)
+
+    def spend(self, value):
+        """ Put value of the player's cash in the round. """
+        self.cash -= value
+        self.stake += value
+        self.look()
+
+    def deal(self):
+        """ Pay the entry bet; return False if the player cannot. """
+        if self.cash >= rules.RAISE_CASH:
+            self.raises = rules.raise_values(self.cash)
+        if self.cash < self.entry_bet:
+            return False
+        self.spend(self.entry_bet)
+        return True
+
+    def raise_bet(self, value):
+        """ Raise the stake by value; return False if it is refused. """
+        if value > self.cash:
+            return False
+        self.spend(value)
+        return True
+
+    def settle(self, outcome):
+        """ Pay the player for a round with outcome, and end it. """
+        # The dealer covers every dollar of the stake
+        if outcome == rules.WIN:
+            self.cash += 2 * self.stake
+        elif outcome == rules.PUSH:
+            self.cash += self.stake
+        self.stake = 0
+        self.look()
+
+
+# Built-in bettors
+def flat(table, hand, upcard):
+    """ Never raise. """
+    return 0
+
+
+def small(table, hand, upcard):
+    """ Always take the smallest raise offered. """
+    return table.raises[0]
+
+
+def big(table, hand, upcard):
+    """ Always take the biggest raise offered. """
+    return table.raises[-1]
+
+
+def all_in(table, hand, upcard):
+    """ Bet everything, every round. """
+    return table.cash
+
+
+BETTORS = {"flat": flat, "small": small, "big": big, "all_in": all_in}
+
+
+def load_bettor(name):
+    """ Return the bettor called name, or the module:function it names. """
+    if name in BETTORS:
+        return BETTORS[name]
+    module, _, function = name.partition(":")
+    return getattr(importlib.import_module(module), function)
+
+
+def play_session(rng, strategy, bettor, rounds):
+    """ Play a session with a deck of its own.
+
+    Return the rounds played and the final cash, along with whether the
+    player was ruined.
+    """
+    deck = rules.Deck(rng)
+    table = Table()
+    for played in range(rounds):
+        if not table.deal():
+            return played, table.cash, True
+        player_hand, dealer_hand = rules.Hand("player"), rules.Hand("dealer")
+        rules.deal(deck, player_hand, dealer_hand)
+        amount = bettor(table, player_hand, rules.upcard(dealer_hand))
+        if amount:
+            table.raise_bet(amount)
+        table.settle(simulate.play_hands(deck, player_hand, dealer_hand,
+                                         strategy))
+    return rounds, table.cash, False
+
+
+def run_shard(task):
+    """ Play a shard's sessions in a worker; return the shard and, for
+    each session, the rounds before ruin, or None, and the final cash. """
+    strategy_name, bettor_name, seed, shard, sessions, rounds = task
+    strategy = simulate.load_strategy(strategy_name)
+    bettor = load_bettor(bettor_name)
+    rng = random.Random(simulate.shard_seed(seed, shard))
+    ruins, finals = [], []
+    for _ in range(sessions):
+        played, cash, ruined = play_session(rng, strategy, bettor, rounds)
+        ruins.append(played if ruined else None)
+        finals.append(cash)
+    return shard, ruins, finals
+
+
+def run_batch(strategy_name, bettor_name, sessions, rounds=ROUNDS, seed=0,
+              workers=None, shard=SHARD):
+    """ Yield (shard, ruins, finals) for every shard, in the order they
+    finish. """
+    # Fail here rather than in every worker
+    simulate.load_strategy(strategy_name)
+    load_bettor(bettor_name)
+    tasks = [(strategy_name, bettor_name, seed, index,
+              min(shard, sessions - start), rounds)
+             for index, start in enumerate(range(0, sessions, shard))]
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap_unordered(run_shard, tasks):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def percentiles(values, points=PERCENTILES):
+    """ Return the nearest-rank percentiles of values, by point. """
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    return dict(("p%i" % point, ordered[max(
+        int(math.ceil(point / 100.0 * len(ordered))) - 1, 0)])
+        for point in points)
+
+
+class Ledger:
+    """ The sessions of many shards, summed up as they come. """
+
+    def __init__(self, rounds):
+        self.rounds = rounds
+        self.ruins = []  # Rounds played before ruin, kept sorted
+        self.finals = []
+
+    def add(self, ruins, finals):
+        for played in ruins:
+            if played is not None:
+                bisect.insort(self.ruins, played)
+        self.finals.extend(finals)
+
+    def sessions(self):
+        return len(self.finals)
+
+    def ruin_curve(self):
+        """ Return [round, share of the sessions ruined by then] pairs. """
+        sessions = float(max(self.sessions(), 1))
+        return [[played, bisect.bisect_right(self.ruins, played) / sessions]
+                for played in (self.rounds * point // CURVE_POINTS
+                               for point in range(1, CURVE_POINTS + 1))]
+
+    def summary(self):
+        """ Return the risk of ruin, its curve, and the percentiles of the
+        final bankrolls and of the rounds before ruin. """
+        sessions = max(self.sessions(), 1)
+        bankroll = percentiles(self.finals)
+        bankroll["mean"] = sum(self.finals) / float(sessions)
+        bankroll["ahead"] = sum(
+            1 for cash in self.finals
+            if cash > rules.STARTING_CASH) / float(sessions)
+        return {"sessions": self.sessions(),
+                "ruin": len(self.ruins) / float(sessions),
+                "ruin_curve": self.ruin_curve(),
+                "bankroll": bankroll,
+                "rounds_to_ruin": percentiles(self.ruins)}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Estimate the risk of ruin of a Blackjack bettor.")
+    parser.add_argument("--bettor", default="flat",
+                        help="one of %s, or module:function" % ", ".join(
+                            sorted(BETTORS)))
+    parser.add_argument("--strategy", default="basic",
+                        help="how to play hands, as in simulate.py")
+    parser.add_argument("--sessions", type=int, default=SESSIONS)
+    parser.add_argument("--rounds", type=int, default=ROUNDS,
+                        help="rounds a session lasts if not ruined")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes to use (default: one per core)")
+    parser.add_argument("--shard", type=int, default=SHARD,
+                        help="sessions per task")
+    args = parser.parse_args()
+
+    begin = time.time()
+    ledger = Ledger(args.rounds)
+    for shard, ruins, finals in run_batch(
+            args.strategy, args.bettor, args.sessions, args.rounds,
+            args.seed, args.workers, args.shard):
+        ledger.add(ruins, finals)
+        line = {"shard": shard}
+        line.update(ledger.summary())
+        sys.stdout.write(json.dumps(line, sort_keys=True) + "\n")
+        sys.stdout.flush()
+    elapsed = time.time() - begin
+    result = ledger.summary()
+    sys.stderr.write(
+        "%i sessions of up to %i rounds in %.1f s: %.1f%% ruined, "
+        "median ruin after %s rounds, median final cash $%s\n" % (
+            result["sessions"], args.rounds, elapsed, 100 * result["ruin"],
+            result["rounds_to_ruin"].get("p50", "-"),
+            result["bankroll"].get("p50", "-")))
+
+
+if __name__ == "__main__":
+    main()
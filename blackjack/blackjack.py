@@ -1,12 +1,20 @@
 """ A Python 2 Blackjack implementation for a single player.
 In this version of the game, which contains betting mechanics
 to keep track of the player's score, the dealer wins ties.
-Made by @andsnleo. """
+Made by @andsnleo.
+
+The rules themselves live in rules.py; this module draws them and
+handles the buttons. """
 
 import simplegui as sg
-import random
 import math
 
+from common import assets, atlas, profiler, textmetrics
+
+import rules
+import solver
+from rules import SUITS, RANKS
+
 # Dimensions and spacing for drawing
 CNV_WIDTH, CNV_HEIGHT = 650, 425  # Canvas
 CTRLA = 120  # Control Area width
@@ -29,7 +37,7 @@ FONT_FAMILY = "sans-serif"
 TEXT_DIV = 5
 
 # Load 230x51 Blackjack title (Source: @andsnleo)
-BLACKJACK_TITLE = sg.load_image(
+BLACKJACK_TITLE = assets.image(
     "https://github.com/andsnleo/python-simplegui-games/blob/master/blackjack/assets/blackjack-title.png?raw=true")
 TITLE_SIZE = (230, 51)
 TITLE_CENTER = (TITLE_SIZE[0] / 2, TITLE_SIZE[1] / 2)
@@ -37,91 +45,37 @@ TITLE_CENTER = (TITLE_SIZE[0] / 2, TITLE_SIZE[1] / 2)
 # Load 936x384 deck sprite (Source: jfitz.com)
 CARD_SIZE = (72, 96)
 CARD_CENTER = (36, 48)
-card_images = sg.load_image(
+card_images = assets.image(
     "http://storage.googleapis.com/codeskulptor-assets/cards_jfitz.png")
+# Location of every card in the sprite, one row per suit
+CARD_FRAMES = atlas.Atlas(CARD_SIZE, 13, 4, CARD_CENTER)
 
 # Load 71x96 card back sprite (Source: jfitz.com)
 CARD_BACK_SIZE = (71, 96)
 CARD_BACK_CENTER = (36, 48)
-card_back = sg.load_image(
+card_back = assets.image(
     "https://github.com/andsnleo/python-simplegui-games/blob/master/blackjack/assets/blackjack-card-back.png?raw=true")
 
-# Define globals for cards
-SUITS = ('C', 'S', 'H', 'D')
-RANKS = ('A', '2', '3', '4', '5', '6', '7', '8', '9', 'T', 'J', 'Q', 'K')
-VALUES = {'A': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7,
-          '8': 8, '9': 9, 'T': 10, 'J': 10, 'Q': 10, 'K': 10}
-
-
 # Classes
-class Card:
+class Card(rules.Card):
     def __init__(self, suit, rank):
-        if (suit in SUITS) and (rank in RANKS):
-            self.suit = suit
-            self.rank = rank
+        rules.Card.__init__(self, suit, rank)
+        if self.rank is not None:
+            self.frame = CARD_FRAMES.at(RANKS.index(rank), SUITS.index(suit))
         else:
-            self.suit = None
-            self.rank = None
-            print "Invalid card: ", suit, rank
-
-    def __str__(self):
-        """ String representation of Card. """
-        return self.suit + self.rank
-
-    def get_suit(self):
-        """ Return the suit of Card. """
-        return self.suit
-
-    def get_rank(self):
-        """ Return the rank of Card. """
-        return self.rank
+            self.frame = None
 
     def draw(self, canvas, pos):
         """ Draw Card in the canvas. """
-        # Get card location in the 52-card sprite
-        card_loc = (CARD_CENTER[0] + CARD_SIZE[0] * RANKS.index(self.rank),
-                    CARD_CENTER[1] + CARD_SIZE[1] * SUITS.index(self.suit))
-        canvas.draw_image(
-            card_images, card_loc, CARD_SIZE,
-            pos, CARD_SIZE)
+        center, size = self.frame
+        canvas.draw_image(card_images.get(), center, size, pos, size)
 
 
-class Hand:
+class Hand(rules.Hand):
     def __init__(self, tag, side):
-        self.hand = []
-        self.tag = tag
+        rules.Hand.__init__(self, tag)
         self.side = side
 
-    def __str__(self):
-        """ Return a string representation of a hand. """
-        if len(self.hand) < 1:
-            return "No cards in hand."
-        else:
-            output = "%s's hand contains" % (self.tag.capitalize())
-            for card in self.hand:
-                output += " %s" % (card)
-            return output + "."
-
-    def add_card(self, card):
-        """ Add a card to Hand. """
-        self.hand.append(card)
-
-    def get_value(self):
-        """ Compute the value of a hand. """
-        value, aces = 0, 0
-        for card in self.hand:
-            value += VALUES[card.get_rank()]
-            # Keep track of the aces in Hand
-            if card.get_rank() == "A":
-                aces += 1
-        if aces >= 1 and value + 10 <= 21:
-            value += 10
-        return value
-
-    def get_length(self):
-        """ Return the length of Hand. """
-        return len(self.hand)
-
     def draw(self, canvas, pos):
         """ Draw Hand in the canvas. """
         # Draw every card in Hand
@@ -131,54 +85,27 @@ class Hand:
             if (self.tag.upper() == "DEALER" and
                     self.hand.index(card) == 0 and in_play):
                 canvas.draw_image(
-                    card_back,
+                    card_back.get(),
                     CARD_BACK_CENTER, CARD_BACK_SIZE,
                     pos, CARD_SIZE)
             # Update the cards' coordinates to stack them appropriately
             pos[0] -= 15 * self.side
 
 
-class Deck:
+class Deck(rules.Deck):
     def __init__(self):
-        self.deck = [Card(suit, rank) for suit in SUITS for rank in RANKS]
-        self.graveyard = []
-
-    def __str__(self):
-        """ Return a string representation of Deck. """
-        output = "Deck contains"
-        for card in self.deck:
-            output += " %s" % (card)
-        return output + "."
-
-    def shuffle(self):
-        """ Shuffle the cards in Deck. """
-        random.shuffle(self.deck)
-
-    def regroup_cards(self):
-        """ Take cards from the graveyard and add them back to the deck. """
-        for card in self.graveyard:
-            self.deck.append(card)
-
-    def deal_card(self):
-        """ Return the card on the top of Deck and add it to the graveyard. """
-        dealt = self.deck.pop(-1)
-        self.graveyard.append(dealt)
-        return dealt
-
-    def get_length(self):
-        """ Return the length of Deck. """
-        return len(self.deck)
+        rules.Deck.__init__(self, card=Card)
 
     def draw(self, canvas, pos):
         """ Draw Deck in the canvas. """
         for card in self.deck:
             canvas.draw_image(
-                card_back, CARD_BACK_CENTER,
+                card_back.get(), CARD_BACK_CENTER,
                 CARD_BACK_SIZE, pos, CARD_BACK_SIZE)
 
 
 class Player:
-    def __init__(self, name, side, cash=200):
+    def __init__(self, name, side, cash=rules.STARTING_CASH):
         self.name = name
         self.cash = cash
         self.corner = side
@@ -214,7 +141,7 @@ class Player:
         line = 1
         for text in [value, self.name]:
             if self.corner == 1:  # Right side of the table
-                align = RIGHT_ALIGN - frame.get_canvas_textwidth(
+                align = RIGHT_ALIGN - metrics.width(
                     text.upper(), FONT_SIZE_SMALLER, FONT_FAMILY)
             else:
                 align = LEFT_ALIGN  # Left side of the table
@@ -231,8 +158,8 @@ total_bet, dealer_bet = 0, 0
 bottom_alert = "Press 'Deal' to start a new game."
 
 # Table traits
-INITIAL_BET = entry_bet = 8
-RAISES = [10, 15, 20]
+INITIAL_BET = entry_bet = rules.INITIAL_BET
+RAISES = rules.RAISES
 
 # Create Player and Deck objects
 player = Player("player", 1)
@@ -249,10 +176,10 @@ def deal():
     bottom_alert = ""  # Resets the bottom_alert field
 
     # Update the "Raise" buttons according to the player's cash
-    for index, button in enumerate(RAISE_BUTTONS):
-        if player.get_cash() >= 165:
-            button.set_text(
-                "Raise $%i" % (RAISES[index] * player.get_cash() / 165))
+    if player.get_cash() >= rules.RAISE_CASH:
+        for button, value in zip(RAISE_BUTTONS,
+                                 rules.raise_values(player.get_cash())):
+            button.set_text("Raise $%i" % (value))
 
     if player.get_cash() >= entry_bet:
         start = True
@@ -264,17 +191,10 @@ def deal():
         dealer_bet += entry_bet
         total_bet += entry_bet * 2
 
-        # Make sure the deck never runs out of cards
-        if bjack_deck.get_length() < 14:
-            bjack_deck.regroup_cards()
-        bjack_deck.shuffle()
-
-        # Start new hands for the player and the dealer
+        # Start new hands for the player and the dealer, and handle two
+        # cards for each of them from a deck that never runs out
         player_hand, dealer_hand = player.set_new_hand(), dealer.set_new_hand()
-        # Handle two cards for each player
-        while (player_hand.get_length(), dealer_hand.get_length) < (2, 2):
-            player_hand.add_card(bjack_deck.deal_card())
-            dealer_hand.add_card(bjack_deck.deal_card())
+        rules.deal(bjack_deck, player_hand, dealer_hand)
 
         in_play = True  # Defines a playing round
 
@@ -293,7 +213,7 @@ def hit():
     if in_play:
         player_hand.add_card(bjack_deck.deal_card())
         # Player busts
-        if player_hand.get_value() > 21:
+        if player_hand.get_value() > rules.BLACKJACK:
             bottom_alert = (
                 "You bust with %i and lose $%i. "
                 "But, hey, don't give up!"
@@ -311,18 +231,17 @@ def stand():
 
     if in_play:
         # Add remaining cards to the dealer's hand
-        while dealer_hand.get_value() <= 17:
-            dealer_hand.add_card(bjack_deck.deal_card())
+        rules.dealer_plays(bjack_deck, dealer_hand)
         in_play = False
 
         # Dealer busts
-        if dealer_hand.get_value() > 21:
+        if dealer_hand.get_value() > rules.BLACKJACK:
             player.add_cash(total_bet)
             bottom_alert = (
                 "The dealer busts with %i and you take $%i. New deal?"
                 % (dealer_hand.get_value(), dealer_bet))
         # Compare the values of both hands
-        elif dealer_hand.get_value() <= 21:
+        elif dealer_hand.get_value() <= rules.BLACKJACK:
             if player_hand.get_value() > dealer_hand.get_value():
                 player.add_cash(total_bet)
                 bottom_alert = (
@@ -345,13 +264,30 @@ def stand():
             "Press 'Deal' if you want another one.")
 
 
+def hint():
+    """ Tell the player their best play, with the exact odds of the
+    cards they have not seen: the deck and the dealer's hole card. """
+    global bottom_alert
+    if not in_play:
+        bottom_alert = "Deal first, and then ask for a hint."
+        return
+    hits, stand_ev, hit_ev = solver.hint(
+        player_hand, rules.upcard(dealer_hand),
+        bjack_deck.deck + [dealer_hand.hand[0]])
+    best_ev = max(stand_ev, hit_ev)
+    bottom_alert = "Hint: %s, worth %+.2f per $1 bet." % (
+        "hit" if hits else "stand", best_ev)
+    # A raise is paid at the same odds as the entry bet
+    if best_ev > 0:
+        bottom_alert += " Raise!"
+
+
 def draw(canvas):
     global bjack_deck, total_bet, entry_bet
     global start, in_play, enough_money, bottom_alert
 
     # Raise the next round's entry bet according to the player's cash
-    if player.get_cash() > 0 and player.get_cash() % 200 == 0:
-        entry_bet = INITIAL_BET * player.get_cash() / 200
+    entry_bet = rules.next_entry_bet(player.get_cash(), entry_bet)
 
     if start:
         # Check if the player has enough money to play a round
@@ -376,7 +312,7 @@ def draw(canvas):
 
     # Draw the game's custom title
     canvas.draw_image(
-        BLACKJACK_TITLE, TITLE_CENTER, TITLE_SIZE,
+        BLACKJACK_TITLE.get(), TITLE_CENTER, TITLE_SIZE,
         [OFFSET + TITLE_CENTER[0], OFFSET + TITLE_CENTER[1]],
         TITLE_SIZE)
 
@@ -401,28 +337,28 @@ def draw(canvas):
     # Display the game's entry bet
     canvas.draw_text(
         "Next entry bet:",
-        [CENTER_ALIGN[0] - frame.get_canvas_textwidth(
+        [CENTER_ALIGN[0] - metrics.width(
             "Next entry bet:", FONT_SIZE_SMALL, FONT_FAMILY) / 2,
          CENTER_ALIGN[1] + CARD_CENTER[1] +
          PADDING * 7 - FONT_SIZE_BIG - TEXT_DIV],
         FONT_SIZE_SMALL, FONT_COLOR, FONT_FAMILY)
     canvas.draw_text(
         "$%i" % (entry_bet),
-        [CENTER_ALIGN[0] - frame.get_canvas_textwidth(
+        [CENTER_ALIGN[0] - metrics.width(
             "$%i" % (entry_bet), FONT_SIZE_BIG, FONT_FAMILY) / 2,
          CENTER_ALIGN[1] + CARD_CENTER[1] + PADDING * 7],
         FONT_SIZE_BIG, FONT_COLOR, FONT_FAMILY)
     # Display the player's total cash
     canvas.draw_text(
         "Your cash:",
-        [RIGHT_ALIGN - frame.get_canvas_textwidth(
+        [RIGHT_ALIGN - metrics.width(
             "Your cash:", FONT_SIZE_SMALL, FONT_FAMILY),
          CENTER_ALIGN[1] + CARD_CENTER[1] +
          PADDING * 7 - FONT_SIZE_BIG - TEXT_DIV],
         FONT_SIZE_SMALL, FONT_COLOR, FONT_FAMILY)
     canvas.draw_text(
         "$%i" % (player.get_cash()),
-        [RIGHT_ALIGN - frame.get_canvas_textwidth(
+        [RIGHT_ALIGN - metrics.width(
             "$%i" % (player.get_cash()), FONT_SIZE_BIG, FONT_FAMILY),
          CENTER_ALIGN[1] + CARD_CENTER[1] + PADDING * 7],
         FONT_SIZE_BIG, FONT_COLOR, FONT_FAMILY)
@@ -430,7 +366,7 @@ def draw(canvas):
     # Display the bottom_alert field in the the canvas
     canvas.draw_text(
         bottom_alert,
-        [CENTER_ALIGN[0] - frame.get_canvas_textwidth(
+        [CENTER_ALIGN[0] - metrics.width(
             bottom_alert, FONT_SIZE_NORMAL, FONT_FAMILY) / 2,
          BOTTOM_ALIGN],
         FONT_SIZE_NORMAL, "rgba(255, 255, 255, 0.5)", FONT_FAMILY)
@@ -511,11 +447,18 @@ def magic_cash():
 frame = sg.create_frame("Blackjack", CNV_WIDTH, CNV_HEIGHT, CTRLA)
 frame.set_canvas_background("#38754f")
 
+# Measure text once, and the cash amounts glyph by glyph
+metrics = textmetrics.TextMetrics(frame)
+metrics.prewarm_digits(FONT_SIZE_BIG, FONT_FAMILY, "$")
+
 # Create buttons, labels and canvas callback
-frame.set_draw_handler(draw)
+frame.set_draw_handler(profiler.wrap_draw(
+    assets.loading_screen(draw, CNV_WIDTH, CNV_HEIGHT), CNV_WIDTH, CNV_HEIGHT))
+frame.set_keydown_handler(profiler.wrap_keydown())
 frame.add_button("Deal", deal, CTRLA)
 frame.add_button("Hit", hit, CTRLA)
 frame.add_button("Stand", stand, CTRLA)
+frame.add_button("Hint", hint, CTRLA)
 frame.add_label("")
 frame.add_label("Up your game:")
 frame.add_label("")
@@ -0,0 +1,199 @@
+""" The rules of this Blackjack table, without a display.
+
+Cards, hands and the deck live here, along with what the table does
+with them: deal() refills the deck from the graveyard when it runs low
+and shuffles it before every round, the dealer draws while their hand
+is worth DEALER_HITS or less, and ties go to the dealer. So do the
+betting rules, which scale the entry bet and the raises with the
+player's cash. blackjack.py adds drawing on top of these classes;
+simulate.py and bankroll.py play them headless.
+"""
+
+import random
+
+# Define globals for cards
+SUITS = ('C', 'S', 'H', 'D')
+RANKS = ('A', '2', '3', '4', '5', '6', '7', '8', '9', 'T', 'J', 'Q', 'K')
+VALUES = {'A': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7,
+          '8': 8, '9': 9, 'T': 10, 'J': 10, 'Q': 10, 'K': 10}
+
+# Table rules
+BLACKJACK = 21
+DEALER_HITS = 17  # The dealer draws while their hand is worth this or less
+REGROUP_BELOW = 14  # Cards left in the deck under which it is refilled
+TIES_TO_DEALER = True
+
+# Outcomes of a round, in entry bets won
+WIN, PUSH, LOSS = 1, 0, -1
+
+# Betting rules
+STARTING_CASH = 200
+INITIAL_BET = 8  # The entry bet at STARTING_CASH
+RAISES = (10, 15, 20)  # The raises offered at RAISE_CASH
+RAISE_CASH = 165
+
+
+class Card:
+    def __init__(self, suit, rank):
+        if (suit in SUITS) and (rank in RANKS):
+            self.suit = suit
+            self.rank = rank
+        else:
+            self.suit = None
+            self.rank = None
+            print("Invalid card: %s %s" % (suit, rank))
+
+    def __str__(self):
+        """ String representation of Card. """
+        return self.suit + self.rank
+
+    def get_suit(self):
+        """ Return the suit of Card. """
+        return self.suit
+
+    def get_rank(self):
+        """ Return the rank of Card. """
+        return self.rank
+
+
+class Hand:
+    def __init__(self, tag):
+        self.hand = []
+        self.tag = tag
+        # Kept up to date by add_card(), so the value is never recounted
+        self.hard = 0  # Value with every ace counting 1
+        self.aces = 0
+
+    def __str__(self):
+        """ Return a string representation of a hand. """
+        if len(self.hand) < 1:
+            return "No cards in hand."
+        else:
+            output = "%s's hand contains" % (self.tag.capitalize())
+            for card in self.hand:
+                output += " %s" % (card)
+            return output + "."
+
+    def add_card(self, card):
+        """ Add a card to Hand. """
+        self.hand.append(card)
+        rank = card.get_rank()
+        self.hard += VALUES[rank]
+        # Keep track of the aces in Hand
+        if rank == "A":
+            self.aces += 1
+
+    def get_value(self):
+        """ Return the value of a hand, one ace counting 11 if it can. """
+        if self.is_soft():
+            return self.hard + 10
+        return self.hard
+
+    def is_soft(self):
+        """ Return whether an ace in Hand counts as 11. """
+        return self.aces >= 1 and self.hard + 10 <= BLACKJACK
+
+    def get_length(self):
+        """ Return the length of Hand. """
+        return len(self.hand)
+
+
+class Deck:
+    def __init__(self, rng=random, card=Card):
+        """ Create a deck of 52 cards, shuffled with rng.
+
+        card builds each card from its suit and rank.
+        """
+        self.rng = rng
+        self.deck = [card(suit, rank) for suit in SUITS for rank in RANKS]
+        self.graveyard = []
+
+    def __str__(self):
+        """ Return a string representation of Deck. """
+        output = "Deck contains"
+        for card in self.deck:
+            output += " %s" % (card)
+        return output + "."
+
+    def shuffle(self):
+        """ Shuffle the cards in Deck. """
+        self.rng.shuffle(self.deck)
+
+    def regroup_cards(self):
+        """ Take cards from the graveyard and add them back to the deck. """
+        self.deck.extend(self.graveyard)
+        self.graveyard = []
+
+    def ready(self):
+        """ Refill Deck if it runs low, and shuffle it, before a round. """
+        # Make sure the deck never runs out of cards
+        if self.get_length() < REGROUP_BELOW:
+            self.regroup_cards()
+        self.shuffle()
+
+    def deal_card(self):
+        """ Return the card on the top of Deck and add it to the graveyard. """
+        dealt = self.deck.pop(-1)
+        self.graveyard.append(dealt)
+        return dealt
+
+    def get_length(self):
+        """ Return the length of Deck. """
+        return len(self.deck)
+
+
+def deal(deck, player_hand, dealer_hand):
+    """ Start a round: ready the deck and give both hands two cards.
+
+    deck is this table's Deck, or a shoe.Shoe.
+    """
+    deck.ready()
+    # Handle two cards for each player
+    while (player_hand.get_length(), dealer_hand.get_length()) < (2, 2):
+        player_hand.add_card(deck.deal_card())
+        dealer_hand.add_card(deck.deal_card())
+
+
+def upcard(dealer_hand):
+    """ Return the dealer's card the player sees; the first is hidden. """
+    return dealer_hand.hand[1]
+
+
+def dealer_plays(deck, dealer_hand):
+    """ Add cards to the dealer's hand until they must stop. """
+    while dealer_hand.get_value() <= DEALER_HITS:
+        dealer_hand.add_card(deck.deal_card())
+
+
+def outcome(player_value, dealer_value):
+    """ Return WIN, PUSH or LOSS for the player, once the dealer played.
+
+    A player who busts loses before the dealer plays at all.
+    """
+    if player_value > BLACKJACK:
+        return LOSS
+    if dealer_value > BLACKJACK or player_value > dealer_value:
+        return WIN
+    if player_value < dealer_value or TIES_TO_DEALER:
+        return LOSS
+    return PUSH
+
+
+def next_entry_bet(cash, entry_bet):
+    """ Return the entry bet once the table sees the player's cash.
+
+    The entry bet is set again, in proportion, whenever cash is a
+    positive multiple of STARTING_CASH, and kept as it was otherwise.
+    """
+    if cash > 0 and cash % STARTING_CASH == 0:
+        return INITIAL_BET * cash // STARTING_CASH
+    return entry_bet
+
+
+def raise_values(cash):
+    """ Return the raises offered to a player with cash, before a round.
+
+    Offers are only updated while cash is at least RAISE_CASH; below,
+    the table keeps offering the last ones.
+    """
+    return [value * cash // RAISE_CASH for value in RAISES]
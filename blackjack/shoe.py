@@ -0,0 +1,213 @@
+""" Cards as small integers, and multi-deck shoes dealt from them.
+
+A card is a code from 0 to 51, suit * 13 + rank, in the order of SUITS
+and RANKS, which is also the frame order of the cards' sprite sheet. A
+Shoe holds the codes of one or more decks in an array('B'): shuffling
+permutes that array in place, and dealing moves an index along it, so a
+round allocates nothing. Once the index passes the cut card, placed at
+the penetration share of the shoe, ready() shuffles every card back in
+before the next round.
+
+Shoes answer the calls of rules.Deck, so rules.deal() and the simulator
+take either. Cards only become objects to be drawn: deal_card() returns
+the flyweight card of a code, one shared instance per code and class.
+
+deal_hands() deals many hands in a row from a shoe, and
+independent_hands() deals each hand from a freshly shuffled shoe of its
+own, in one NumPy pass when NumPy is available:
+
+    codes = shoe.independent_hands(100000, 6, decks=6)  # hands x slots
+
+evaluate() then scores every row of such an array at once, with EMPTY
+in the slots of shorter hands:
+
+    hard, soft, bust, natural = shoe.evaluate(codes[:, :2])
+"""
+
+import random
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import rules
+
+CODES = list(range(len(rules.SUITS) * len(rules.RANKS)))
+EMPTY = 255  # The code of a slot with no card in it
+PENETRATION = .75  # Share of the shoe dealt before the cut card
+
+
+def code(suit, rank):
+    """ Return the code of the card of suit and rank. """
+    return rules.SUITS.index(suit) * len(rules.RANKS) + rules.RANKS.index(
+        rank)
+
+
+def rank_of(card_code):
+    """ Return the rank of the card with code card_code. """
+    return rules.RANKS[card_code % len(rules.RANKS)]
+
+
+def suit_of(card_code):
+    """ Return the suit of the card with code card_code. """
+    return rules.SUITS[card_code // len(rules.RANKS)]
+
+
+# The value of each code, aces counting 1, and whether it is an ace
+VALUES = array("B", [rules.VALUES[rank_of(card_code)] for card_code in CODES])
+ACES = array("B", [rank_of(card_code) == "A" for card_code in CODES])
+
+if np is not None:
+    # Lookup tables over every byte, EMPTY and the unused codes being 0
+    _VALUE_TABLE = np.zeros(256, dtype=np.int16)
+    _VALUE_TABLE[CODES] = VALUES
+    _ACE_TABLE = np.zeros(256, dtype=bool)
+    _ACE_TABLE[CODES] = ACES
+
+_faces = {}  # Card class to its flyweights, by code
+
+
+def faces(card=rules.Card):
+    """ Return the one instance of card built for each code. """
+    if card not in _faces:
+        _faces[card] = tuple(
+            card(suit_of(card_code), rank_of(card_code))
+            for card_code in CODES)
+    return _faces[card]
+
+
+class Shoe:
+    def __init__(self, decks=1, penetration=PENETRATION, rng=random,
+                 card=rules.Card):
+        """ Create a shoe of decks decks, shuffled with rng.
+
+        Cards dealt by deal_card() are flyweights of class card.
+        """
+        self.cards = array("B", CODES * decks)
+        self.rng = rng
+        self.cut = max(1, int(len(self.cards) * penetration))
+        self.next = 0  # Index of the next card to deal
+        self.faces = faces(card)
+        self.shuffle()
+
+    def __str__(self):
+        """ Return a string representation of Shoe. """
+        output = "Shoe contains"
+        for card_code in self.cards[self.next:]:
+            output += " %s" % (self.faces[card_code])
+        return output + "."
+
+    def shuffle(self):
+        """ Put every card back and shuffle the shoe in place. """
+        self.rng.shuffle(self.cards)
+        self.next = 0
+
+    def ready(self):
+        """ Shuffle before a round if the cut card came out, or if too few
+        cards are left for one. """
+        if self.next >= self.cut or self.get_length() < rules.REGROUP_BELOW:
+            self.shuffle()
+
+    def get_length(self):
+        """ Return the number of cards left to deal. """
+        return len(self.cards) - self.next
+
+    def deal_code(self):
+        """ Return the code of the next card. """
+        card_code = self.cards[self.next]
+        self.next += 1
+        return card_code
+
+    def deal_card(self):
+        """ Return the next card, as a flyweight to draw. """
+        return self.faces[self.deal_code()]
+
+    def deal_codes(self, count):
+        """ Return the codes of the next count cards, in an array('B'). """
+        if count > self.get_length():
+            raise IndexError("Only %i cards left in the shoe" % (
+                self.get_length()))
+        dealt = self.cards[self.next:self.next + count]
+        self.next += count
+        return dealt
+
+    def deal_hands(self, hands, slots):
+        """ Deal hands rows of slots cards, shuffling at the cut card.
+
+        Return the rows as a hands x slots NumPy array of codes, or as a
+        list of array('B') rows without NumPy.
+        """
+        dealt = array("B")
+        for _ in range(hands):
+            self.ready()
+            if slots > self.get_length():
+                self.shuffle()
+            dealt.extend(self.deal_codes(slots))
+        if np is not None:
+            return np.frombuffer(dealt, dtype=np.uint8).reshape(hands, slots)
+        return [dealt[start:start + slots]
+                for start in range(0, len(dealt), slots)]
+
+
+def independent_hands(hands, slots, decks=1, rng=random):
+    """ Deal each of hands hands from a freshly shuffled shoe of its own.
+
+    Return a hands x slots NumPy array of codes, or a list of array('B')
+    rows without NumPy. The NumPy pass shuffles every row at once, only
+    as far as the slots dealt, and takes hands * decks * 52 bytes.
+    """
+    composition = CODES * decks
+    if np is None:
+        return [array("B", rng.sample(composition, slots))
+                for _ in range(hands)]
+    state = np.random.RandomState(rng.getrandbits(32))
+    cards = np.tile(np.array(composition, dtype=np.uint8), (hands, 1))
+    rows = np.arange(hands)
+    # A Fisher-Yates shuffle of every row, stopped after slots swaps
+    for slot in range(slots):
+        picks = slot + state.randint(len(composition) - slot, size=hands)
+        dealt = cards[rows, picks]
+        cards[rows, picks] = cards[:, slot].copy()
+        cards[:, slot] = dealt
+    return cards[:, :slots].copy()
+
+
+def evaluate(codes):
+    """ Score a batch of hands, given as rows of card codes.
+
+    codes is a hands x slots NumPy array, or a sequence of rows, where
+    the slots past the last card of a hand hold EMPTY. Return four
+    arrays with one entry per hand: the hard total, aces counting 1,
+    and whether the hand is soft (an ace counts 11), bust, and a
+    natural (21 in two cards). The value of a hand is its hard total
+    plus 10 where it is soft. With NumPy, the whole batch is scored in
+    one pass of whole-array operations.
+    """
+    if np is not None and isinstance(codes, np.ndarray):
+        codes = codes.astype(np.intp)
+        hard = _VALUE_TABLE[codes].sum(axis=1)
+        aces = _ACE_TABLE[codes].any(axis=1)
+        soft = aces & (hard + 10 <= rules.BLACKJACK)
+        bust = hard > rules.BLACKJACK
+        natural = soft & (hard + 10 == rules.BLACKJACK) & (
+            (codes != EMPTY).sum(axis=1) == 2)
+        return hard, soft, bust, natural
+
+    hard, soft, bust, natural = (array("H"), array("B"), array("B"),
+                                 array("B"))
+    for row in codes:
+        total, aces, cards = 0, False, 0
+        for card_code in row:
+            if card_code != EMPTY:
+                total += VALUES[card_code]
+                aces = aces or ACES[card_code]
+                cards += 1
+        is_soft = aces and total + 10 <= rules.BLACKJACK
+        hard.append(total)
+        soft.append(is_soft)
+        bust.append(total > rules.BLACKJACK)
+        natural.append(is_soft and total + 10 == rules.BLACKJACK and
+                       cards == 2)
+    return hard, soft, bust, natural
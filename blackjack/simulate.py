@@ -0,0 +1,219 @@
+""" Play millions of Blackjack rounds headless, across processes.
+
+Rounds follow the table's rules exactly (rules.py): one 52-card deck
+per session, refilled from the graveyard and shuffled before every
+round, a dealer drawing while 17 or less and winning ties. With
+--decks, rounds are dealt from a multi-deck shoe.Shoe instead, only
+shuffled once the cut card comes out. The player only hits or stands,
+as told by a strategy called before every card:
+
+    strategy(hand, upcard) -> hit
+
+where hand is the player's rules.Hand and upcard the dealer's visible
+card. Every round bets one entry bet, and pays it back doubled on a win.
+
+The rounds are split in shards, each a session of its own with an RNG
+seeded from the batch seed and the shard number alone, so results do
+not depend on how many processes ran them. Shards go to a process pool
+and stream back one JSON line each, with the running totals, as soon as
+they finish:
+
+    PYTHONPATH=. python blackjack/simulate.py --strategy basic --hands 1000000
+
+Strategies are named in STRATEGIES, or given as module:function.
+"""
+
+import argparse
+import importlib
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+import rules
+import shoe
+
+HANDS = 100000
+SHARD = 20000  # Rounds per session, and per task sent to a worker
+Z = 1.96  # Confidence intervals are 95% ones
+
+
+# Built-in strategies
+def stand(hand, upcard):
+    """ Never hit. """
+    return False
+
+
+def mimic(hand, upcard):
+    """ Play like the dealer: hit on 17 or less. """
+    return hand.get_value() <= rules.DEALER_HITS
+
+
+def basic(hand, upcard):
+    """ Hit soft hands up to 17, and stiff hands against a strong card. """
+    value = hand.get_value()
+    if hand.is_soft():
+        return value <= 17
+    strong = upcard.get_rank() == "A" or rules.VALUES[upcard.get_rank()] >= 7
+    return value <= 11 or (value <= 16 and strong)
+
+
+STRATEGIES = {"stand": stand, "mimic": mimic, "basic": basic}
+
+
+def load_strategy(name):
+    """ Return the strategy called name, or the module:function it names. """
+    if name in STRATEGIES:
+        return STRATEGIES[name]
+    module, _, function = name.partition(":")
+    return getattr(importlib.import_module(module), function)
+
+
+def shard_seed(seed, shard):
+    """ Return the RNG seed of a shard; no two shards share one. """
+    return seed * 2 ** 32 + shard
+
+
+def play_round(deck, strategy):
+    """ Play one round from deck; return its outcome for the player. """
+    player_hand, dealer_hand = rules.Hand("player"), rules.Hand("dealer")
+    rules.deal(deck, player_hand, dealer_hand)
+    return play_hands(deck, player_hand, dealer_hand, strategy)
+
+
+def play_hands(deck, player_hand, dealer_hand, strategy):
+    """ Play out hands just dealt from deck; return the outcome. """
+    upcard = rules.upcard(dealer_hand)
+    while strategy(player_hand, upcard):
+        player_hand.add_card(deck.deal_card())
+        if player_hand.get_value() > rules.BLACKJACK:
+            return rules.LOSS
+    rules.dealer_plays(deck, dealer_hand)
+    return rules.outcome(player_hand.get_value(), dealer_hand.get_value())
+
+
+class Tally:
+    """ Outcome counts of many rounds, which add up across shards. """
+
+    def __init__(self, wins=0, pushes=0, losses=0):
+        self.wins = wins
+        self.pushes = pushes
+        self.losses = losses
+
+    def count(self, outcome):
+        if outcome == rules.WIN:
+            self.wins += 1
+        elif outcome == rules.LOSS:
+            self.losses += 1
+        else:
+            self.pushes += 1
+
+    def add(self, other):
+        self.wins += other.wins
+        self.pushes += other.pushes
+        self.losses += other.losses
+
+    def hands(self):
+        return self.wins + self.pushes + self.losses
+
+    def rate(self, count):
+        """ Return the share count is of the hands, and its CI half-width. """
+        hands = max(self.hands(), 1)
+        share = count / float(hands)
+        return share, Z * math.sqrt(share * (1 - share) / hands)
+
+    def ev(self):
+        """ Return the mean gain per entry bet, and its CI half-width. """
+        hands = max(self.hands(), 1)
+        mean = (self.wins - self.losses) / float(hands)
+        # Outcomes are -1, 0 or 1, so the mean square is the decided share
+        variance = (self.wins + self.losses) / float(hands) - mean * mean
+        return mean, Z * math.sqrt(max(variance, 0) / hands)
+
+    def summary(self):
+        """ Return the rates and EV, each as [value, CI half-width]. """
+        return {"hands": self.hands(),
+                "win": list(self.rate(self.wins)),
+                "push": list(self.rate(self.pushes)),
+                "loss": list(self.rate(self.losses)),
+                "ev": list(self.ev())}
+
+
+def run_shard(task):
+    """ Play a shard's session in a worker; return its shard and counts. """
+    strategy_name, seed, shard, hands, decks, penetration = task
+    strategy = load_strategy(strategy_name)
+    rng = random.Random(shard_seed(seed, shard))
+    if decks:
+        deck = shoe.Shoe(decks, penetration, rng)
+    else:
+        deck = rules.Deck(rng)
+    tally = Tally()
+    for _ in range(hands):
+        tally.count(play_round(deck, strategy))
+    return shard, (tally.wins, tally.pushes, tally.losses)
+
+
+def run_batch(strategy_name, hands, seed=0, workers=None, shard=SHARD,
+              decks=0, penetration=shoe.PENETRATION):
+    """ Yield (shard, Tally) for every shard, in the order they finish.
+
+    Sessions use the table's deck, or shoes of decks decks if not 0.
+    """
+    load_strategy(strategy_name)  # Fail here rather than in every worker
+    tasks = [(strategy_name, seed, index, min(shard, hands - start), decks,
+              penetration)
+             for index, start in enumerate(range(0, hands, shard))]
+    pool = multiprocessing.Pool(workers)
+    try:
+        for index, counts in pool.imap_unordered(run_shard, tasks):
+            yield index, Tally(*counts)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Estimate a Blackjack strategy's odds at this table.")
+    parser.add_argument("--strategy", default="basic",
+                        help="one of %s, or module:function" % ", ".join(
+                            sorted(STRATEGIES)))
+    parser.add_argument("--hands", type=int, default=HANDS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes to use (default: one per core)")
+    parser.add_argument("--shard", type=int, default=SHARD,
+                        help="rounds per session and task")
+    parser.add_argument("--decks", type=int, default=0,
+                        help="deal from a shoe of this many decks "
+                        "(default: the table's single deck)")
+    parser.add_argument("--penetration", type=float,
+                        default=shoe.PENETRATION,
+                        help="share of the shoe dealt before reshuffling")
+    args = parser.parse_args()
+
+    begin = time.time()
+    total = Tally()
+    for shard, tally in run_batch(args.strategy, args.hands, args.seed,
+                                  args.workers, args.shard, args.decks,
+                                  args.penetration):
+        total.add(tally)
+        line = {"shard": shard, "shard_ev": tally.ev()[0]}
+        line.update(total.summary())
+        sys.stdout.write(json.dumps(line, sort_keys=True) + "\n")
+        sys.stdout.flush()
+    elapsed = time.time() - begin
+    result = total.summary()
+    sys.stderr.write(
+        "%i hands in %.1f s (%.0f hands/s): win %.4f, push %.4f, "
+        "loss %.4f, EV %+.4f +/- %.4f per entry bet\n" % (
+            result["hands"], elapsed, result["hands"] / elapsed,
+            result["win"][0], result["push"][0], result["loss"][0],
+            result["ev"][0], result["ev"][1]))
+
+
+if __name__ == "__main__":
+    main()
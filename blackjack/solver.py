@@ -0,0 +1,238 @@
+""" Exact hit and stand odds at this table, for any cards left unseen.
+
+Published strategy charts assume a dealer standing on 17 and paying
+pushes back; here the dealer draws on 17, hard or soft, and wins every
+tie. This module works the odds out for these rules instead, by
+recursion over what is left in the shoe: a shoe is a composition, the
+count of unseen cards of each value from ace to ten, and each draw
+removes one card from it. Hands are (hard, ace) pairs, hard being the
+total with aces counting 1, so every state is small and hashable, and
+both the dealer's outcomes and the player's best play are memoized on
+(composition, hand).
+
+The dealer never peeks at their hole card, so it is as unknown to the
+player as any card still in the shoe, and the dealer may just as well
+draw it after the player is done: that is how the solver deals it.
+
+A round pays its whole stake on a win and takes it on a loss, so the EV
+of a hand, in stakes, is also the EV of every dollar raised on it;
+raise_bet() in the GUI is worth it exactly when the best play's EV is
+above 0. Double and split do not exist at this table.
+
+    python blackjack/solver.py [--decks N] [--ev]
+
+prints the chart for a fresh shoe, and hint() answers for the cards of
+a round in play.
+"""
+
+import argparse
+import sys
+import time
+
+import rules
+
+# Card values, index + 1 being the value, aces counting 1
+VALUES = tuple(range(1, 11))
+ACE = 1
+
+# Dealer outcomes, in the order of the probabilities dealer() returns
+DEALER_TOTALS = tuple(range(rules.DEALER_HITS + 1, rules.BLACKJACK + 1))
+BUST = len(DEALER_TOTALS)
+
+
+def composition(cards):
+    """ Return the composition of cards, by value from ace to ten. """
+    counts = [0] * len(VALUES)
+    for card in cards:
+        counts[rules.VALUES[card.get_rank()] - 1] += 1
+    return tuple(counts)
+
+
+def full_shoe(decks=1):
+    """ Return the composition of a fresh shoe of decks decks. """
+    deck = composition(rules.Card(suit, rank)
+                       for suit in rules.SUITS for rank in rules.RANKS)
+    return tuple(decks * count for count in deck)
+
+
+def value(hard, ace):
+    """ Return the value of a hand, one ace counting 11 if it can. """
+    if ace and hard + 10 <= rules.BLACKJACK:
+        return hard + 10
+    return hard
+
+
+def draw(shoe, card_value):
+    """ Return shoe without one card of value card_value. """
+    index = card_value - 1
+    return shoe[:index] + (shoe[index] - 1,) + shoe[index + 1:]
+
+
+class Solver:
+    def __init__(self):
+        """ Create a solver with empty memos, which grow with every call. """
+        self.dealer_memo = {}
+        self.player_memo = {}
+        self.stand_memo = {}
+
+    def dealer(self, shoe, hard, ace):
+        """ Return the probabilities of the dealer's outcomes.
+
+        The dealer holds a hand of (hard, ace) they must draw to, and
+        draws from shoe; the outcomes are the totals of DEALER_TOTALS,
+        then a bust.
+        """
+        key = (shoe, hard, ace)
+        outcomes = self.dealer_memo.get(key)
+        if outcomes is not None:
+            return outcomes
+        outcomes = [0.0] * (BUST + 1)
+        cards = float(sum(shoe))
+        if not cards:
+            # Out of cards, which a round never gets to: call it a bust
+            outcomes[BUST] = 1.0
+        for index, count in enumerate(shoe):
+            if not count:
+                continue
+            odds = count / cards
+            new_hard, new_ace = hard + VALUES[index], ace or index == 0
+            total = value(new_hard, new_ace)
+            # Settle the draws that end the dealer's turn right here,
+            # which most do, rather than memoizing them one by one
+            if total > rules.BLACKJACK:
+                outcomes[BUST] += odds
+            elif total > rules.DEALER_HITS:
+                outcomes[total - DEALER_TOTALS[0]] += odds
+            else:
+                after = self.dealer(
+                    shoe[:index] + (count - 1,) + shoe[index + 1:],
+                    new_hard, new_ace)
+                for outcome, probability in enumerate(after):
+                    outcomes[outcome] += odds * probability
+        outcomes = tuple(outcomes)
+        self.dealer_memo[key] = outcomes
+        return outcomes
+
+    def stand(self, shoe, total, upcard):
+        """ Return the EV of standing on total against upcard. """
+        key = (shoe, total, upcard)
+        if key not in self.stand_memo:
+            outcomes = self.dealer(shoe, upcard, upcard == ACE)
+            ev = outcomes[BUST] * rules.WIN
+            for dealer_total, probability in zip(DEALER_TOTALS, outcomes):
+                ev += probability * rules.outcome(total, dealer_total)
+            self.stand_memo[key] = ev
+        return self.stand_memo[key]
+
+    def hit(self, shoe, hard, ace, upcard):
+        """ Return the EV of hitting a hand of (hard, ace), then playing
+        on as well as possible. """
+        cards = sum(shoe)
+        if not cards:
+            return self.stand(shoe, value(hard, ace), upcard)
+        ev = 0.0
+        for card_value, count in zip(VALUES, shoe):
+            if not count:
+                continue
+            odds = count / float(cards)
+            new_hard = hard + card_value
+            if new_hard > rules.BLACKJACK:
+                ev -= odds
+            else:
+                ev += odds * self.best(draw(shoe, card_value), new_hard,
+                                       ace or card_value == ACE, upcard)
+        return ev
+
+    def best(self, shoe, hard, ace, upcard):
+        """ Return the EV of a hand of (hard, ace) played as well as
+        possible from shoe. """
+        key = (shoe, hard, ace, upcard)
+        if key not in self.player_memo:
+            self.player_memo[key] = max(
+                self.stand(shoe, value(hard, ace), upcard),
+                self.hit(shoe, hard, ace, upcard))
+        return self.player_memo[key]
+
+    def odds(self, shoe, hard, ace, upcard):
+        """ Return the EVs of standing and of hitting, in stakes. """
+        return (self.stand(shoe, value(hard, ace), upcard),
+                self.hit(shoe, hard, ace, upcard))
+
+
+# Rows of the chart, each with the two cards that stand for it
+HARD_ROWS = [(total, (max(2, total - 10), total - max(2, total - 10)))
+             for total in range(4, 21)]
+SOFT_ROWS = [(total, (ACE, total - 11)) for total in range(12, 22)]
+UPCARDS = VALUES[1:] + (ACE,)
+
+
+def chart(shoe=None, solver=None):
+    """ Return the EVs of every row of the chart against every upcard.
+
+    The result maps (total, soft, upcard) to the (stand, hit) EVs of
+    the row's two cards against upcard, all three dealt from shoe, a
+    fresh single deck by default.
+    """
+    if shoe is None:
+        shoe = full_shoe()
+    if solver is None:
+        solver = Solver()
+    table = {}
+    for soft, rows in ((False, HARD_ROWS), (True, SOFT_ROWS)):
+        for total, cards in rows:
+            for upcard in UPCARDS:
+                left = shoe
+                for card_value in cards + (upcard,):
+                    left = draw(left, card_value)
+                table[total, soft, upcard] = solver.odds(
+                    left, sum(cards), soft, upcard)
+    return table
+
+
+def hint(player_hand, dealer_upcard, unseen, solver=None):
+    """ Return the best play of a round in play, and the EVs behind it.
+
+    unseen holds the cards the player has not seen: the deck, and the
+    dealer's hole card. Return (hits, stand_ev, hit_ev).
+    """
+    if solver is None:
+        solver = Solver()
+    shoe = composition(unseen)
+    stand_ev, hit_ev = solver.odds(
+        shoe, player_hand.hard, player_hand.aces > 0,
+        rules.VALUES[dealer_upcard.get_rank()])
+    return hit_ev > stand_ev, stand_ev, hit_ev
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print the exact hit or stand chart of this table.")
+    parser.add_argument("--decks", type=int, default=1)
+    parser.add_argument("--ev", action="store_true",
+                        help="print the EV of the best play in every cell")
+    args = parser.parse_args()
+
+    begin = time.time()
+    table = chart(full_shoe(args.decks))
+    elapsed = time.time() - begin
+
+    names = ["%s" % (upcard if upcard != ACE else "A") for upcard in UPCARDS]
+    width = 7 if args.ev else 3
+    sys.stdout.write("      " + "".join(name.rjust(width) for name in names)
+                     + "\n")
+    for soft, rows in ((False, HARD_ROWS), (True, SOFT_ROWS)):
+        for total, _ in rows:
+            cells = []
+            for upcard in UPCARDS:
+                stand_ev, hit_ev = table[total, soft, upcard]
+                cell = "H" if hit_ev > stand_ev else "S"
+                if args.ev:
+                    cell += "%+.2f" % max(stand_ev, hit_ev)
+                cells.append(cell.rjust(width))
+            sys.stdout.write("%s %2i " % ("soft" if soft else "hard", total)
+                             + "".join(cells) + "\n")
+    sys.stderr.write("%i cells in %.1f s\n" % (len(table), elapsed))
+
+
+if __name__ == "__main__":
+    main()
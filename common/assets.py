@@ -0,0 +1,430 @@
+""" Local, content-addressed cache for the games' images and sounds.
+
+load_image and load_sound take the same URLs the games always used and
+hand simplegui a local file instead:
+
+1. Links to this repository's own assets/ folders resolve to the
+   bundled files, without any network access.
+2. Any other URL resolves through the on-disk cache. Files are stored
+   under the SHA-256 of their content and index.json maps each URL to
+   its hash, so a warm start only reads the index and checks files exist.
+3. A cache miss downloads the file once, unless offline mode is on. In
+   strict offline mode (SIMPLEGUI_OFFLINE=1 or set_offline(True)) a
+   miss raises AssetUnavailable instead of touching the network.
+
+The cache lives in SIMPLEGUI_ASSET_CACHE, or ~/.cache/python-simplegui-games.
+Fill it once for every game with:
+
+    python -m common.assets fetch
+
+image and sound return lazy handles instead: resolving starts at once
+on a small pool of background threads, and only the first get() waits
+for it. loading_screen wraps a draw handler so that a placeholder is
+drawn until every handle is ready, which keeps imports instant.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tokenize
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GAMES = ("blackjack", "memoji", "pong", "ricerocks", "stopwatch")
+
+# Links back to this repository's assets/ folders
+BUNDLED_URL = re.compile(
+    r"^https?://github\.com/andsnleo/python-simplegui-games/"
+    r"(?:blob|raw)/master/(\w+)/assets/([\w.-]+)(?:\?raw=true)?$")
+
+CACHE_DIR = os.environ.get("SIMPLEGUI_ASSET_CACHE") or os.path.join(
+    os.path.expanduser("~"), ".cache", "python-simplegui-games")
+
+offline = os.environ.get("SIMPLEGUI_OFFLINE", "") not in ("", "0")
+
+# Background threads resolving lazy handles
+WORKERS = 4
+
+# Backends that never read the files, like common.headless, turn this off
+# and get the URLs as they are
+resolve_urls = True
+
+# Print every asset's load latency once a game has loaded them all
+report_latency = os.environ.get("SIMPLEGUI_ASSET_REPORT", "") not in ("", "0")
+
+
+class AssetUnavailable(IOError):
+    """ Raised when an asset is needed offline but is not on disk. """
+
+
+def set_offline(strict=True):
+    """ Forbid (or allow again) any network access on cache misses. """
+    global offline
+    offline = strict
+
+
+def bundled_path(url):
+    """ Return the file bundled in this repository for url, or None. """
+    match = BUNDLED_URL.match(url)
+    if match:
+        path = os.path.join(ROOT, match.group(1), "assets", match.group(2))
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _replace(source, target):
+    """ Move source over target, in one step so that target never goes
+    missing. """
+    try:
+        os.replace(source, target)
+    except AttributeError:  # Python 2, whose rename fails on Windows
+        if os.path.exists(target):
+            os.remove(target)
+        os.rename(source, target)
+
+
+class AssetCache:
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self.index = None
+        # The worker threads resolve assets at the same time; this keeps
+        # them from reading or writing the index while another one does
+        self.lock = threading.Lock()
+
+    def _load_index(self):
+        """ Read the URL-to-hash index once per process. """
+        with self.lock:
+            if self.index is None:
+                try:
+                    with open(self.index_path) as index_file:
+                        self.index = json.load(index_file)
+                except (IOError, OSError, ValueError):
+                    self.index = {}
+            return self.index
+
+    def _partial(self, path):
+        """ Return a temporary name for path, of this thread's own. """
+        return "%s.%i-%i.part" % (path, os.getpid(),
+                                  threading.current_thread().ident)
+
+    def _object_path(self, digest, url):
+        """ Return where the file with the given hash is stored. """
+        extension = os.path.splitext(url.split("?")[0])[1]
+        return os.path.join(self.directory, "objects", digest + extension)
+
+    def lookup(self, url):
+        """ Return the cached file for url, or None on a miss. """
+        index = self._load_index()
+        with self.lock:
+            digest = index.get(url)
+        if digest:
+            path = self._object_path(digest, url)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def store(self, url, data):
+        """ Save data as the content of url and return its file. """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest, url)
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError:  # Made already, maybe by another thread
+            if not os.path.isdir(os.path.dirname(path)):
+                raise
+        if not os.path.isfile(path):
+            # Write to a temporary name first so a crash never leaves
+            # a truncated file under a valid hash
+            partial = self._partial(path)
+            with open(partial, "wb") as object_file:
+                object_file.write(data)
+            if os.path.isfile(path):  # Another thread stored it first
+                os.remove(partial)
+            else:
+                os.rename(partial, path)
+
+        index = self._load_index()
+        with self.lock:
+            index[url] = digest
+            partial = self._partial(self.index_path)
+            with open(partial, "w") as index_file:
+                json.dump(index, index_file, indent=1, sort_keys=True)
+            _replace(partial, self.index_path)
+        return path
+
+    def fetch(self, url):
+        """ Download url into the cache and return its file. """
+        # Imported here since it is slow and a warm start never needs it
+        try:
+            from urllib.request import urlopen
+        except ImportError:  # Python 2
+            from urllib2 import urlopen
+        response = urlopen(url)
+        try:
+            data = response.read()
+        finally:
+            response.close()
+        return self.store(url, data)
+
+    def resolve(self, url):
+        """ Return a local file holding url's content.
+
+        Raise AssetUnavailable on a miss in offline mode.
+        """
+        path = bundled_path(url) or self.lookup(url)
+        if path:
+            return path
+        if offline:
+            raise AssetUnavailable(
+                "%s is not cached and offline mode is on; "
+                "run 'python -m common.assets fetch' first" % url)
+        return self.fetch(url)
+
+
+cache = AssetCache()
+
+
+def locate(url):
+    """ Return what simplegui should load for url.
+
+    That is the local file when there is one. Outside offline mode, a
+    failed download falls back to the URL itself.
+    """
+    try:
+        return cache.resolve(url)
+    except AssetUnavailable:
+        raise
+    except (IOError, OSError):
+        return url
+
+
+def load_image(url):
+    """ Same as simplegui.load_image, served from the local cache. """
+    import simplegui
+    return simplegui.load_image(locate(url))
+
+
+def load_sound(url):
+    """ Same as simplegui.load_sound, served from the local cache. """
+    import simplegui
+    return simplegui.load_sound(locate(url))
+
+
+class LazyAsset:
+    """ An image or sound that starts loading as soon as it is declared.
+
+    A worker thread resolves the URL to a local file in the background;
+    get() waits for that if needed, then asks simplegui to load the file
+    once and returns the result from then on.
+    """
+
+    def __init__(self, kind, url):
+        self.kind = kind
+        self.url = url
+        self.path = None
+        self.error = None
+        self.asset = None
+        self.volume = None
+        self.resolved = threading.Event()
+        self.queued_at = time.time()
+        self.resolved_at = None
+        self.loaded_at = None
+
+    def resolve(self):
+        """ Find the local file for the URL; run by a worker thread. """
+        try:
+            self.path = locate(self.url) if resolve_urls else self.url
+        except Exception as error:
+            self.error = error
+        self.resolved_at = time.time()
+        self.resolved.set()
+
+    def ready(self):
+        """ Return whether get() would return without waiting. """
+        return self.resolved.is_set()
+
+    def get(self):
+        """ Return the loaded simplegui image or sound. """
+        if self.asset is None:
+            self.resolved.wait()
+            if self.error is not None:
+                raise self.error
+            import simplegui
+            if self.kind == "image":
+                self.asset = simplegui.load_image(self.path)
+            else:
+                self.asset = simplegui.load_sound(self.path)
+                if self.volume is not None:
+                    self.asset.set_volume(self.volume)
+            self.loaded_at = time.time()
+        return self.asset
+
+    def latency(self):
+        """ Return the seconds from declaration to loaded, or None. """
+        if self.loaded_at is None:
+            return None
+        return self.loaded_at - self.queued_at
+
+    # Sounds are configured at import time, before they are needed
+    def set_volume(self, volume):
+        if self.asset is None:
+            self.volume = volume
+        else:
+            self.asset.set_volume(volume)
+
+    def play(self):
+        self.get().play()
+
+    def pause(self):
+        self.get().pause()
+
+    def rewind(self):
+        self.get().rewind()
+
+
+handles = []
+jobs = queue.Queue()
+workers = []
+
+
+def _work():
+    """ Resolve queued handles forever. """
+    while True:
+        jobs.get().resolve()
+
+
+def _declare(kind, url):
+    """ Queue a new handle, starting the workers on first use. """
+    handle = LazyAsset(kind, url)
+    handles.append(handle)
+    if not resolve_urls:
+        handle.resolve()
+        return handle
+    if not workers:
+        for _ in range(WORKERS):
+            worker = threading.Thread(target=_work)
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+    jobs.put(handle)
+    return handle
+
+
+def image(url):
+    """ Return a LazyAsset for the image at url. """
+    return _declare("image", url)
+
+
+def sound(url):
+    """ Return a LazyAsset for the sound at url. """
+    return _declare("sound", url)
+
+
+def pending():
+    """ Return the declared handles that are not ready yet. """
+    return [handle for handle in handles if not handle.ready()]
+
+
+def report():
+    """ Return a line per loaded handle with its load latency. """
+    lines = []
+    for handle in handles:
+        latency = handle.latency()
+        if latency is not None:
+            lines.append("%8.1f ms  %s" % (latency * 1000, handle.url))
+    return lines
+
+
+def loading_screen(draw, width, height, on_ready=None):
+    """ Wrap draw so a progress placeholder shows while assets load.
+
+    Once every declared handle is ready, they are all loaded at once,
+    on_ready() is called and draw takes over for good.
+    """
+    state = {"ready": False}
+
+    def draw_or_wait(canvas):
+        if not state["ready"]:
+            waiting = len(pending())
+            if waiting:
+                done = len(handles) - waiting
+                canvas.draw_polygon(
+                    [(width * .25, height / 2 - 4),
+                     (width * .25 + width * .5 * done / len(handles),
+                      height / 2 - 4),
+                     (width * .25 + width * .5 * done / len(handles),
+                      height / 2 + 4),
+                     (width * .25, height / 2 + 4)],
+                    1, "rgba(255, 255, 255, .8)", "rgba(255, 255, 255, .8)")
+                canvas.draw_text(
+                    "Loading %i/%i" % (done, len(handles)),
+                    (width * .25, height / 2 - 16), 14,
+                    "rgba(255, 255, 255, .8)", "sans-serif")
+                return
+            for handle in handles:
+                handle.get()
+            state["ready"] = True
+            if report_latency:
+                print("\n".join(report()))
+            if on_ready is not None:
+                on_ready()
+        draw(canvas)
+
+    return draw_or_wait
+
+
+def game_urls(path):
+    """ Return the asset URLs written in the source file at path.
+
+    Adjacent string literals are joined the way Python joins them.
+    """
+    urls, pieces = [], []
+    with open(path) as source:
+        for token in tokenize.generate_tokens(source.readline):
+            if token[0] == tokenize.STRING:
+                pieces.append(token[1])
+            elif token[0] in (tokenize.NL, tokenize.NEWLINE,
+                              tokenize.COMMENT) and pieces:
+                continue
+            elif pieces:
+                text = "".join(ast.literal_eval(piece) for piece in pieces)
+                pieces = []
+                if re.match(r"^https?://", text):
+                    urls.append(text)
+    return urls
+
+
+def main(argv):
+    """ Command line entry point: fetch or list every game's assets. """
+    if len(argv) != 1 or argv[0] not in ("fetch", "list"):
+        sys.exit("usage: python -m common.assets fetch|list")
+
+    missing = 0
+    for game in GAMES:
+        for url in game_urls(os.path.join(ROOT, game, game + ".py")):
+            path = bundled_path(url) or cache.lookup(url)
+            if argv[0] == "fetch" and path is None:
+                try:
+                    path = cache.fetch(url)
+                except (IOError, OSError) as error:
+                    print("%s: %s" % (url, error))
+            if path is None:
+                missing += 1
+            print("%-10s %s\n           -> %s" % (game, url, path))
+    if missing:
+        sys.exit("%i asset(s) are not available locally" % missing)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
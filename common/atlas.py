@@ -0,0 +1,38 @@
+""" Frame tables for sprite sheets.
+
+An Atlas slices a sheet laid out as a grid of equally sized frames into
+a tuple of (center, size) pairs, computed once. Draw code then passes a
+table entry straight to canvas.draw_image instead of working out the
+source rectangle, and building new lists for it, on every frame.
+"""
+
+
+class Atlas:
+    def __init__(self, frame_size, columns, rows=1, first_center=None):
+        """ Slice a sheet of columns x rows frames of frame_size.
+
+        first_center is the center of the top-left frame in the sheet
+        and defaults to the middle of a frame. Frames are numbered row
+        by row.
+        """
+        width, height = frame_size
+        if first_center is None:
+            first_center = (width / 2.0, height / 2.0)
+        size = (width, height)
+        self.columns = columns
+        self.frames = tuple(
+            ((first_center[0] + width * column,
+              first_center[1] + height * row), size)
+            for row in range(rows) for column in range(columns))
+
+    def __len__(self):
+        """ Return the number of frames in the sheet. """
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        """ Return the (center, size) pair of frame index. """
+        return self.frames[index]
+
+    def at(self, column, row=0):
+        """ Return the (center, size) pair at column and row. """
+        return self.frames[row * self.columns + column]
@@ -0,0 +1,116 @@
+""" Keyboard bindings for any number of players, queued per tick.
+
+Key handlers used to test the key code against every binding, looking
+each key name up in KEY_MAP again on every event. Controls compiles the
+bindings once into a dict from key code to (player, command), so an
+event costs one lookup however many keys are bound, and rebinds at
+runtime by recompiling only the keys involved.
+
+Events are not applied as they arrive. The key handlers time-stamp them
+into a queue, and the game drains it once per tick, coalesced: a
+command only goes through when it changes whether the command is held,
+so auto-repeated keydowns and stray keyups are dropped, except for the
+commands that are allowed to repeat, and those at most once a tick.
+
+    controls = Controls(sg.KEY_MAP, [{"w": "up", "s": "down"},
+                                     {"up": "up", "down": "down"}])
+    frame.set_keydown_handler(controls.keydown)
+    frame.set_keyup_handler(controls.keyup)
+    ...
+    controls.apply(press, release)  # Once per tick, in the draw handler
+"""
+
+import time
+
+clock = getattr(time, "perf_counter", time.time)
+
+
+class Controls:
+    def __init__(self, key_map, players=(), repeats=()):
+        """ Bind the keys of each player, a dict from key name to command.
+
+        key_map maps key names to codes, like simplegui.KEY_MAP. Holding
+        the key of a command in repeats sends it again on every key
+        repeat, instead of once.
+        """
+        self.key_map = key_map
+        self.repeats = frozenset(repeats)
+        self.table = {}  # Key code to (player, command)
+        self.keys = {}  # (player, command) to its key name
+        self.held = set()  # (player, command) pairs the game holds down
+        self.queue = []  # (time, player, command, pressed), oldest first
+        for player, bindings in enumerate(players):
+            for key, command in bindings.items():
+                self.bind(key, command, player)
+
+    def bind(self, key, command, player=0):
+        """ Make key trigger command for player, alone.
+
+        The key command had before, and the command key had, are unbound.
+        """
+        self.unbind(self.keys.get((player, command)))
+        self.unbind(key)
+        self.table[self.key_map[key]] = (player, command)
+        self.keys[(player, command)] = key
+
+    def unbind(self, key):
+        """ Make key do nothing, releasing its command if it was held. """
+        if key is None:
+            return
+        binding = self.table.pop(self.key_map[key], None)
+        if binding is None:
+            return
+        del self.keys[binding]
+        if binding in self.held:
+            self.queue.append((clock(), binding[0], binding[1], False))
+
+    def bindings(self, player=0):
+        """ Return the key name of each command of player. """
+        return dict((command, key) for (owner, command), key
+                    in self.keys.items() if owner == player)
+
+    def keydown(self, code):
+        binding = self.table.get(code)
+        if binding is not None:
+            self.queue.append((clock(), binding[0], binding[1], True))
+
+    def keyup(self, code):
+        binding = self.table.get(code)
+        if binding is not None:
+            self.queue.append((clock(), binding[0], binding[1], False))
+
+    def drain(self):
+        """ Return the events queued since the last drain, coalesced.
+
+        Events come oldest first, as (time, player, command, pressed).
+        """
+        events, self.queue = self.queue, []
+        held, repeats = self.held, self.repeats
+        kept, repeated = [], set()
+        for event in events:
+            binding = event[1:3]
+            if event[3]:
+                if binding in held:
+                    if binding[1] not in repeats or binding in repeated:
+                        continue
+                    repeated.add(binding)
+                held.add(binding)
+            elif binding in held:
+                held.discard(binding)
+            else:
+                continue
+            kept.append(event)
+        return kept
+
+    def apply(self, press, release):
+        """ Drain the queue into press(command, player) and release. """
+        for _, player, command, pressed in self.drain():
+            if pressed:
+                press(command, player)
+            else:
+                release(command, player)
+
+    def reset(self):
+        """ Forget queued events and consider every key released. """
+        self.queue = []
+        self.held.clear()
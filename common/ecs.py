@@ -0,0 +1,300 @@
+""" A small entity-component system over dense, typed columns.
+
+A World keeps the state of its entities in columns, one array('d') per
+field, with one row per live entity and no holes: killing an entity
+moves the last row into its place. What an entity is made of is a mask
+of component bits in the flags column, and systems are plain functions
+that walk the columns once and act on the rows whose flags ask for it.
+A new kind of entity is a new mix of flags, not a new class with its own
+update() called once per object and frame.
+
+    world = ecs.World(WIDTH, HEIGHT)
+    ball = world.spawn(ecs.MOVES | ecs.BOUNCES | ecs.DRAWN,
+                       ecs.Circle(15, "white"), x=320, y=200, vx=3, radius=15)
+    ...
+    ecs.remember(world)  # Once per tick, before anything moves
+    ecs.move(world)
+    ...
+    ecs.render(world, canvas, alpha)
+
+Entities are Entity handles, which follow their row as it moves; games
+subclass Entity to give theirs a friendlier interface, and may recycle
+the handles of dead entities for new ones. Games may also
+define their own components, as bits from CUSTOM up, and the systems
+that go with them.
+"""
+
+from array import array
+
+# Components, as bits of the flags column
+MOVES = 1  # Position follows velocity, and angle follows spin
+WRAPS = 2  # Leaves by one edge of the world to come back by the other
+BOUNCES = 4  # Turns back when it touches the top or the bottom edge
+STAYS = 8  # Only moves up or down while it stays between those edges
+AGES = 16  # Expires once it lived more updates than its lifespan
+COLLIDES = 32  # A circle of its radius, for collide()
+DRAWN = 64  # Drawn by its look, which it must have
+CUSTOM = 128  # The first bit left to the games
+
+# The columns every world has, the previous position and angle being
+# the ones remember() saw, for render() to interpolate from
+FIELDS = ("x", "y", "vx", "vy", "angle", "spin", "age", "lifespan",
+          "radius", "prev_x", "prev_y", "prev_angle")
+
+
+class Entity(object):
+    """ A handle on one row of a World; row is None once it is dead. """
+
+    def __init__(self, world, row):
+        self.world = world
+        self.row = row
+
+    def alive(self):
+        return self.row is not None
+
+    def get(self, field):
+        return getattr(self.world, field)[self.row]
+
+    def set(self, field, value):
+        getattr(self.world, field)[self.row] = value
+
+    @property
+    def flags(self):
+        return self.world.flags[self.row]
+
+    @flags.setter
+    def flags(self, value):
+        self.world.flags[self.row] = value
+
+    @property
+    def look(self):
+        return self.world.looks[self.row]
+
+
+class World:
+    def __init__(self, width, height):
+        """ Create an empty world of the given size, in pixels. """
+        self.width = width
+        self.height = height
+        self.columns = []
+        for field in FIELDS:
+            column = array("d")
+            setattr(self, field, column)
+            self.columns.append(column)
+        self.flags = array("l")
+        self.looks = []  # What draws each row, or None
+        self.entities = []  # The handle of each row
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __iter__(self):
+        """ Iterate over a snapshot of the live entities, by row. """
+        return iter(list(self.entities))
+
+    def __contains__(self, entity):
+        return getattr(entity, "world", None) is self and \
+            entity.row is not None
+
+    def spawn(self, flags, look=None, handle=Entity, **fields):
+        """ Add an entity and return its handle, of class handle.
+
+        handle may also be a dead handle, of this world or another one,
+        which comes back to life as the new entity instead of a new one
+        being built. fields gives the initial value of columns, which
+        default to 0, and to an infinite lifespan.
+        """
+        row = len(self.entities)
+        fields.setdefault("lifespan", float("inf"))
+        for field, column in zip(FIELDS, self.columns):
+            column.append(fields.get(field, 0.0))
+        self.prev_x[row] = self.x[row]
+        self.prev_y[row] = self.y[row]
+        self.prev_angle[row] = self.angle[row]
+        self.flags.append(flags)
+        self.looks.append(look)
+        if isinstance(handle, Entity):
+            entity = handle
+            entity.world, entity.row = self, row
+        else:
+            entity = handle(self, row)
+        self.entities.append(entity)
+        return entity
+
+    def kill(self, entity):
+        """ Remove entity, if it lives in this world. """
+        if entity not in self:
+            return
+        row, last = entity.row, len(self.entities) - 1
+        if row != last:
+            # Fill the hole with the last row
+            for column in self.columns:
+                column[row] = column[last]
+            self.flags[row] = self.flags[last]
+            self.looks[row] = self.looks[last]
+            moved = self.entities[row] = self.entities[last]
+            moved.row = row
+        for column in self.columns:
+            column.pop()
+        self.flags.pop()
+        self.looks.pop()
+        self.entities.pop()
+        entity.row = None
+
+    # The names sprite groups use
+    discard = kill
+
+    def clear(self):
+        """ Kill every entity. """
+        for entity in self.entities:
+            entity.row = None
+        for column in self.columns:
+            del column[:]
+        del self.flags[:]
+        self.looks = []
+        self.entities = []
+
+
+# Systems
+def remember(world):
+    """ Keep where everything is, as the state render() starts from. """
+    world.prev_x[:] = world.x
+    world.prev_y[:] = world.y
+    world.prev_angle[:] = world.angle
+
+
+def move(world, only=0):
+    """ Advance the rows that move by one update, minding the edges.
+
+    With only, just the rows that also have every component of only
+    move, for games that move some entities before others.
+    """
+    x, y, vx, vy = world.x, world.y, world.vx, world.vy
+    angle, spin, radius = world.angle, world.spin, world.radius
+    width, height = world.width, world.height
+    mask = MOVES | only
+    for row, flags in enumerate(world.flags):
+        if flags & mask != mask:
+            continue
+        angle[row] += spin[row]
+        new_x, new_y = x[row] + vx[row], y[row] + vy[row]
+        if flags & WRAPS:
+            new_x %= width
+            new_y %= height
+        elif flags & STAYS and (new_y - radius[row] < 0 or
+                                new_y + radius[row] > height):
+            new_y = y[row]
+        x[row], y[row] = new_x, new_y
+        if flags & BOUNCES and (new_y <= radius[row] or
+                                new_y + radius[row] >= height):
+            vy[row] = -vy[row]
+
+
+def age(world):
+    """ Age the rows that age by one update; return the expired ones. """
+    ages, lifespan, entities = world.age, world.lifespan, world.entities
+    expired = []
+    for row, flags in enumerate(world.flags):
+        if flags & AGES:
+            ages[row] += 1
+            if ages[row] > lifespan[row]:
+                expired.append(entities[row])
+    return expired
+
+
+def shortest(gap, size):
+    """ Return gap, a difference of coordinates on an axis of size that
+    wraps, the short way round: between -size / 2 and size / 2. """
+    half = size / 2.0
+    return (gap + half) % size - half
+
+
+def collide(world, other, candidates=None):
+    """ Return the (entity, other_entity) pairs whose circles overlap.
+
+    Only the rows of both worlds that collide are tested, every one of
+    world against every one of other, unless candidates lists the pairs
+    worth testing, like a broad phase returns them. Two rows that both
+    wrap are measured across the edges of world too, the short way.
+    """
+    x, y, radius, flags = world.x, world.y, world.radius, world.flags
+    width, height = world.width, world.height
+    half_width, half_height = width / 2.0, height / 2.0
+    other_x, other_y = other.x, other.y
+    other_radius, other_flags = other.radius, other.flags
+    if candidates is None:
+        mine = [entity for entity in world.entities
+                if flags[entity.row] & COLLIDES]
+        theirs = [entity for entity in other.entities
+                  if other_flags[entity.row] & COLLIDES]
+        candidates = [(entity, other_entity) for entity in mine
+                      for other_entity in theirs]
+
+    pairs = []
+    for entity, other_entity in candidates:
+        row, other_row = entity.row, other_entity.row
+        if not (flags[row] & other_flags[other_row] & COLLIDES):
+            continue
+        gap_x, gap_y = x[row] - other_x[other_row], y[row] - other_y[other_row]
+        if flags[row] & other_flags[other_row] & WRAPS:
+            gap_x = (gap_x + half_width) % width - half_width
+            gap_y = (gap_y + half_height) % height - half_height
+        reach = radius[row] + other_radius[other_row]
+        if reach * reach > gap_x * gap_x + gap_y * gap_y:
+            pairs.append((entity, other_entity))
+    return pairs
+
+
+def render(world, canvas, alpha=1.0):
+    """ Draw the rows that are drawn, alpha of the way from the state
+    remember() kept to the current one. """
+    x, y, prev_x, prev_y = world.x, world.y, world.prev_x, world.prev_y
+    angle, prev_angle, ages = world.angle, world.prev_angle, world.age
+    width, height, looks = world.width, world.height, world.looks
+    half_width, half_height = width / 2.0, height / 2.0
+    for row, flags in enumerate(world.flags):
+        if not flags & DRAWN:
+            continue
+        start_x, start_y = prev_x[row], prev_y[row]
+        gap_x, gap_y = x[row] - start_x, y[row] - start_y
+        pos = [start_x + gap_x * alpha, start_y + gap_y * alpha]
+        if flags & WRAPS and not (-half_width < gap_x < half_width and
+                                  -half_height < gap_y < half_height):
+            # Came back by the other edge: go on past the one it left by
+            if gap_x >= half_width:
+                pos[0] = (pos[0] - width * alpha) % width
+            elif gap_x <= -half_width:
+                pos[0] = (pos[0] + width * alpha) % width
+            if gap_y >= half_height:
+                pos[1] = (pos[1] - height * alpha) % height
+            elif gap_y <= -half_height:
+                pos[1] = (pos[1] + height * alpha) % height
+        start = prev_angle[row]
+        looks[row].draw(canvas, pos, start + (angle[row] - start) * alpha,
+                        ages[row], flags)
+
+
+# Looks, called as look.draw(canvas, pos, angle, age, flags)
+class Circle:
+    def __init__(self, radius, color, line_width=1):
+        self.radius = radius
+        self.color = color
+        self.line_width = line_width
+
+    def draw(self, canvas, pos, angle, age, flags):
+        canvas.draw_circle(pos, self.radius, self.line_width, self.color,
+                           self.color)
+
+
+class Bar:
+    """ An upright bar centered on the entity, like a Pong paddle. """
+
+    def __init__(self, length, width, color):
+        self.length = length
+        self.width = width
+        self.color = color
+
+    def draw(self, canvas, pos, angle, age, flags):
+        half = self.length / 2.0
+        canvas.draw_line([pos[0], pos[1] - half], [pos[0], pos[1] + half],
+                         self.width, self.color)
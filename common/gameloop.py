@@ -0,0 +1,84 @@
+""" A fixed-timestep game loop for simplegui draw handlers.
+
+simplegui calls the draw handler once per display frame, and the games
+used to advance their state once per call, so a slow frame slowed the
+game down. A GameLoop stands in for the draw handler and decouples the
+two: it measures the time since the last frame, runs update() once for
+every whole step of 1 / rate seconds owed, and then renders with the
+fraction of a step left over, so drawings can be interpolated between
+the last two states:
+
+    loop = gameloop.GameLoop(update, render)  # render(canvas, alpha)
+    frame.set_draw_handler(loop.frame)
+
+A frame runs at most max_steps updates. The steps past that are not
+dropped but owed to the next frames, and every frame is still drawn:
+simplegui clears the canvas before each call, so a frame left undrawn
+would flash blank. A gap of more than pause seconds between two frames
+is another matter: the draw handler was not called at all, say because
+the window was hidden, so the game was paused rather than behind, and
+that time is not owed.
+
+Time comes from the module-level clock, in seconds; common.headless
+swaps in its virtual clock so headless runs stay deterministic.
+"""
+
+import time
+
+RATE = 60  # Updates per second
+MAX_STEPS = 5  # Updates a frame may run to catch up
+PAUSE = 1.0  # Seconds between two frames that count as a pause
+
+# Leeway for clocks whose periods are not exact multiples of a step
+EPSILON = 1e-6
+
+clock = getattr(time, "perf_counter", time.time)
+
+
+class GameLoop:
+    def __init__(self, update, render, rate=RATE, max_steps=MAX_STEPS,
+                 pause=PAUSE):
+        """ Call update() rate times a second, render(canvas, alpha) once
+        per drawn frame.
+
+        alpha in [0, 1] is how far time is between the state before the
+        last update and the state after it.
+        """
+        self.update = update
+        self.render = render
+        self.rate = rate
+        self.max_steps = max_steps
+        self.pause = pause
+        self.reset()
+
+    def reset(self):
+        """ Forget the time owed, as if the game had just started. """
+        self.last = None
+        self.owed = 0.0  # Steps, fractional
+        # Totals: frames, updates, and pauses whose time was not owed
+        self.frames = self.steps = self.pauses = 0
+
+    def advance(self):
+        """ Run the updates owed now; return whether the loop is behind. """
+        now = clock()
+        if self.last is not None:
+            if now - self.last > self.pause:
+                self.pauses += 1
+            else:
+                self.owed += (now - self.last) * self.rate
+        self.last = now
+
+        steps = 0
+        while self.owed >= 1 - EPSILON and steps < self.max_steps:
+            self.update()
+            self.owed = max(self.owed - 1, 0.0)
+            steps += 1
+        self.steps += steps
+        return self.owed >= 1 - EPSILON
+
+    def frame(self, canvas):
+        """ The draw handler: catch up with time as far as a frame may,
+        then draw. """
+        self.frames += 1
+        self.advance()
+        self.render(canvas, min(self.owed, 1.0))
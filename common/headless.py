@@ -0,0 +1,348 @@
+""" A simplegui backend that needs no display.
+
+It implements the part of the CodeSkulptor simplegui API the games use.
+Nothing is drawn: the canvas records the calls made on it, images and
+sounds only remember their URL and state, and time is a virtual clock
+that moves one frame period for every frame the driver asks for. Timers
+fire on that clock, so a minute of play takes as long as the CPU needs.
+
+Install it before importing a game, then drive the frame yourself:
+
+    from common import headless
+    headless.install()
+    import pong
+    frame = headless.frames[-1]
+    frame.key_down("up")
+    frame.run(600)  # Ten virtual seconds
+
+or run a game script headless from the repository root:
+
+    python -m common.headless pong/pong.py --frames 600
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Key codes as CodeSkulptor defines them
+KEY_MAP = {"space": 32, "left": 37, "up": 38, "right": 39, "down": 40}
+KEY_MAP.update((chr(code), code) for code in range(ord("0"), ord("9") + 1))
+KEY_MAP.update((chr(code + 32), code)
+               for code in range(ord("A"), ord("Z") + 1))
+
+FPS = 60
+
+
+class VirtualClock:
+    """ Milliseconds of virtual time, and the timers waiting on them. """
+
+    def __init__(self):
+        self.now = 0.0
+        self.timers = []
+
+    def advance(self, ms):
+        """ Move time forward by ms, firing every timer due meanwhile. """
+        target = self.now + ms
+        while True:
+            due = [timer for timer in self.timers
+                   if timer.running and timer.due <= target]
+            if not due:
+                break
+            timer = min(due, key=lambda timer: timer.due)
+            self.now = timer.due
+            timer.due += timer.interval
+            timer.fires += 1
+            timer.handler()
+        self.now = target
+
+
+clock = VirtualClock()
+frames = []
+
+
+class Timer:
+    def __init__(self, interval, handler):
+        self.interval = max(float(interval), 1.0)
+        self.handler = handler
+        self.running = False
+        self.due = None
+        self.fires = 0
+        clock.timers.append(self)
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.due = clock.now + self.interval
+
+    def stop(self):
+        self.running = False
+
+    def is_running(self):
+        return self.running
+
+
+class Canvas:
+    """ Records the drawing calls made during one frame. """
+
+    def __init__(self, record=True):
+        self.record = record
+        self.calls = []
+        self.count = 0
+
+    def _draw(self, name, args):
+        self.count += 1
+        if self.record:
+            self.calls.append((name, args))
+
+    def clear(self):
+        del self.calls[:]
+        self.count = 0
+
+    def draw_text(self, text, point, font_size, font_color,
+                  font_face="serif"):
+        self._draw("draw_text", (text, point, font_size, font_color,
+                                 font_face))
+
+    def draw_line(self, point1, point2, line_width, line_color):
+        self._draw("draw_line", (point1, point2, line_width, line_color))
+
+    def draw_polyline(self, point_list, line_width, line_color):
+        self._draw("draw_polyline", (point_list, line_width, line_color))
+
+    def draw_polygon(self, point_list, line_width, line_color,
+                     fill_color=None):
+        self._draw("draw_polygon", (point_list, line_width, line_color,
+                                    fill_color))
+
+    def draw_circle(self, center_point, radius, line_width, line_color,
+                    fill_color=None):
+        self._draw("draw_circle", (center_point, radius, line_width,
+                                   line_color, fill_color))
+
+    def draw_point(self, point, color):
+        self._draw("draw_point", (point, color))
+
+    def draw_image(self, image, center_source, width_height_source,
+                   center_dest, width_height_dest, rotation=0):
+        self._draw("draw_image", (image, center_source, width_height_source,
+                                  center_dest, width_height_dest, rotation))
+
+
+class Control:
+    """ A button, label or text input of the control panel. """
+
+    def __init__(self, kind, text, handler=None):
+        self.kind = kind
+        self.text = text
+        self.handler = handler
+
+    def get_text(self):
+        return self.text
+
+    def set_text(self, text):
+        self.text = text
+
+    def click(self):
+        """ Press the button. """
+        self.handler()
+
+    def submit(self, text):
+        """ Type text into the input and press enter. """
+        self.text = text
+        self.handler(text)
+
+
+class Frame:
+    def __init__(self, title, canvas_width, canvas_height, control_width=200):
+        self.title = title
+        self.canvas_width = canvas_width
+        self.canvas_height = canvas_height
+        self.background = "Black"
+        self.controls = []
+        self.handlers = {}
+        self.canvas = Canvas()
+        self.running = False
+        self.frame_count = 0
+        self.period = 1000.0 / FPS
+        frames.append(self)
+
+    def set_canvas_background(self, color):
+        self.background = color
+
+    def set_draw_handler(self, handler):
+        self.handlers["draw"] = handler
+
+    def set_keydown_handler(self, handler):
+        self.handlers["keydown"] = handler
+
+    def set_keyup_handler(self, handler):
+        self.handlers["keyup"] = handler
+
+    def set_mouseclick_handler(self, handler):
+        self.handlers["mouseclick"] = handler
+
+    def set_mousedrag_handler(self, handler):
+        self.handlers["mousedrag"] = handler
+
+    def add_button(self, text, button_handler, width=None):
+        return self._add(Control("button", text, button_handler))
+
+    def add_label(self, text, width=None):
+        return self._add(Control("label", text))
+
+    def add_input(self, text, input_handler, width=None):
+        return self._add(Control("input", text, input_handler))
+
+    def _add(self, control):
+        self.controls.append(control)
+        return control
+
+    def get_canvas_textwidth(self, text, size, font_face="serif"):
+        """ Estimate the width of text, since there is no font to ask. """
+        ratio = .6 if font_face == "monospace" else .5
+        return int(round(len(text) * size * ratio))
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    # Driving the frame
+    def button(self, text):
+        """ Return the control whose text is text. """
+        for control in self.controls:
+            if control.text == text:
+                return control
+        raise KeyError(text)
+
+    def _fire(self, event, *args):
+        handler = self.handlers.get(event)
+        if handler is not None:
+            handler(*args)
+
+    def key_down(self, key):
+        """ Send a keydown event for a KEY_MAP name or a key code. """
+        self._fire("keydown", KEY_MAP.get(key, key))
+
+    def key_up(self, key):
+        """ Send a keyup event for a KEY_MAP name or a key code. """
+        self._fire("keyup", KEY_MAP.get(key, key))
+
+    def click(self, pos):
+        self._fire("mouseclick", pos)
+
+    def drag(self, pos):
+        self._fire("mousedrag", pos)
+
+    def draw(self):
+        """ Call the draw handler once on a cleared canvas. """
+        self.canvas.clear()
+        self.frame_count += 1
+        self._fire("draw", self.canvas)
+
+    def run(self, count=1, realtime=False):
+        """ Run count frames: move the clock a period, then draw.
+
+        With realtime, frames are paced to the wall clock instead of
+        running back to back.
+        """
+        begin = time.time()
+        for index in range(count):
+            clock.advance(self.period)
+            self.draw()
+            if realtime:
+                delay = begin + (index + 1) * self.period / 1000 - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+        return count
+
+
+class Image:
+    def __init__(self, url):
+        self.url = url
+
+    def get_width(self):
+        return 0
+
+    def get_height(self):
+        return 0
+
+
+class Sound:
+    def __init__(self, url):
+        self.url = url
+        self.volume = 1.0
+        self.playing = False
+        self.plays = 0
+
+    def play(self):
+        self.playing = True
+        self.plays += 1
+
+    def pause(self):
+        self.playing = False
+
+    def rewind(self):
+        self.playing = False
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+
+def create_frame(title, canvas_width, canvas_height, control_width=200):
+    return Frame(title, canvas_width, canvas_height, control_width)
+
+
+def create_timer(interval, timer_handler):
+    return Timer(interval, timer_handler)
+
+
+def load_image(url):
+    return Image(url)
+
+
+def load_sound(url):
+    return Sound(url)
+
+
+def install():
+    """ Make 'import simplegui' load this module.
+
+    Assets are not fetched either, since nothing ever reads them, and
+    game loops keep time on the virtual clock.
+    """
+    from common import assets, gameloop
+    assets.resolve_urls = False
+    gameloop.clock = lambda: clock.now / 1000.0
+    sys.modules["simplegui"] = sys.modules[__name__]
+
+
+def main(argv):
+    """ Command line entry point: run a game script headless. """
+    parser = argparse.ArgumentParser(
+        prog="python -m common.headless",
+        description="Run a game headless for a number of frames.")
+    parser.add_argument("script")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--realtime", action="store_true",
+                        help="pace frames to the wall clock")
+    args = parser.parse_args(argv)
+
+    install()
+    # Imported rather than run, so the game's globals outlive the import
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    __import__(os.path.splitext(os.path.basename(args.script))[0])
+    frame = frames[-1]
+
+    begin = time.time()
+    frame.run(args.frames, args.realtime)
+    elapsed = time.time() - begin
+    print("%s: %i frames in %.3f s (%.0f frames/s), %i timer fires" % (
+        frame.title, args.frames, elapsed, args.frames / max(elapsed, 1e-9),
+        sum(timer.fires for timer in clock.timers)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
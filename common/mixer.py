@@ -0,0 +1,155 @@
+""" A bounded pool of voices per sound effect, mixed once per frame.
+
+A simplegui sound is a single voice: playing it again while it plays
+restarts it. When every missile and explosion shares one sound, heavy
+fire keeps cutting the same voice short, and a burst of explosions
+costs a rewind and a play call each.
+
+A Mixer gives each effect a few voices, separate sounds loaded from the
+same file, and stands an Effect in for the sound where the game used to
+play it. Playing an Effect only queues a trigger; mix(), once per frame,
+merges the triggers of each effect into one, so fifty explosions in a
+tick cost one play call. It then plays the trigger on a voice that is
+done, or steals the voice of lowest priority that started first, unless
+that one outranks the trigger, which is then dropped. A cap on the
+voices playing at once across effects is enforced the same way.
+
+simplegui cannot tell when a sound ends, so an effect declares how long
+it lasts and a voice counts as busy for that long.
+"""
+
+import time
+
+clock = getattr(time, "perf_counter", time.time)
+
+
+class Voice:
+    def __init__(self, sound):
+        self.sound = sound
+        self.priority = 0
+        self.started = None
+        self.until = None  # When it stops counting as busy
+
+    def busy(self, now):
+        return self.until is not None and now < self.until
+
+    def start(self, priority, now, duration):
+        self.priority = priority
+        self.started = now
+        self.until = now + duration
+        self.sound.rewind()
+        self.sound.play()
+
+    def stop(self):
+        self.until = None
+        self.sound.pause()
+        self.sound.rewind()
+
+
+class Effect:
+    """ Answers the calls of a simplegui sound by queueing them. """
+
+    def __init__(self, mixer, name, sounds, duration, priority):
+        self.mixer = mixer
+        self.name = name
+        self.voices = [Voice(sound) for sound in sounds]
+        self.duration = duration
+        self.priority = priority
+
+    def play(self, priority=None):
+        self.mixer.trigger(self.name, priority)
+
+    def rewind(self):
+        pass  # Every voice starts from the beginning anyway
+
+    def pause(self):
+        self.mixer.stop(self.name)
+
+    def set_volume(self, volume):
+        for voice in self.voices:
+            voice.sound.set_volume(volume)
+
+
+class Mixer:
+    def __init__(self, max_voices=None):
+        """ Mix effects, with at most max_voices playing at once. """
+        self.max_voices = max_voices
+        self.effects = {}
+        self.pending = {}  # Effect name to the priority to play it at
+        self.stopping = set()
+        # What the triggers cost: calls merged, voices played, stolen
+        # and triggers dropped for want of a voice
+        self.triggers = self.plays = self.steals = self.drops = 0
+
+    def add(self, name, sounds, duration, priority=0):
+        """ Return the Effect name, playing on sounds of duration seconds.
+
+        Each sound is one voice; load the same file once per voice.
+        """
+        effect = self.effects[name] = Effect(
+            self, name, sounds, duration, priority)
+        return effect
+
+    def trigger(self, name, priority=None):
+        """ Play the effect name at the next mix. """
+        if priority is None:
+            priority = self.effects[name].priority
+        self.triggers += 1
+        self.pending[name] = max(priority, self.pending.get(name, priority))
+
+    def stop(self, name):
+        """ Silence the effect name at the next mix, and drop its trigger. """
+        self.pending.pop(name, None)
+        self.stopping.add(name)
+
+    def _lowest(self, voices, now):
+        """ Return the busy voice to steal first, or None. """
+        busy = [voice for voice in voices if voice.busy(now)]
+        if not busy:
+            return None
+        return min(busy, key=lambda voice: (voice.priority, voice.started))
+
+    def mix(self, now=None):
+        """ Play the triggers queued since the last mix. """
+        now = clock() if now is None else now
+        for name in self.stopping:
+            # Even voices no longer counted as busy may still be heard,
+            # like a looping sound held past its duration
+            for voice in self.effects[name].voices:
+                voice.stop()
+        self.stopping = set()
+
+        pending, self.pending = self.pending, {}
+        for name in sorted(pending, key=pending.get, reverse=True):
+            effect, priority = self.effects[name], pending[name]
+            voice = None
+            for candidate in effect.voices:
+                if not candidate.busy(now):
+                    voice = candidate
+                    break
+            if voice is None:
+                voice = self._lowest(effect.voices, now)
+                if voice.priority > priority:
+                    self.drops += 1
+                    continue
+                self.steals += 1
+            elif self.max_voices is not None:
+                # Python 2 comprehensions would leak voice and effect
+                voices = [other for group in self.effects.values()
+                          for other in group.voices]
+                if sum(other.busy(now) for other in voices) >= \
+                        self.max_voices:
+                    victim = self._lowest(voices, now)
+                    if victim.priority > priority:
+                        self.drops += 1
+                        continue
+                    victim.stop()
+                    self.steals += 1
+            voice.start(priority, now, effect.duration)
+            self.plays += 1
+
+    def playing(self, now=None):
+        """ Return how many voices are busy. """
+        now = clock() if now is None else now
+        return sum(voice.busy(now) for effect in self.effects.values()
+                   for voice in effect.voices)
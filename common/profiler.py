@@ -0,0 +1,222 @@
+""" Per-frame timing of the games' hot paths, with an in-game overlay.
+
+A frame is split into named phases by laps: start_frame() starts the
+clock, each mark(phase) charges the time since the previous lap to
+phase, and end_frame() records the frame's total. Samples go to a ring
+buffer holding the last FRAMES frames, so memory stays fixed however
+long a game runs.
+
+Profiling is off unless SIMPLEGUI_PROFILE is set, and then every call is
+a single attribute check. The key TOGGLE_KEY turns it on and off in a
+game, and while on, an overlay graphs the frame times and breaks the
+last second down by phase. On exit, the p50/p95/p99 of every phase are
+printed, and written as JSON too when SIMPLEGUI_PROFILE names a .json
+file.
+
+Games use the module-level functions, which all share one Profiler:
+
+    frame.set_draw_handler(profiler.wrap_draw(draw, WIDTH, HEIGHT))
+    frame.set_keydown_handler(profiler.wrap_keydown(keydown))
+"""
+
+import atexit
+import json
+import os
+import sys
+import time
+
+FRAMES = 600  # Ten seconds at 60 frames per second
+TOGGLE_KEY = "p"
+BUDGET = 1000 / 60.0  # ms a frame may take at 60 frames per second
+
+# Overlay geometry and colors
+GRAPH_FRAMES = 120
+GRAPH_HEIGHT = 60
+OVERLAY_MARGIN = 10
+OVERLAY_FONT_SIZE = 12
+OVERLAY_COLOR = "rgba(255, 255, 255, .9)"
+OVERLAY_BACKGROUND = "rgba(0, 0, 0, .6)"
+BUDGET_COLOR = "rgba(255, 80, 80, .9)"
+
+clock = getattr(time, "perf_counter", time.time)
+
+
+def percentile(ordered, fraction):
+    """ Return the nearest-rank percentile of a sorted list. """
+    return ordered[int(round(fraction * (len(ordered) - 1)))]
+
+
+class Profiler:
+    def __init__(self, capacity=FRAMES, enabled=False):
+        self.capacity = capacity
+        self.enabled = enabled
+        self.used = enabled  # Whether there is anything to report
+        self.reset()
+
+    def reset(self):
+        """ Forget every recorded frame. """
+        self.phases = {}  # Phase name to its ring of ms per frame
+        self.order = []  # Phase names, in the order first seen
+        self.totals = [0.0] * self.capacity
+        self.cursor = -1
+        self.count = 0
+        self.begin = self.last = None
+
+    def toggle(self):
+        """ Turn profiling on with an empty buffer, or off. """
+        self.enabled = not self.enabled
+        if self.enabled:
+            self.used = True
+            self.reset()
+        elif self.last is not None:
+            # Drop the frame that was cut short
+            self.cursor = (self.cursor - 1) % self.capacity
+            self.last = None
+
+    def start_frame(self):
+        if not self.enabled:
+            return
+        self.cursor = (self.cursor + 1) % self.capacity
+        for samples in self.phases.values():
+            samples[self.cursor] = 0.0
+        self.begin = self.last = clock()
+
+    def mark(self, phase):
+        """ Charge the time since the previous lap to phase. """
+        if not self.enabled or self.last is None:
+            return
+        now = clock()
+        samples = self.phases.get(phase)
+        if samples is None:
+            samples = self.phases[phase] = [0.0] * self.capacity
+            self.order.append(phase)
+        samples[self.cursor] += (now - self.last) * 1000
+        self.last = now
+
+    def end_frame(self):
+        if not self.enabled or self.last is None:
+            return
+        self.totals[self.cursor] = (clock() - self.begin) * 1000
+        self.count = min(self.count + 1, self.capacity)
+        self.last = None
+
+    def recent(self, samples, frames=None):
+        """ Return up to frames of the latest samples, oldest first. """
+        frames = self.count if frames is None else min(frames, self.count)
+        return [samples[(self.cursor - age) % self.capacity]
+                for age in range(frames - 1, -1, -1)]
+
+    def summary(self):
+        """ Return the p50/p95/p99 and mean in ms of each phase. """
+        result = {}
+        if not self.count:
+            return result
+        for phase, samples in [("frame", self.totals)] + [
+                (phase, self.phases[phase]) for phase in self.order]:
+            ordered = sorted(self.recent(samples))
+            result[phase] = {
+                "p50": percentile(ordered, .50),
+                "p95": percentile(ordered, .95),
+                "p99": percentile(ordered, .99),
+                "mean": sum(ordered) / len(ordered)}
+        return result
+
+    def draw_overlay(self, canvas, width, height):
+        """ Draw the frame-time graph and the per-phase breakdown. """
+        if not self.count:
+            return
+        left = OVERLAY_MARGIN
+        bottom = height - OVERLAY_MARGIN
+        graph_width = GRAPH_FRAMES * 2
+        lines = len(self.order) + 1
+        top = bottom - GRAPH_HEIGHT - (lines + .5) * OVERLAY_FONT_SIZE * 1.3
+        canvas.draw_polygon(
+            [(left - 5, top), (left + graph_width + 5, top),
+             (left + graph_width + 5, bottom + 5), (left - 5, bottom + 5)],
+            1, OVERLAY_BACKGROUND, OVERLAY_BACKGROUND)
+
+        # Frame times, with the 60 fps budget at mid height
+        scale = GRAPH_HEIGHT / (2 * BUDGET)
+        canvas.draw_line((left, bottom - BUDGET * scale),
+                         (left + graph_width, bottom - BUDGET * scale),
+                         1, BUDGET_COLOR)
+        totals = self.recent(self.totals, GRAPH_FRAMES)
+        if len(totals) > 1:
+            canvas.draw_polyline(
+                [(left + 2 * index,
+                  bottom - min(total * scale, GRAPH_HEIGHT))
+                 for index, total in enumerate(totals)],
+                1, OVERLAY_COLOR)
+
+        # Mean of each phase over the last second
+        y = top + OVERLAY_FONT_SIZE * 1.3
+        for phase, samples in [("frame", self.totals)] + [
+                (phase, self.phases[phase]) for phase in self.order]:
+            last = self.recent(samples, 60)
+            canvas.draw_text(
+                "%-10s %6.2f ms" % (phase, sum(last) / len(last)),
+                (left, y), OVERLAY_FONT_SIZE, OVERLAY_COLOR, "monospace")
+            y += OVERLAY_FONT_SIZE * 1.3
+
+    def wrap_draw(self, draw, width, height, rest="draw"):
+        """ Return a draw handler that profiles draw as one frame.
+
+        Time draw does not charge to a phase itself goes to rest.
+        """
+        def draw_and_profile(canvas):
+            self.start_frame()
+            draw(canvas)
+            self.mark(rest)
+            self.end_frame()
+            if self.enabled:
+                self.draw_overlay(canvas, width, height)
+        return draw_and_profile
+
+    def wrap_keydown(self, keydown=None):
+        """ Return a keydown handler that toggles profiling on TOGGLE_KEY.
+
+        Every other key goes on to keydown, if there is one.
+        """
+        import simplegui
+        toggle_key = simplegui.KEY_MAP[TOGGLE_KEY]
+
+        def toggle_or_pass(key):
+            if key == toggle_key:
+                self.toggle()
+            elif keydown is not None:
+                keydown(key)
+        return toggle_or_pass
+
+    def report(self, destination=None):
+        """ Print the summary, and write it as JSON to destination. """
+        summary = self.summary()
+        if not summary:
+            return
+        lines = ["%-10s %8s %8s %8s  (last %i frames)" % (
+            "phase", "p50 ms", "p95 ms", "p99 ms", self.count)]
+        for phase in ["frame"] + self.order:
+            lines.append("%-10s %8.3f %8.3f %8.3f" % (
+                phase, summary[phase]["p50"], summary[phase]["p95"],
+                summary[phase]["p99"]))
+        sys.stderr.write("\n".join(lines) + "\n")
+        if destination:
+            with open(destination, "w") as summary_file:
+                json.dump(summary, summary_file, indent=1, sort_keys=True)
+
+
+setting = os.environ.get("SIMPLEGUI_PROFILE", "")
+default = Profiler(enabled=setting not in ("", "0"))
+
+start_frame = default.start_frame
+mark = default.mark
+end_frame = default.end_frame
+toggle = default.toggle
+summary = default.summary
+wrap_draw = default.wrap_draw
+wrap_keydown = default.wrap_keydown
+
+
+@atexit.register
+def _report_on_exit():
+    if default.used:
+        default.report(setting if setting.endswith(".json") else None)
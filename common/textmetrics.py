@@ -0,0 +1,70 @@
+""" Memoized canvas text measurement shared by every game.
+
+frame.get_canvas_textwidth asks the GUI backend to lay out the text each
+time, yet HUDs measure the same few strings on every frame. TextMetrics
+keeps the last widths in a bounded LRU cache keyed by (text, size,
+family). Numeric strings can skip the backend even on a miss: once the
+digit widths for a font are pre-warmed, their width is the sum of the
+cached glyph widths.
+"""
+
+from collections import OrderedDict
+
+DIGITS = "0123456789"
+
+
+class TextMetrics:
+    def __init__(self, frame, capacity=256):
+        self.frame = frame
+        self.capacity = capacity
+        self.widths = OrderedDict()
+        # Per-glyph widths, keyed by (size, family)
+        self.glyphs = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _measure(self, text, size, family):
+        """ Return the width of text, asking the backend if needed. """
+        glyphs = self.glyphs.get((size, family))
+        if glyphs is not None:
+            try:
+                return sum(glyphs[char] for char in text)
+            except KeyError:
+                pass  # Some glyph was never pre-warmed
+        self.misses += 1
+        return self.frame.get_canvas_textwidth(text, size, family)
+
+    def width(self, text, size, family="serif"):
+        """ Same as frame.get_canvas_textwidth, but memoized. """
+        key = (text, size, family)
+        widths = self.widths
+        if key in widths:
+            self.hits += 1
+            # Move the entry to the most recently used end
+            value = widths.pop(key)
+            widths[key] = value
+            return value
+
+        value = self._measure(text, size, family)
+        widths[key] = value
+        if len(widths) > self.capacity:
+            widths.popitem(last=False)
+        return value
+
+    def prewarm_digits(self, size, family="serif", extra=""):
+        """ Measure every digit, plus the glyphs in extra, one by one.
+
+        Afterwards, strings made only of those glyphs are measured by
+        adding up their widths.
+        """
+        glyphs = self.glyphs.setdefault((size, family), {})
+        for char in DIGITS + extra:
+            if char not in glyphs:
+                self.misses += 1
+                glyphs[char] = self.frame.get_canvas_textwidth(
+                    char, size, family)
+
+    def stats(self):
+        """ Return a dict with the cache's hit and miss counters. """
+        return {"hits": self.hits, "misses": self.misses,
+                "entries": len(self.widths), "capacity": self.capacity}
@@ -2,24 +2,26 @@ import simplegui as sg
 import random
 import math
 
+from common import assets, profiler, textmetrics
+
 # Load sprites
-TILE_DOWN = sg.load_image(
+TILE_DOWN = assets.image(
     "https://github.com/andsnleo/python-simplegui-games/blob/master/memoji/assets/down.png?raw=true")
-CAKE = sg.load_image(
+CAKE = assets.image(
     "https://github.com/andsnleo/python-simplegui-games/blob/master/memoji/assets/cake.png?raw=true")
-HAPPY = sg.load_image(
+HAPPY = assets.image(
     "https://github.com/andsnleo/python-simplegui-games/blob/master/memoji/assets/happy.png?raw=true")
-HIFIVE = sg.load_image(
+HIFIVE = assets.image(
     "https://github.com/andsnleo/python-simplegui-games/blob/master/memoji/assets/hifive.png?raw=true")
-MAGIC8 = sg.load_image(
+MAGIC8 = assets.image(
     "https://github.com/andsnleo/python-simplegui-games/blob/master/memoji/assets/magic8.png?raw=true")
-MONKEY = sg.load_image(
+MONKEY = assets.image(
     "https://github.com/andsnleo/python-simplegui-games/blob/master/memoji/assets/monkey.png?raw=true")
-PARTY = sg.load_image(
+PARTY = assets.image(
     "https://github.com/andsnleo/python-simplegui-games/blob/master/memoji/assets/party.png?raw=true")
-PIG = sg.load_image(
+PIG = assets.image(
     "https://github.com/andsnleo/python-simplegui-games/blob/master/memoji/assets/pig.png?raw=true")
-STAR = sg.load_image(
+STAR = assets.image(
     "https://github.com/andsnleo/python-simplegui-games/blob/master/memoji/assets/star.png?raw=true")
 
 # Tiles traits
@@ -75,14 +77,14 @@ class Tile:
         if self.exposed:
             # Tile facing up
             canvas.draw_image(
-                self.img_object,
+                self.img_object.get(),
                 [TILE_WIDTH / 2, TILE_HEIGHT / 2],
                 [TILE_WIDTH, TILE_HEIGHT],
                 self.location, [TILE_WIDTH, TILE_HEIGHT])
         else:
             # Tile facing down
             canvas.draw_image(
-                TILE_DOWN,
+                TILE_DOWN.get(),
                 [TILE_WIDTH / 2, TILE_HEIGHT / 2],
                 [TILE_WIDTH, TILE_HEIGHT],
                 self.location, [TILE_WIDTH, TILE_HEIGHT])
@@ -105,9 +107,9 @@ def new_game():
     global my_tiles, flipped, turns
 
     # Get text width of TITLE and CONGRATS messages
-    TITLE["width"] = frame.get_canvas_textwidth(
+    TITLE["width"] = metrics.width(
         TITLE["text"], BIGGER_FONT_SIZE, "sans-serif")
-    CONGRATS["width"] = frame.get_canvas_textwidth(
+    CONGRATS["width"] = metrics.width(
         CONGRATS["text"], SMALLER_FONT_SIZE, "sans-serif")
 
     emojis = [CAKE, HAPPY, HIFIVE, MAGIC8, MONKEY, PARTY, PIG, STAR] * 2
@@ -196,6 +198,7 @@ def click(pos):
 
 # Create frame
 frame = sg.create_frame("Memoji", CNV_WIDTH, CNV_HEIGHT, CTRLA)
+metrics = textmetrics.TextMetrics(frame)
 
 # Register event handlers
 frame.set_canvas_background("#38754f")
@@ -207,7 +210,9 @@ rec = frame.add_label("Your record: %i" % record, CTRLA)
 frame.add_label("")
 frame.add_label("")
 frame.add_button("Shuffle cards", new_game, CTRLA)
-frame.set_draw_handler(draw)
+frame.set_draw_handler(profiler.wrap_draw(
+    assets.loading_screen(draw, CNV_WIDTH, CNV_HEIGHT), CNV_WIDTH, CNV_HEIGHT))
+frame.set_keydown_handler(profiler.wrap_keydown())
 frame.set_mouseclick_handler(click)
 
 # Initialization
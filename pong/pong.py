@@ -2,6 +2,9 @@
 
 import simplegui as sg
 import random
+from math import fabs
+
+from common import controls, ecs, gameloop, profiler, textmetrics
 
 # CONSTANTS
 WIDTH = 650
@@ -22,23 +25,51 @@ RIGHT = True
 HEADER = "Pong"
 RULES1 = "Use the keys W and S to move the left paddle"
 RULES2 = "and the UP and DOWN arrows to move the right paddle"
+# Keys moving the left and the right paddle, and where they move it
+PADDLE_KEYS = [{"w": "up", "s": "down"}, {"up": "up", "down": "down"}]
+PADDLE_VELS = {"up": -PAD_VEL, "down": PAD_VEL}
+# What the ball and the paddles are made of
+BALL = ecs.MOVES | ecs.BOUNCES | ecs.DRAWN
+PADDLE = ecs.MOVES | ecs.STAYS | ecs.DRAWN
+BALL_LOOK = ecs.Circle(BALL_RADIUS, '#fafafa')
+PADDLE_LOOK = ecs.Bar(PAD_HEIGHT, PAD_WIDTH, 'rgba(255, 255, 255, 1)')
 
 
 # HELPER FUNCTIONS
 def spawn_ball(direction):
-    """ Reset ball's coordinates and velocity.
+    """ Replace the ball with a new one.
 
     Place ball in the center of the canvas and determine
-    if it moves right (ball_vel[1] > 0) or left (ball_vel[1] < 0].
+    if it moves right (vx > 0) or left (vx < 0). It only shows
+    once the countdown is over.
     """
 
-    global ball_pos, ball_vel
-    ball_pos = [WIDTH / 2, HEIGHT / 2]
+    global ball
+    if ball is not None:
+        table.kill(ball)
     # Assign random velocity values to the ball
-    ball_vel = [random.randrange(150, 200) / 60.0,
-                -random.randrange(120, 160) / 60.0]
+    vx = random.randrange(150, 200) / 60.0
+    vy = -random.randrange(120, 160) / 60.0
     if direction == LEFT:
-        ball_vel[0] = -ball_vel[0]
+        vx = -vx
+    ball = table.spawn(
+        BALL if countdown <= 0 else BALL & ~ecs.DRAWN, BALL_LOOK,
+        x=WIDTH / 2, y=HEIGHT / 2, vx=vx, vy=vy, radius=BALL_RADIUS)
+
+
+def returns(paddle):
+    """ Return whether paddle stands between the ball and its gutter. """
+    top = int(paddle.get("y") - HALF_PAD_HEIGHT)
+    return int(ball.get("y")) in range(top - 5, top + PAD_HEIGHT + 5)
+
+
+def send_back():
+    """ Turn the ball back, faster unless it reached VEL_LIMIT. """
+    vx = -ball.get("vx")
+    # Accelerate only when the ball is under VEL_LIMIT
+    if fabs(vx) < VEL_LIMIT:
+        vx = vx * ACCEL
+    ball.set("vx", vx)
 
 
 # EVENT HANDLERS
@@ -49,14 +80,18 @@ def new_game():
     reset scores and start 3-second countdown before ball spawn.
     """
 
-    global paddle1_pos, paddle2_pos, paddle1_vel, paddle2_vel
+    global paddles, ball
     global countdown, score1, score2
 
     timer.start()
 
-    paddle1_pos = HEIGHT / 2 - HALF_PAD_HEIGHT
-    paddle2_pos = HEIGHT / 2 - HALF_PAD_HEIGHT
-    paddle1_vel, paddle2_vel = 0, 0
+    table.clear()
+    ball = None
+    paddles = [
+        table.spawn(PADDLE, PADDLE_LOOK, x=x, y=HEIGHT / 2,
+                    radius=HALF_PAD_HEIGHT)
+        for x in (HALF_PAD_WIDTH, WIDTH - HALF_PAD_WIDTH)]
+    keys.reset()
 
     countdown = 5
     score1, score2 = 0, 0
@@ -66,12 +101,48 @@ def new_game():
     spawn_ball(direction)
 
 
-def draw(canvas):
-    """ Create and update elements in the canvas. """
-    global paddle1_pos, paddle2_pos, paddle1_vel, paddle2_vel
-    global ball_pos, ball_vel
-    global countdown, score1, score2
-
+def update():
+    """ Advance the ball and the paddles by one tick. """
+    global score1, score2
+
+    # Move the paddles as the keys pressed since the last tick say
+    keys.apply(press, release)
+
+    # Nothing moves until the countdown is over
+    if countdown > 0:
+        return
+    timer.stop()
+
+    # Keep the state before this tick, to draw in between, then move
+    # the ball, bouncing off the top and the bottom of the canvas
+    ecs.remember(table)
+    ecs.move(table, ecs.BOUNCES)
+
+    x = ball.get("x")
+    # Check if the ball touches the left gutter
+    if x - BALL_RADIUS <= PAD_WIDTH:
+        # Determine whether the left paddle's behind the gutter
+        if returns(paddles[0]):
+            send_back()
+        else:
+            score2 += 1
+            spawn_ball(RIGHT)
+    # Check if the ball touches the right gutter
+    elif x + BALL_RADIUS >= WIDTH - PAD_WIDTH:
+        # Determine whether the right paddle's behind the gutter
+        if returns(paddles[1]):
+            send_back()
+        else:
+            score1 += 1
+            spawn_ball(LEFT)
+
+    # Only then move the paddles, if they're kept in the canvas
+    ecs.move(table, ecs.STAYS)
+    profiler.mark("update")
+
+
+def draw(canvas, alpha):
+    """ Draw the table alpha of the way from the last tick to this one. """
     # Draw left gutter
     canvas.draw_line(
         [PAD_WIDTH, 0], [PAD_WIDTH, HEIGHT], 1,
@@ -80,32 +151,19 @@ def draw(canvas):
     canvas.draw_line(
         [WIDTH - PAD_WIDTH, 0], [WIDTH - PAD_WIDTH, HEIGHT], 1,
         'rgba(255, 255, 255, .3)')
-    # Draw left paddle
-    canvas.draw_line(
-        [HALF_PAD_WIDTH, paddle1_pos],
-        [HALF_PAD_WIDTH, paddle1_pos + PAD_HEIGHT],
-        PAD_WIDTH, 'rgba(255, 255, 255, 1)')
-    # Draw right paddle
-    canvas.draw_line(
-        [WIDTH - HALF_PAD_WIDTH, paddle2_pos],
-        [WIDTH - HALF_PAD_WIDTH, paddle2_pos + PAD_HEIGHT],
-        PAD_WIDTH, 'rgba(255, 255, 255, 1)')
+    # Draw the paddles, and the ball once the countdown is over
+    ecs.render(table, canvas, alpha)
 
     # When the countdown stop running
     if countdown <= 0:
-        timer.stop()
-
         # Draw mid line and gutters
         canvas.draw_line(
             [WIDTH / 2, 0], [WIDTH / 2, HEIGHT], 1,
             'rgba(255, 255, 255, .3)')
-
-        # Draw ball
-        canvas.draw_circle(
-            ball_pos, BALL_RADIUS, 1, '#fafafa', '#fafafa')
+        profiler.mark("draw")
 
         # Get the left score width
-        score1_width = frame.get_canvas_textwidth(
+        score1_width = metrics.width(
             str(score1), FONT_SIZE, FONT_FAMILY)
         # Draw left score
         canvas.draw_text(
@@ -115,53 +173,12 @@ def draw(canvas):
         canvas.draw_text(
             str(score2), [WIDTH / 2 + 30, 70],
             FONT_SIZE, 'rgba(255, 255, 255, 0.5)', FONT_FAMILY)
-
-        # Update ball coordinates based on velocity vector
-        ball_pos[0] += ball_vel[0]  # x
-        ball_pos[1] += ball_vel[1]  # y
-
-        # Check if the ball hits the top or the bottom of the canvas
-        if ball_pos[1] <= BALL_RADIUS or ball_pos[1] + BALL_RADIUS >= HEIGHT:
-            # Bounce ball back to the table
-            ball_vel[1] = -ball_vel[1]
-
-        # Check if the ball touches the left gutter
-        if ball_pos[0] - BALL_RADIUS <= PAD_WIDTH:
-            # Determine whether the left paddle's behind the gutter
-            if int(ball_pos[1]) in range(
-                    int(paddle1_pos) - 5, int(paddle1_pos) + PAD_HEIGHT + 5):
-                ball_vel[0] = -ball_vel[0]
-                # Accelerate only when ball_vel is under VEL_LIMIT
-                if fabs(ball_vel[0]) < VEL_LIMIT:
-                    ball_vel[0] = ball_vel[0] * ACCEL
-            else:
-                score2 += 1
-                spawn_ball(RIGHT)
-        # Check if the ball touches the right gutter
-        elif ball_pos[0] + BALL_RADIUS >= WIDTH - PAD_WIDTH:
-            # Determine whether the right paddle's behind the gutter
-            if int(ball_pos[1]) in range(
-                    int(paddle2_pos) - 5, int(paddle2_pos) + PAD_HEIGHT + 5):
-                ball_vel[0] = -ball_vel[0]
-                # Accelerate only when ball_vel is under VEL_LIMIT
-                if fabs(ball_vel[0]) < VEL_LIMIT:
-                    ball_vel[0] = ball_vel[0] * ACCEL
-            else:
-                score1 += 1
-                spawn_ball(LEFT)
-
-        # Update paddle position only if it's kept in the canvas
-        if not (paddle1_pos + paddle1_vel < 0 or
-                paddle1_pos + paddle1_vel > HEIGHT - PAD_HEIGHT):
-            paddle1_pos += paddle1_vel
-        if not (paddle2_pos + paddle2_vel < 0 or
-                paddle2_pos + paddle2_vel > HEIGHT - PAD_HEIGHT):
-            paddle2_pos += paddle2_vel
+        profiler.mark("hud")
 
     # When the countdown's still running
     else:
         # Draw and center the title of the game
-        header_width = frame.get_canvas_textwidth(
+        header_width = metrics.width(
             HEADER, FONT_SIZE, FONT_FAMILY)
         canvas.draw_text(
             HEADER,
@@ -169,13 +186,13 @@ def draw(canvas):
             FONT_SIZE, 'rgba(255, 255, 255, 1)', FONT_FAMILY)
 
         # Draw and center the game's instructions
-        rules_width = frame.get_canvas_textwidth(
+        rules_width = metrics.width(
             RULES1, SMALLER_FONT, FONT_FAMILY)
         canvas.draw_text(
             RULES1,
             [WIDTH / 2 - rules_width / 2, HEIGHT / 2 - SMALLER_FONT / 2],
             SMALLER_FONT, 'rgba(255, 255, 255, .95)', FONT_FAMILY)
-        rules_width = frame.get_canvas_textwidth(
+        rules_width = metrics.width(
             RULES2, SMALLER_FONT, FONT_FAMILY)
         canvas.draw_text(
             RULES2,
@@ -183,7 +200,7 @@ def draw(canvas):
             SMALLER_FONT, 'rgba(255, 255, 255, .95)', FONT_FAMILY)
 
         # Draw countdown in the center of the canvas
-        countdown_width = frame.get_canvas_textwidth(
+        countdown_width = metrics.width(
             str(countdown), FONT_SIZE, FONT_FAMILY)
         canvas.draw_text(
             str(countdown),
@@ -195,43 +212,39 @@ def tick():
     """ Update global countdown every second. """
     global countdown
     countdown -= 1
+    if countdown <= 0:
+        ball.flags |= ecs.DRAWN
+
+
+def press(command, player):
+    """ Move the left (player 0) or right paddle up or down. """
+    paddles[player].set("vy", PADDLE_VELS[command])
+
+
+def release(command, player):
+    """ Stop the left (player 0) or right paddle. """
+    paddles[player].set("vy", 0)
 
 
-def keydown(key):
-    global paddle1_vel, paddle2_vel
-    # Left paddle
-    if key == sg.KEY_MAP["w"]:
-        paddle1_vel = -PAD_VEL
-    elif key == sg.KEY_MAP["s"]:
-        paddle1_vel = PAD_VEL
-    # Right paddle
-    if key == sg.KEY_MAP["up"]:
-        paddle2_vel = -PAD_VEL
-    elif key == sg.KEY_MAP["down"]:
-        paddle2_vel = PAD_VEL
-
-
-def keyup(key):
-    global paddle1_vel, paddle2_vel
-    # Left paddle
-    if key == sg.KEY_MAP["w"]:
-        paddle1_vel = 0
-    elif key == sg.KEY_MAP["s"]:
-        paddle1_vel = 0
-    # Right paddle
-    if key == sg.KEY_MAP["up"]:
-        paddle2_vel = 0
-    elif key == sg.KEY_MAP["down"]:
-        paddle2_vel = 0
+keys = controls.Controls(sg.KEY_MAP, PADDLE_KEYS)
+# The ball and the paddles, created by new_game
+table = ecs.World(WIDTH, HEIGHT)
+ball = None
+paddles = []
+# The table moves 60 times a second, whatever the frame rate
+loop = gameloop.GameLoop(update, draw)
 
 # Create frame
 frame = sg.create_frame("Pong", WIDTH, HEIGHT, 100)
+# Measure text once, and scores and countdown glyph by glyph
+metrics = textmetrics.TextMetrics(frame)
+metrics.prewarm_digits(FONT_SIZE, FONT_FAMILY)
 timer = sg.create_timer(1000, tick)
 frame.set_canvas_background('#304196')
 frame.add_button("Restart", new_game, 100)
-frame.set_draw_handler(draw)
-frame.set_keydown_handler(keydown)
-frame.set_keyup_handler(keyup)
+frame.set_draw_handler(profiler.wrap_draw(loop.frame, WIDTH, HEIGHT))
+frame.set_keydown_handler(profiler.wrap_keydown(keys.keydown))
+frame.set_keyup_handler(keys.keyup)
 
 # Start frame
 new_game()
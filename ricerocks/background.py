@@ -0,0 +1,84 @@
+""" RiceRocks' layered, scrolling background.
+
+A Background stacks full-screen layers, each scrolling sideways at its
+own speed for a parallax effect; a speed of zero makes a static layer,
+like the nebula. The draw calls of each layer are worked out from the
+layer's geometry once: static layers keep a ready-made argument tuple,
+and a scrolling layer only computes where its seam lies.
+
+A scrolling layer used to be drawn as two full copies side by side,
+half of each off the canvas. Here each copy is cropped at the source to
+the part that shows, so a layer costs exactly one screen of pixels
+whatever its offset, and a single blit when the seam is at the edge.
+simplegui has no offscreen canvas to flatten the layers into, so the
+cost still grows with the number of layers, but by one screen each.
+"""
+
+
+class Layer:
+    def __init__(self, image, info, width, height, speed=0):
+        """ A layer showing image, as described by info, over the canvas.
+
+        speed is in pixels per tick, to the right.
+        """
+        self.image = image
+        self.speed = speed
+        self.width = width
+        self.height = height
+        center, size = info.get_center(), info.get_size()
+        self.source_left = center[0] - size[0] / 2.0
+        self.source_y = center[1]
+        self.source_height = size[1]
+        self.scale = float(width) / size[0]  # Canvas pixels per source one
+        self.whole = (image, center, size,
+                      (width / 2.0, height / 2.0), (width, height))
+
+    def draw(self, canvas, time):
+        if not self.speed:
+            canvas.draw_image(*self.whole)
+            return
+
+        # Whole pixels, so neither piece is ever a sliver
+        offset = int(time * self.speed) % self.width
+        seam = self.source_left + (self.width - offset) / self.scale
+        source_right = self.source_left + self.width / self.scale
+        # The copy entering from the left, up to the seam on the canvas...
+        if offset > 0:
+            canvas.draw_image(
+                self.image,
+                ((seam + source_right) / 2, self.source_y),
+                (source_right - seam, self.source_height),
+                (offset / 2.0, self.height / 2.0),
+                (offset, self.height))
+        # ...and the copy leaving on the right
+        if offset < self.width:
+            canvas.draw_image(
+                self.image,
+                ((self.source_left + seam) / 2, self.source_y),
+                (seam - self.source_left, self.source_height),
+                ((offset + self.width) / 2.0, self.height / 2.0),
+                (self.width - offset, self.height))
+
+
+class Background:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.layers = []
+
+    def add(self, image, info, speed=0):
+        """ Stack a layer on top of the others. """
+        self.layers.append(Layer(image, info, self.width, self.height, speed))
+
+    def add_parallax(self, image, info, speed, count):
+        """ Stack count layers of image, the nearer ones scrolling faster.
+
+        The farthest moves at speed and the nearest at count * speed.
+        """
+        for depth in range(count):
+            self.add(image, info, speed * (depth + 1))
+
+    def draw(self, canvas, time):
+        """ Draw every layer as it is after time ticks. """
+        for layer in self.layers:
+            layer.draw(canvas, time)
@@ -0,0 +1,170 @@
+""" Run many RiceRocks episodes with an autopilot, across processes.
+
+An episode is one headless game, from start to game over or to a tick
+limit, flown by a policy: a function called every tick as
+
+    policy(game, ship, tick) -> (thrust, turn, fire)
+
+where turn is -1 (left), 0 or 1 (right). Each episode gets its own
+Engine, seeded from the batch seed and the episode number alone, so a
+result can be reproduced however the episodes were sharded. Episodes go
+to a process pool in small chunks and results stream back, one line per
+episode, as each chunk finishes:
+
+    PYTHONPATH=. python ricerocks/batch.py --policy aim --episodes 1000
+
+Policies are named in POLICIES, or given as module:function.
+"""
+
+import argparse
+import importlib
+import json
+import math
+import multiprocessing
+import sys
+import time
+
+import engine
+
+MAX_TICKS = 60 * 60 * 5  # Five minutes of play
+CHUNK = 8  # Episodes per task sent to a worker
+FIRE_PERIOD = 10  # Ticks between two shots of the built-in policies
+AIM_TOLERANCE = .1  # Radians off target a shot is still worth it
+
+
+# Built-in policies
+def idle(game, ship, tick):
+    """ Sit still and never shoot. """
+    return False, 0, False
+
+
+def spin(game, ship, tick):
+    """ Turn in circles and shoot all around. """
+    return False, 1, tick % FIRE_PERIOD == 0
+
+
+def aim(game, ship, tick):
+    """ Turn towards the nearest rock and shoot once facing it. """
+    x, y = ship.get_position()
+    nearest, target = None, None
+    for rock in game.sprites["rocks"]:
+        rock_x, rock_y = rock.get_position()
+        gap = (rock_x - x) ** 2 + (rock_y - y) ** 2
+        if nearest is None or gap < nearest:
+            nearest, target = gap, (rock_x - x, rock_y - y)
+    if target is None:
+        return False, 0, False
+
+    # Signed angle from the ship's heading to the rock, in [-pi, pi)
+    off = (math.atan2(target[1], target[0]) - ship.angle + math.pi) % (
+        2 * math.pi) - math.pi
+    turn = 0 if abs(off) < AIM_TOLERANCE / 2 else (1 if off > 0 else -1)
+    return False, turn, (abs(off) < AIM_TOLERANCE and
+                         tick % FIRE_PERIOD == 0)
+
+
+POLICIES = {"idle": idle, "spin": spin, "aim": aim}
+
+
+def load_policy(name):
+    """ Return the policy called name, or the module:function it names. """
+    if name in POLICIES:
+        return POLICIES[name]
+    module, _, function = name.partition(":")
+    return getattr(importlib.import_module(module), function)
+
+
+def episode_seed(seed, episode):
+    """ Return the engine seed of an episode of the batch seeded seed. """
+    return (seed * 1000003 + episode) % 2 ** 32
+
+
+def run_episode(policy, seed, max_ticks=MAX_TICKS):
+    """ Fly one game with policy; return its score, ticks and shots. """
+    game = engine.Engine(seed)
+    game.start()
+    ship = game.get_ship()
+    held = {"thrust": False, "left": False, "right": False}
+    tick = 0
+    while game.started and tick < max_ticks:
+        thrust, turn, fire = policy(game, ship, tick)
+        wanted = {"thrust": thrust, "left": turn < 0, "right": turn > 0}
+        for command, on in wanted.items():
+            if on != held[command]:
+                if on:
+                    game.press(command)
+                else:
+                    game.release(command)
+                held[command] = on
+        if fire:
+            game.press("fire")
+        # A game over resets the score, so keep it from before the tick
+        score, shots = game.score, game.shots_fired
+        game.tick()
+        tick += 1
+        if game.started:
+            score, shots = game.score, game.shots_fired
+    return {"score": score, "ticks": tick, "shots_fired": shots}
+
+
+def run_chunk(task):
+    """ Run a chunk of episodes in a worker; return their results. """
+    policy_name, seed, episodes, max_ticks = task
+    policy = load_policy(policy_name)
+    results = []
+    for episode in episodes:
+        result = run_episode(policy, episode_seed(seed, episode), max_ticks)
+        result["episode"] = episode
+        results.append(result)
+    return results
+
+
+def run_batch(policy_name, episodes, seed=0, workers=None,
+              max_ticks=MAX_TICKS, chunk=CHUNK):
+    """ Yield the result of every episode, in the order they finish. """
+    load_policy(policy_name)  # Fail here rather than in every worker
+    tasks = [(policy_name, seed, range(start, min(start + chunk, episodes)),
+              max_ticks) for start in range(0, episodes, chunk)]
+    pool = multiprocessing.Pool(workers)
+    try:
+        for results in pool.imap_unordered(run_chunk, tasks):
+            for result in results:
+                yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run RiceRocks episodes with an autopilot.")
+    parser.add_argument("--policy", default="aim",
+                        help="one of %s, or module:function" % ", ".join(
+                            sorted(POLICIES)))
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes to use (default: one per core)")
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS)
+    args = parser.parse_args()
+
+    begin = time.time()
+    count = total_score = total_ticks = 0
+    for result in run_batch(args.policy, args.episodes, args.seed,
+                            args.workers, args.max_ticks):
+        sys.stdout.write(json.dumps(result, sort_keys=True) + "\n")
+        sys.stdout.flush()
+        count += 1
+        total_score += result["score"]
+        total_ticks += result["ticks"]
+    elapsed = time.time() - begin
+    sys.stderr.write(
+        "%i episodes in %.1f s (%.1f episodes/s, %.0f ticks/s); "
+        "mean score %.2f, mean survival %.0f ticks\n" % (
+            count, elapsed, count / elapsed, total_ticks / elapsed,
+            total_score / float(max(count, 1)),
+            total_ticks / float(max(count, 1))))
+
+
+if __name__ == "__main__":
+    main()
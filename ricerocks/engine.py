@@ -0,0 +1,595 @@
+""" Display-free simulation of RiceRocks.
+
+Engine owns everything that used to live in the draw handler and the
+rock spawning timer: physics, spawning, collisions, score and lives. It
+advances one fixed tick at a time with tick(), or by any amount of
+elapsed time with step(dt), and never touches simplegui itself, so it
+can run headless as fast as the CPU allows.
+
+Sprites live in common.ecs worlds, one per group, or in NumPy stores
+for the groups that may use one. They are drawn with an image and may
+play a sound when created; both come from the optional skins the
+renderer passes in, and stay None in headless runs.
+"""
+
+import math
+import random
+from common import atlas, ecs, profiler
+
+import pool
+import spatial
+import spawn
+import store
+
+# Canvas dimensions, sprites wrap around them
+WIDTH, HEIGHT = 800, 600
+
+# Game mechanics constants
+ANG_VEL = .03
+ACCELERATION = .035
+FRICTION = .0085
+MISSILE_SPEED = 6
+
+# Simulation clock: one tick per 60 Hz frame, and sprites have always
+# moved twice per frame
+TICK = 1 / 60.0
+SUBSTEPS = 2
+
+# Rock spawning rules, unless the engine is given another schedule
+SPAWN_INTERVAL = 1.0  # Seconds between two spawns
+ROCK_CAP = 12
+SAFE_DISTANCE = 150  # Rocks never spawn this close to a ship
+
+LIVES = 3
+
+# Side of the broad-phase grid cells, about twice the biggest radius
+COLLISION_CELL = 100
+# Below this many pairs, testing them all beats filling the grid
+BROAD_PHASE_PAIRS = 256
+
+# Keep big groups of rocks, missiles or explosions in NumPy arrays when
+# possible. Only groups whose pool holds STORE_MIN_CAPACITY sprites or
+# more are worth it: below, NumPy's per-call overhead costs more than
+# the Python loops it saves, and ECS worlds are faster
+USE_SPRITE_STORE = True
+STORE_MIN_CAPACITY = 200
+
+# How many sprites of each group may be alive at once, and what happens
+# to a spawn past that: missiles and explosions replace the oldest one,
+# rocks simply stop spawning
+POOL_SIZES = {"rocks": ROCK_CAP, "missiles": 40, "explosions": 40}
+POOL_OVERFLOW = {
+    "rocks": pool.REFUSE, "missiles": pool.DROP_OLDEST,
+    "explosions": pool.DROP_OLDEST}
+
+# Components of RiceRocks' own: ships are propelled by their thrusters
+# and slowed by friction, and some are thrusting
+PROPELLED = ecs.CUSTOM
+THRUSTING = ecs.CUSTOM << 1
+
+# What the sprites of each group are made of
+FLAGS = {
+    "ships": ecs.MOVES | ecs.WRAPS | ecs.COLLIDES | ecs.DRAWN | PROPELLED,
+    "rocks": ecs.MOVES | ecs.WRAPS | ecs.COLLIDES | ecs.DRAWN,
+    "missiles": (ecs.MOVES | ecs.WRAPS | ecs.AGES | ecs.COLLIDES |
+                 ecs.DRAWN),
+    "explosions": ecs.MOVES | ecs.WRAPS | ecs.AGES | ecs.DRAWN}
+
+
+class ImageInfo:
+    def __init__(self, center, size, radius=0, lifespan=None, animated=False,
+                 frames=1):
+        self.center = center
+        self.size = size
+        self.radius = radius
+        if lifespan:
+            self.lifespan = lifespan
+        else:
+            self.lifespan = float('inf')
+        self.animated = animated
+        # Source rectangles of the frames laid side by side in the sheet
+        self.atlas = atlas.Atlas(size, frames, first_center=center)
+
+    def get_center(self):
+        return self.center
+
+    def get_size(self):
+        return self.size
+
+    def get_radius(self):
+        return self.radius
+
+    def get_lifespan(self):
+        return self.lifespan
+
+    def get_animated(self):
+        return self.animated
+
+    def get_atlas(self):
+        return self.atlas
+
+
+# Sprite sheet geometry, which also sets radii and lifespans
+debris_info = ImageInfo([320, 240], [640, 480])
+nebula_info = ImageInfo([400, 300], [800, 600])
+splash_info = ImageInfo([WIDTH / 2, HEIGHT / 2], [WIDTH, HEIGHT])
+ship_info = ImageInfo([45, 45], [90, 90], 35, frames=2)
+missile_info = ImageInfo([5, 5], [10, 10], 2, 50)
+asteroid_info = ImageInfo([45, 45], [90, 90], 40)
+explosion_info = ImageInfo([64, 64], [128, 128], 17, 24, True, frames=24)
+
+
+# Helper functions
+def deg_to_rad(ang):
+    """ Convert degrees to radians. """
+    return ang * (math.pi / 180)
+
+
+def angle_to_vector(ang):
+    """ Given an angle, get its x and y vectors. """
+    return [math.cos(ang), math.sin(ang)]
+
+
+def dist(p, q):
+    """ Compute the distance between two points. """
+    return math.sqrt((p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2)
+
+
+def propel(world):
+    """ Accelerate the thrusting ships forward, and slow every ship. """
+    vx, vy, angle = world.vx, world.vy, world.angle
+    for row, flags in enumerate(world.flags):
+        if not flags & PROPELLED:
+            continue
+        if flags & THRUSTING:
+            vx[row] += math.cos(angle[row]) * ACCELERATION
+            vy[row] += math.sin(angle[row]) * ACCELERATION
+        # Update Ship's velocity accounting the friction
+        vx[row] *= (1 - FRICTION)
+        vy[row] *= (1 - FRICTION)
+
+
+# The systems that update each group, in order, once per substep; those
+# that return anything return the sprites that expired
+SYSTEMS = {
+    "ships": (ecs.move, propel),
+    "rocks": (ecs.move,),
+    "missiles": (ecs.move, ecs.age),
+    "explosions": (ecs.move, ecs.age)}
+
+
+class Look:
+    """ Draws a sprite with a frame of its sheet. """
+
+    def __init__(self, image, info):
+        self.image = image
+        self.frames = info.get_atlas().frames
+        self.last_frame = len(self.frames) - 1
+        self.animated = info.get_animated()
+
+    def draw(self, canvas, pos, angle, age, flags):
+        # Animated sprites show one frame of their sheet per tick of age,
+        # and the second frame of the ship's sheet shows it thrusting
+        if self.animated:
+            center, size = self.frames[min(int(age), self.last_frame)]
+        else:
+            center, size = self.frames[1 if flags & THRUSTING else 0]
+        canvas.draw_image(self.image, center, size, pos, size, angle)
+
+
+class Body(ecs.Entity):
+    """ A sprite living in a world, with the interface of the old ones. """
+
+    @property
+    def pos(self):
+        return [self.world.x[self.row], self.world.y[self.row]]
+
+    @property
+    def vel(self):
+        return [self.world.vx[self.row], self.world.vy[self.row]]
+
+    @property
+    def angle(self):
+        return self.world.angle[self.row]
+
+    @property
+    def angle_vel(self):
+        return self.world.spin[self.row]
+
+    @property
+    def age(self):
+        return self.world.age[self.row]
+
+    @property
+    def lifespan(self):
+        return self.world.lifespan[self.row]
+
+    @property
+    def radius(self):
+        return self.world.radius[self.row]
+
+    @property
+    def thrust(self):
+        return bool(self.world.flags[self.row] & THRUSTING)
+
+    def get_position(self):
+        return [self.world.x[self.row], self.world.y[self.row]]
+
+    def get_radius(self):
+        return self.world.radius[self.row]
+
+    def collide(self, other_object):
+        """ Return whether both circles overlap, across the edges too. """
+        x, y = other_object.get_position()
+        gap_x = ecs.shortest(self.world.x[self.row] - x, self.world.width)
+        gap_y = ecs.shortest(self.world.y[self.row] - y, self.world.height)
+        reach = self.radius + other_object.get_radius()
+        return reach * reach > gap_x * gap_x + gap_y * gap_y
+
+
+# Ship class
+class Ship(Body):
+    sound = None
+
+    def thrusters_on(self):
+        self.flags |= THRUSTING
+        if self.sound:
+            self.sound.rewind()
+            self.sound.play()
+
+    def thrusters_off(self):
+        self.flags &= ~THRUSTING
+        if self.sound:
+            self.sound.pause()
+
+    def increment_angle_vel(self):
+        self.world.spin[self.row] += ANG_VEL
+
+    def decrement_angle_vel(self):
+        self.world.spin[self.row] -= ANG_VEL
+
+    def shoot(self):
+        """ Return the position and velocity of a missile fired now. """
+        forward = angle_to_vector(self.angle)
+        pos, vel, radius = self.pos, self.vel, self.radius
+        missile_pos = [
+            pos[0] + radius * forward[0],
+            pos[1] + radius * forward[1]]
+        missile_vel = [
+            vel[0] + MISSILE_SPEED * forward[0],
+            vel[1] + MISSILE_SPEED * forward[1]]
+        return missile_pos, missile_vel
+
+
+# Sprite class
+class Sprite:
+    """ The state of a new sprite, as a SpriteStore copies it in. """
+
+    def __init__(self, pos, vel, ang, ang_vel, image, info, sound=None):
+        self.pos = [0, 0]
+        self.vel = [0, 0]
+        self.reset(pos, vel, ang, ang_vel, image, info, sound)
+
+    def reset(self, pos, vel, ang, ang_vel, image, info, sound=None):
+        """ Turn this sprite into a new one, reusing its lists. """
+        self.pos[0], self.pos[1] = pos[0], pos[1]
+        self.vel[0], self.vel[1] = vel[0], vel[1]
+        self.angle = ang
+        self.angle_vel = ang_vel
+        self.image = image
+        self.radius = info.get_radius()
+        self.lifespan = info.get_lifespan()
+        self.animated = info.get_animated()
+        self.frames = info.get_atlas().frames
+        self.last_frame = len(self.frames) - 1
+        self.age = 0
+        if sound:
+            sound.rewind()
+            sound.play()
+
+
+class Engine:
+    """ One independent game of RiceRocks. """
+
+    # What pressing and releasing each command does to a ship
+    COMMANDS = {
+        "thrust": (Ship.thrusters_on, Ship.thrusters_off),
+        "left": (Ship.decrement_angle_vel, Ship.increment_angle_vel),
+        "right": (Ship.increment_angle_vel, Ship.decrement_angle_vel),
+        "fire": (None, None)}
+
+    def __init__(self, seed=None, skins=None, use_store=USE_SPRITE_STORE,
+                 schedule=None, players=1):
+        """ Create a game whose randomness only depends on seed.
+
+        Without a seed, one is drawn at random and kept in self.seed,
+        so the game can still be replayed. skins maps "ship", "missile",
+        "rock" and "explosion" to an (image, sound) pair; missing
+        entries draw and play nothing. schedule is a spawn schedule, by
+        default one rock a second up to ROCK_CAP. Every player flies a
+        ship of their own, and they share the lives and the score.
+        """
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        self.players = players
+        self.rng = random.Random(seed)
+        self.skins = skins or {}
+        self.schedule = schedule or spawn.Steady(SPAWN_INTERVAL, ROCK_CAP)
+        self.spawn_area = spawn.SpawnArea(WIDTH, HEIGHT, SAFE_DISTANCE)
+        capacities = dict(POOL_SIZES, rocks=self.schedule.cap)
+        # Whether some group is big enough to go to a store
+        self.use_store = use_store and store.available() and any(
+            capacity >= STORE_MIN_CAPACITY
+            for capacity in capacities.values())
+        # Sprites of worlds are handles, recycled from one spawn to the
+        # next; those of stores are views of slots the stores recycle
+        self.pools = {}
+        for name, capacity in capacities.items():
+            self.pools[name] = pool.Pool(
+                capacity,
+                None if self.stored(capacity) else self.blank_sprite,
+                POOL_OVERFLOW[name], self.evictor(name))
+        # Stores copy sprites in, so one scratch sprite serves every spawn
+        self.scratch = Sprite([0, 0], [0, 0], 0, 0, None, missile_info)
+        self.looks = dict(
+            (kind, Look(self._skin(kind)[0], info)) for kind, info in [
+                ("ship", ship_info), ("missile", missile_info),
+                ("rock", asteroid_info), ("explosion", explosion_info)])
+        self.broad_phase = spatial.SpatialHash(COLLISION_CELL, WIDTH, HEIGHT)
+        self.accumulator = 0.0
+        self.uids = 0  # The last id given to a sprite
+        self.started = False
+        self.events = []
+        self.new_game()
+
+    def _skin(self, kind):
+        """ Return the (image, sound) pair used for kind. """
+        return self.skins.get(kind, (None, None))
+
+    @staticmethod
+    def blank_sprite():
+        """ Return a dead sprite handle, for a world to bring to life. """
+        return Body(None, None)
+
+    def stored(self, capacity):
+        """ Return whether a group of capacity sprites goes to a store. """
+        return self.use_store and capacity >= STORE_MIN_CAPACITY
+
+    def evictor(self, name):
+        """ Return a callback removing a sprite from the group name. """
+        return lambda sprite: self.remove(name, sprite)
+
+    def new_sprite_group(self, capacity=store.INITIAL_CAPACITY):
+        """ Return an empty sprite group.
+
+        Groups are backed by NumPy arrays when the engine may use a
+        sprite store and capacity is at least STORE_MIN_CAPACITY, and
+        are ECS worlds otherwise.
+        """
+        if self.stored(capacity):
+            return store.SpriteStore(WIDTH, HEIGHT, capacity)
+        return ecs.World(WIDTH, HEIGHT)
+
+    def new_game(self):
+        """ Reset score, lives and sprites, and line up the ships. """
+        self.lives, self.score, self.time = LIVES, 0, 0
+        self.schedule.reset()
+        self.shots_fired = 0
+        ships = ecs.World(WIDTH, HEIGHT)
+        self.sprites = {"ships": ships}
+        for name, members in self.pools.items():
+            members.clear()
+            self.sprites[name] = self.new_sprite_group(members.capacity)
+
+        self.ships = []
+        for player in range(self.players):
+            ship = ships.spawn(
+                FLAGS["ships"], self.looks["ship"], Ship,
+                x=WIDTH * (player + 1) / (self.players + 1), y=HEIGHT / 2,
+                radius=ship_info.get_radius())
+            ship.sound = self._skin("ship")[1]
+            self.label(ship)
+            self.ships.append(ship)
+        self.events.append("new_game")
+
+    def start(self):
+        """ Leave the splash screen and let rocks spawn. """
+        self.started = True
+
+    def get_ship(self, player=0):
+        return self.ships[player]
+
+    def press(self, command, player=0):
+        """ Apply the effect of pressing command's key. """
+        if not self.started:
+            return
+        if command == "fire":
+            self.fire(self.get_ship(player))
+        else:
+            self.COMMANDS[command][0](self.get_ship(player))
+
+    def release(self, command, player=0):
+        """ Apply the effect of releasing command's key. """
+        if self.started and command != "fire":
+            self.COMMANDS[command][1](self.get_ship(player))
+
+    def label(self, sprite):
+        """ Give sprite an id that no other sprite of the engine had. """
+        self.uids += 1
+        sprite.uid = self.uids
+
+    def place(self, name, pos, vel, ang, ang_vel, info, kind):
+        """ Add a sprite to the group name.
+
+        The group's pool must have admitted it already. Unless it goes
+        to a store, whose slots get reused, the sprite is a handle taken
+        from the pool, under a new id.
+        """
+        image, sound = self._skin(kind)
+        members = self.pools[name]
+        if isinstance(self.sprites[name], store.SpriteStore):
+            sprite = self.scratch
+            sprite.reset(pos, vel, ang, ang_vel, image, info, sound)
+            members.track(self.sprites[name].add(sprite))
+            return
+        sprite = self.sprites[name].spawn(
+            FLAGS[name], self.looks[kind], members.take(), x=pos[0], y=pos[1],
+            vx=vel[0], vy=vel[1], angle=ang, spin=ang_vel,
+            lifespan=info.get_lifespan(), radius=info.get_radius())
+        if sound:
+            sound.rewind()
+            sound.play()
+        self.label(sprite)
+        members.track(sprite)
+
+    def remove(self, name, sprite):
+        """ Take sprite out of the group name and back to its pool. """
+        self.sprites[name].discard(sprite)
+        self.pools[name].release(sprite)
+
+    def pool_stats(self):
+        """ Return the occupancy of each group's pool, by group name. """
+        return dict((name, members.stats())
+                    for name, members in self.pools.items())
+
+    def fire(self, ship):
+        """ Add a missile fired by ship. """
+        if self.pools["missiles"].admit():
+            missile_pos, missile_vel = ship.shoot()
+            self.place("missiles", missile_pos, missile_vel, ship.angle, 0,
+                       missile_info, "missile")
+        self.shots_fired += 1
+
+    def spawn_rock(self):
+        """ Add a rock away from every ship, unless the cap is reached. """
+        if not self.pools["rocks"].admit():
+            return
+        # Only rebuilt when the ships moved since the last spawn
+        self.spawn_area.update(
+            [ship.get_position() for ship in self.sprites["ships"]])
+        rng = self.rng
+        rock_pos = self.spawn_area.sample(rng)
+        if rock_pos is None:
+            return  # The ships leave no room
+        rock_vel = [rng.random() * .6 - .3, rng.random() * .6 - .3]
+        rock_avel = rng.random() * .03
+
+        self.place("rocks", rock_pos, rock_vel, 0, rock_avel,
+                   asteroid_info, "rock")
+
+    def advance_group(self, name):
+        """ Move every sprite of the group name and drop the expired ones. """
+        group = self.sprites[name]
+        if isinstance(group, store.SpriteStore):
+            group.update()
+            for sprite in group.expired():
+                self.remove(name, sprite)
+            for _ in range(SUBSTEPS - 1):
+                group.update()
+            return
+
+        if not len(group):
+            return
+        ecs.remember(group)
+        for substep in range(SUBSTEPS):
+            for system in SYSTEMS[name]:
+                expired = system(group)
+                # Sprites have always expired on the first update of a tick
+                if expired and substep == 0:
+                    for sprite in expired:
+                        self.remove(name, sprite)
+
+    def group_collide(self, name, other_name):
+        """ Explode the sprites of group name that hit one of other_name.
+
+        Sprites of the same type as the ones in the first group are
+        destroyed too. Return whether anything collided.
+        """
+        group, other_group = self.sprites[name], self.sprites[other_name]
+        collision_count = 0
+
+        # Two stores measure all their distances at once; otherwise only
+        # test the pairs that share a neighbourhood in the grid
+        if (isinstance(group, store.SpriteStore) and
+                isinstance(other_group, store.SpriteStore)):
+            pairs = group.colliding_pairs(other_group)
+        elif (isinstance(group, ecs.World) and
+                isinstance(other_group, ecs.World)):
+            candidates = None
+            if len(group) * len(other_group) >= BROAD_PHASE_PAIRS:
+                candidates = self.broad_phase.candidate_pairs(
+                    group, other_group)
+            pairs = ecs.collide(group, other_group, candidates)
+        else:
+            pairs = [pair for pair in self.broad_phase.candidate_pairs(
+                group, other_group) if pair[0].collide(pair[1])]
+
+        for sprite, other_sprite in pairs:
+            if sprite not in group or other_sprite not in other_group:
+                continue  # Already destroyed by an earlier collision
+            collision_count += 1
+            if self.pools["explosions"].admit():
+                self.place("explosions", sprite.get_position(), [0, 0],
+                           0, 0, explosion_info, "explosion")
+            self.remove(name, sprite)
+            if sprite.__class__ is other_sprite.__class__:
+                self.remove(other_name, other_sprite)
+
+        return True if collision_count > 0 else False
+
+    def tick(self):
+        """ Advance the game by exactly one frame. """
+        self.time += 1
+        for name in self.sprites:
+            self.advance_group(name)
+        profiler.mark("update")
+
+        if not self.started:
+            return
+
+        # Check for collisions
+        if self.group_collide("rocks", "ships"):
+            self.lives -= 1
+        elif self.group_collide("rocks", "missiles"):
+            self.score += 1
+        profiler.mark("collide")
+
+        # Reset game when player's out of lives
+        if self.lives == 0:
+            self.started = False
+            self.events.append("game_over")
+            self.new_game()
+            return
+
+        # Spawn as many rocks as the schedule asks for
+        for _ in range(self.schedule.due(TICK, len(self.sprites["rocks"]))):
+            self.spawn_rock()
+
+    def step(self, dt):
+        """ Advance the game by dt seconds of fixed ticks.
+
+        Leftover time is kept for the next call. Return the number of
+        ticks that ran.
+        """
+        self.accumulator += dt
+        ticks = 0
+        while self.accumulator >= TICK:
+            self.accumulator -= TICK
+            self.tick()
+            ticks += 1
+        return ticks
+
+    def draw(self, canvas, alpha=1.0):
+        """ Draw every sprite alpha of the way through the last tick. """
+        for group in self.sprites.values():
+            if isinstance(group, ecs.World):
+                ecs.render(group, canvas, alpha)
+            else:
+                for sprite in group:
+                    sprite.draw(canvas, (1 - alpha) * SUBSTEPS)
+
+    def pop_events(self):
+        """ Return and forget what happened since the last call. """
+        events, self.events = self.events, []
+        return events
@@ -0,0 +1,629 @@
+""" RiceRocks over the network: an authoritative server and its clients.
+
+The server runs the only Engine, one ship per player, and clients only
+send their input and draw what the server tells them. Everything goes
+over UDP, in datagrams that may be lost or reordered:
+
+    input     op, seq, ack, buttons held, fires so far     struct "<BIIBH"
+    snapshot  op, seq, baseline, tick, player, started,
+              lives, score, changed, removed count        struct "<BIIIBBBIHH"
+              then changed records and removed ids
+
+Clients send the whole state of their keys every frame, so a lost input
+costs nothing but latency. Fires are a running count, and the server
+fires the difference with the last count it saw.
+
+Snapshots are deltas against the last snapshot the client acknowledged,
+its baseline, which both sides keep. A record quantizes a sprite's
+position to 1/16 px, its angle to 16 bits and its velocities per tick,
+and both sides extrapolate a record the same way: a sprite is only sent
+again once it changed kind, thrust or velocity, or drifted past a
+tolerance from where its last acknowledged record puts it. Rocks and
+missiles fly straight, so once known they cost next to nothing. Each
+snapshot is cut at BUDGET bytes, ships first, then new sprites, then the
+sprites that drifted most; whatever does not fit stays different from
+the baseline and goes in a later snapshot. Bandwidth per client is thus
+at most BUDGET bytes every SEND_EVERY ticks, however many sprites fly.
+
+To try it on one machine, serve and connect game windows to it:
+
+    PYTHONPATH=. python ricerocks/netplay.py serve --port 9999
+    RICEROCKS_CONNECT=127.0.0.1:9999 PYTHONPATH=. python ricerocks/ricerocks.py
+
+or run a server and bot clients over localhost as fast as possible,
+with an optional share of snapshots dropped:
+
+    PYTHONPATH=. python ricerocks/netplay.py local --clients 2 --rocks 300
+"""
+
+import argparse
+import atexit
+import collections
+import errno
+import math
+import os
+import random
+import select
+import socket
+import struct
+import sys
+import time
+
+from common import ecs
+
+import engine
+import spawn
+
+PORT = 9999
+PLAYERS = 2
+SEND_EVERY = 2  # Ticks between two snapshots: 30 a second
+BUDGET = 1200  # Bytes a snapshot may take, below any usual MTU
+WINDOW = 64  # Snapshots a baseline may lag behind before a full resend
+MAX_PACKET = 2048
+MAX_FIRES = 4  # Shots one input packet may fire
+
+# Quantization: positions in 1/16 px, velocities in 1/256 px per tick,
+# angles in 1/65536 turn, angular velocities in 1/8192 rad per tick
+POS_SCALE = 16
+VEL_SCALE = 256
+ANGLE_SCALE = 65536 / (2 * math.pi)
+SPIN_SCALE = 8192
+# Drift past which a sprite is sent again, in px and in radians
+POS_TOLERANCE = .5
+ANGLE_TOLERANCE = .05
+
+# Packet ops
+INPUT, LEAVE, SNAPSHOT = range(1, 4)
+INPUT_PACKET = struct.Struct("<BIIBH")
+SNAPSHOT_HEADER = struct.Struct("<BIIIBBBIHH")
+# id, kind + 16 * thrust, x, y, x and y velocity, angle, spin, age
+RECORD = struct.Struct("<HBHHhhHhB")
+UID = struct.Struct("<H")
+WIRE_IDS = 65536  # Sprite ids that fit in a UID
+
+# Sprite groups in the order of their kind number, and input buttons
+KINDS = ("ships", "rocks", "missiles", "explosions")
+BUTTONS = (("thrust", 1), ("left", 2), ("right", 4))
+START = 8
+
+CONNECT = os.environ.get("RICEROCKS_CONNECT")
+
+
+def address(text):
+    """ Return the (host, port) written as host:port. """
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def quantize(sprite, kind, tick):
+    """ Return the record of sprite, of group number kind, at tick. """
+    steps = engine.SUBSTEPS
+    return (
+        kind + 16 * bool(getattr(sprite, "thrust", False)),
+        int(round(sprite.pos[0] * POS_SCALE)) % (engine.WIDTH * POS_SCALE),
+        int(round(sprite.pos[1] * POS_SCALE)) % (engine.HEIGHT * POS_SCALE),
+        clamp(int(round(sprite.vel[0] * steps * VEL_SCALE)), -32768, 32767),
+        clamp(int(round(sprite.vel[1] * steps * VEL_SCALE)), -32768, 32767),
+        int(round(sprite.angle % (2 * math.pi) * ANGLE_SCALE)) % 65536,
+        clamp(int(round(sprite.angle_vel * steps * SPIN_SCALE)),
+              -32768, 32767),
+        min(int(getattr(sprite, "age", 0)), 255),
+        tick)
+
+
+def extrapolate(record, tick):
+    """ Return the x, y, angle and age record predicts at tick. """
+    _, x, y, vx, vy, angle, spin, age, start = record
+    elapsed = tick - start
+    return ((x / float(POS_SCALE) + vx * elapsed / float(VEL_SCALE)) %
+            engine.WIDTH,
+            (y / float(POS_SCALE) + vy * elapsed / float(VEL_SCALE)) %
+            engine.HEIGHT,
+            angle / ANGLE_SCALE + spin * elapsed / float(SPIN_SCALE),
+            age + engine.SUBSTEPS * elapsed)
+
+
+def wrapped(delta, period):
+    """ Return the shortest signed distance for delta around period. """
+    return (delta + period / 2.0) % period - period / 2.0
+
+
+def drift(old, new, tick):
+    """ Return how badly the client's old record misses the new one.
+
+    Zero means the client is close enough and needs nothing.
+    """
+    if old[0] != new[0] or old[3:5] != new[3:5] or old[6] != new[6]:
+        return float("inf")
+    x, y, angle, _ = extrapolate(old, tick)
+    x_now, y_now, angle_now, _ = extrapolate(new, tick)
+    gap = math.hypot(wrapped(x - x_now, engine.WIDTH),
+                     wrapped(y - y_now, engine.HEIGHT))
+    turn = abs(wrapped(angle - angle_now, 2 * math.pi))
+    if gap <= POS_TOLERANCE and turn <= ANGLE_TOLERANCE:
+        return 0
+    return gap + turn * engine.WIDTH
+
+
+def receive_all(sock):
+    """ Yield the (data, address) of every datagram waiting on sock. """
+    while True:
+        try:
+            yield sock.recvfrom(MAX_PACKET)
+        except socket.error as error:
+            if error.errno == errno.ECONNRESET:
+                continue  # A client went away; Windows reports it here
+            if error.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            raise
+
+
+class Peer:
+    """ What the server knows about one client. """
+
+    def __init__(self, player, fires):
+        self.player = player
+        self.last_input = 0
+        self.buttons = 0
+        self.fires = fires
+        self.seq = 0  # Of the last snapshot sent
+        self.baseline_seq = 0
+        self.baseline = {}  # Record of each id, as the client has them
+        self.sent = {}  # What the client has after each unacked snapshot
+        self.bytes_sent = 0
+        self.largest = 0
+
+
+class Server:
+    def __init__(self, host="127.0.0.1", port=PORT, players=PLAYERS,
+                 seed=None, schedule=None, send_every=SEND_EVERY,
+                 budget=BUDGET):
+        """ Run a game for up to players clients, on UDP host:port.
+
+        Port 0 picks a free port; self.address tells which.
+        """
+        self.game = engine.Engine(seed, use_store=False, schedule=schedule,
+                                  players=players)
+        self.send_every = send_every
+        self.budget = budget
+        self.ticks = 0  # Unlike game.time, never goes back to zero
+        self.peers = {}  # By client address
+        # Engine uids only grow, so live sprites get wire ids of their
+        # own, from the ids no live sprite holds, longest free first
+        self.wire_ids = {}  # By uid
+        self.free_ids = collections.deque(range(WIRE_IDS))
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.setblocking(False)
+        self.address = self.socket.getsockname()
+
+    def free_player(self):
+        taken = set(peer.player for peer in self.peers.values())
+        for player in range(self.game.players):
+            if player not in taken:
+                return player
+        return None
+
+    def receive(self):
+        """ Apply the input every client sent since the last call. """
+        for data, client in receive_all(self.socket):
+            if len(data) < INPUT_PACKET.size:
+                continue
+            op, seq, ack, buttons, fires = INPUT_PACKET.unpack_from(data)
+            peer = self.peers.get(client)
+            if op == LEAVE:
+                if peer is not None:
+                    self.release_all(peer)
+                    del self.peers[client]
+                continue
+            if op != INPUT:
+                continue
+            if peer is None:
+                player = self.free_player()
+                if player is None:
+                    continue  # The game is full
+                peer = self.peers[client] = Peer(player, fires)
+            if seq <= peer.last_input:
+                continue  # Reordered behind a newer one
+            peer.last_input = seq
+            self.acknowledge(peer, ack)
+            self.apply(peer, buttons, fires)
+
+    def acknowledge(self, peer, ack):
+        """ Make the snapshot the client acknowledged its new baseline. """
+        if ack in peer.sent:
+            peer.baseline_seq, peer.baseline = ack, peer.sent[ack]
+            for seq in [seq for seq in peer.sent if seq <= ack]:
+                del peer.sent[seq]
+
+    def apply(self, peer, buttons, fires):
+        """ Turn a client's keys into commands for its ship. """
+        game, player = self.game, peer.player
+        if buttons & START and not game.started:
+            game.start()
+        if not game.started:
+            return  # Keys held now apply once the game starts
+        for command, bit in BUTTONS:
+            if buttons & bit and not peer.buttons & bit:
+                game.press(command, player)
+            elif peer.buttons & bit and not buttons & bit:
+                game.release(command, player)
+        peer.buttons = buttons
+        for _ in range(min((fires - peer.fires) % 65536, MAX_FIRES)):
+            game.press("fire", player)
+        peer.fires = fires
+
+    def release_all(self, peer):
+        for command, bit in BUTTONS:
+            if peer.buttons & bit:
+                self.game.release(command, peer.player)
+        peer.buttons = 0
+
+    def records(self):
+        """ Return the record of every sprite, by wire id. """
+        current, wire_ids = {}, {}
+        for kind, name in enumerate(KINDS):
+            for sprite in self.game.sprites[name]:
+                wire_id = self.wire_ids.pop(sprite.uid, None)
+                if wire_id is None:
+                    wire_id = self.free_ids.popleft()
+                wire_ids[sprite.uid] = wire_id
+                current[wire_id] = quantize(sprite, kind, self.ticks)
+        # What is left belonged to sprites gone since the last call
+        self.free_ids.extend(self.wire_ids.values())
+        self.wire_ids = wire_ids
+        return current
+
+    def snapshot(self, peer, current):
+        """ Return the next snapshot for peer, within the budget. """
+        if peer.seq - peer.baseline_seq > WINDOW:
+            # The client lost too many; start over from nothing
+            peer.baseline_seq, peer.baseline, peer.sent = 0, {}, {}
+        baseline = peer.baseline
+        room = (self.budget - SNAPSHOT_HEADER.size) // UID.size
+        removed = [uid for uid in baseline if uid not in current][:room]
+
+        changed = []
+        for uid, record in current.items():
+            old = baseline.get(uid)
+            error = float("inf") if old is None else drift(
+                old, record, self.ticks)
+            if error:
+                changed.append((record[0] % 16 != 0, -error, uid))
+        changed.sort()
+        room = (self.budget - SNAPSHOT_HEADER.size -
+                UID.size * len(removed)) // RECORD.size
+        changed = [uid for _, _, uid in changed[:room]]
+
+        game = self.game
+        peer.seq += 1
+        packet = [SNAPSHOT_HEADER.pack(
+            SNAPSHOT, peer.seq, peer.baseline_seq, self.ticks, peer.player,
+            game.started, clamp(game.lives, 0, 255), game.score,
+            len(changed), len(removed))]
+        state = dict(baseline)
+        for uid in changed:
+            state[uid] = current[uid]
+            packet.append(RECORD.pack(uid, *current[uid][:-1]))
+        for uid in removed:
+            del state[uid]
+            packet.append(UID.pack(uid))
+        peer.sent[peer.seq] = state
+        return b"".join(packet)
+
+    def send(self):
+        """ Send every client its snapshot. """
+        current = self.records()
+        for client, peer in self.peers.items():
+            packet = self.snapshot(peer, current)
+            peer.bytes_sent += len(packet)
+            peer.largest = max(peer.largest, len(packet))
+            try:
+                self.socket.sendto(packet, client)
+            except socket.error:
+                pass  # Lost like any other datagram
+
+    def tick(self):
+        """ Read input, advance the game one tick and send snapshots. """
+        self.receive()
+        self.game.tick()
+        self.ticks += 1
+        if "game_over" in self.game.pop_events():
+            # The new ships hold no key
+            for peer in self.peers.values():
+                peer.buttons = 0
+        if self.ticks % self.send_every == 0:
+            self.send()
+
+    def run(self, seconds=None):
+        """ Serve at 60 ticks per second, for seconds or forever. """
+        begin = time.time()
+        while seconds is None or self.ticks * engine.TICK < seconds:
+            delay = begin + self.ticks * engine.TICK - time.time()
+            if delay > 0:
+                select.select([self.socket], [], [], delay)
+                continue
+            self.tick()
+
+    def close(self):
+        self.socket.close()
+
+
+class Client:
+    def __init__(self, server, loss=0.0):
+        """ Play on the server at address server, a (host, port) pair.
+
+        loss is the share of snapshots to drop on purpose, for testing.
+        """
+        self.server = server
+        self.loss = loss
+        self.random = random.Random(0)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.seq = 0
+        self.buttons = 0
+        self.fires = 0
+        self.latest = 0  # Seq of the newest snapshot decoded
+        self.states = {0: {}}  # Records by id, after each snapshot
+        self.server_tick = 0  # Of the newest snapshot
+        self.player = None
+        self.started = False
+        self.lives = engine.LIVES
+        self.score = 0
+        self.bytes_received = 0
+        self.closed = False
+
+    def press(self, command, player=0):
+        if command == "fire":
+            self.fires = (self.fires + 1) % 65536
+        else:
+            self.buttons |= dict(BUTTONS)[command]
+
+    def release(self, command, player=0):
+        if command != "fire":
+            self.buttons &= ~dict(BUTTONS)[command]
+
+    def start(self):
+        self.buttons |= START
+
+    def send(self):
+        """ Send the keys held now, and acknowledge the newest snapshot. """
+        self.seq += 1
+        self.socket.sendto(INPUT_PACKET.pack(
+            INPUT, self.seq, self.latest, self.buttons, self.fires),
+            self.server)
+        self.buttons &= ~START
+
+    def receive(self):
+        """ Decode the snapshots that arrived; return how many did. """
+        count = 0
+        for data, _ in receive_all(self.socket):
+            if self.loss and self.random.random() < self.loss:
+                continue
+            self.bytes_received += len(data)
+            if self.decode(data):
+                count += 1
+        return count
+
+    def decode(self, data):
+        if len(data) < SNAPSHOT_HEADER.size:
+            return False
+        (op, seq, baseline, tick, player, started, lives, score, changed,
+         removed) = SNAPSHOT_HEADER.unpack_from(data)
+        if op != SNAPSHOT or seq <= self.latest or baseline not in self.states:
+            return False
+
+        state = dict(self.states[baseline])
+        offset = SNAPSHOT_HEADER.size
+        for _ in range(changed):
+            fields = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            state[fields[0]] = fields[1:] + (tick,)
+        for _ in range(removed):
+            state.pop(UID.unpack_from(data, offset)[0], None)
+            offset += UID.size
+
+        self.states[seq] = state
+        for old in [old for old in self.states
+                    if 0 < old < seq - WINDOW]:
+            del self.states[old]
+        self.latest, self.server_tick = seq, tick
+        self.player, self.started = player, bool(started)
+        self.lives, self.score = lives, score
+        return True
+
+    def update(self):
+        """ Exchange one frame's worth of packets with the server. """
+        self.receive()
+        self.send()
+
+    def entities(self, tick=None):
+        """ Return (id, group, thrust, x, y, angle, age) of every sprite.
+
+        Positions are extrapolated to tick, by default the newest one.
+        """
+        tick = self.server_tick if tick is None else tick
+        result = []
+        for uid, record in self.states[self.latest].items():
+            x, y, angle, age = extrapolate(record, tick)
+            result.append((uid, KINDS[record[0] % 16], record[0] >= 16,
+                           x, y, angle, age))
+        return result
+
+    def leave(self):
+        """ Give the player's ship back to the server, and disconnect. """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.socket.sendto(INPUT_PACKET.pack(
+                LEAVE, self.seq + 1, self.latest, 0, self.fires),
+                self.server)
+        finally:
+            self.socket.close()
+
+
+class RemoteGame(Client):
+    """ A Client that looks like an Engine to the game window. """
+
+    INFOS = {"ships": engine.ship_info, "rocks": engine.asteroid_info,
+             "missiles": engine.missile_info,
+             "explosions": engine.explosion_info}
+    SKINS = {"ships": "ship", "rocks": "rock", "missiles": "missile",
+             "explosions": "explosion"}
+
+    def __init__(self, server, skins=None):
+        Client.__init__(self, server)
+        self.skins = skins or {}
+        self.time = 0
+        self.since = 0  # Frames since the newest snapshot
+        self.drawn = {}  # Sprite drawing each id
+        self.sprites = dict((name, ecs.World(engine.WIDTH, engine.HEIGHT))
+                            for name in KINDS)
+        self.looks = dict(
+            (name, engine.Look(self.skins.get(self.SKINS[name],
+                                              (None, None))[0], info))
+            for name, info in self.INFOS.items())
+        self.events = ["new_game"]
+        atexit.register(self.leave)
+
+    def pop_events(self):
+        events, self.events = self.events, []
+        return events
+
+    def tick(self):
+        """ Exchange packets, and move the sprites to where they are now. """
+        was_started = self.started
+        if self.receive():
+            self.since = 0
+        else:
+            self.since += 1
+        self.send()
+        if was_started and not self.started:
+            self.events.extend(["game_over", "new_game"])
+        self.time = self.server_tick + self.since
+
+        # Sprites are only drawn, in between their last two positions
+        for world in self.sprites.values():
+            ecs.remember(world)
+        drawn = {}
+        for uid, name, thrust, x, y, angle, age in self.entities(self.time):
+            world = self.sprites[name]
+            sprite = self.drawn.pop(uid, None)
+            if sprite is not None and sprite.world is not world:
+                sprite.world.kill(sprite)  # The id went to another sprite
+                sprite = None
+            if sprite is None:
+                sprite = world.spawn(ecs.WRAPS | ecs.DRAWN, self.looks[name],
+                                     engine.Body, x=x, y=y, angle=angle)
+                sound = self.skins.get(self.SKINS[name], (None, None))[1]
+                if sound and name != "ships":
+                    sound.rewind()
+                    sound.play()
+            row = sprite.row
+            world.x[row], world.y[row] = x, y
+            world.angle[row], world.age[row] = angle, age
+            world.flags[row] = ecs.WRAPS | ecs.DRAWN | (
+                engine.THRUSTING if thrust else 0)
+            drawn[uid] = sprite
+        for sprite in self.drawn.values():
+            sprite.world.kill(sprite)
+        self.drawn = drawn
+
+    def draw(self, canvas, alpha=1.0):
+        """ Draw every sprite alpha of the way through the last tick. """
+        for world in self.sprites.values():
+            ecs.render(world, canvas, alpha)
+
+
+def local(clients, seconds, rocks, loss, realtime):
+    """ Play bots against a server over localhost; report what it cost. """
+    schedule = spawn.Burst(rocks) if rocks else None
+    server = Server(port=0, players=clients, seed=1, schedule=schedule)
+    bots = [Client(server.address, loss) for _ in range(clients)]
+    for bot in bots:
+        bot.press("right")
+    begin = time.time()
+    ticks = int(seconds / engine.TICK)
+    for tick in range(ticks):
+        for bot in bots:
+            if not bot.started:
+                bot.start()  # Again after every game over
+            if tick % 10 == 0:
+                bot.press("fire")
+            bot.update()
+        server.tick()
+        if realtime:
+            delay = begin + (tick + 1) * engine.TICK - time.time()
+            if delay > 0:
+                time.sleep(delay)
+    for bot in bots:
+        bot.receive()
+    elapsed = time.time() - begin
+
+    # Compare what the first client shows with the server's sprites
+    truth = server.records()
+    errors = []
+    for uid, _, _, x, y, _, _ in bots[0].entities(server.ticks):
+        if uid in truth:
+            true_x, true_y, _, _ = extrapolate(truth[uid], server.ticks)
+            errors.append(math.hypot(wrapped(x - true_x, engine.WIDTH),
+                                     wrapped(y - true_y, engine.HEIGHT)))
+    print("%i ticks in %.2f s; %i sprites on the server, %i on the client, "
+          "%i within %.1f px" % (
+              ticks, elapsed, len(truth), len(bots[0].entities()),
+              sum(error <= 2 * POS_TOLERANCE for error in errors),
+              2 * POS_TOLERANCE))
+    for index, peer in enumerate(sorted(server.peers.values(),
+                                        key=lambda peer: peer.player)):
+        print("client %i: %.0f bytes/s sent, largest snapshot %i bytes "
+              "(budget %i)" % (index, peer.bytes_sent / float(seconds),
+                               peer.largest, server.budget))
+    for bot in bots:
+        bot.leave()
+    server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve RiceRocks over UDP, or test it on localhost.")
+    commands = parser.add_subparsers(dest="command")
+    serve = commands.add_parser("serve", help="run a server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=PORT)
+    serve.add_argument("--players", type=int, default=PLAYERS)
+    serve.add_argument("--rocks", type=int, default=0,
+                       help="drop this many rocks at once, for a stress test")
+    test = commands.add_parser("local",
+                               help="play bots against a local server")
+    test.add_argument("--clients", type=int, default=2)
+    test.add_argument("--seconds", type=float, default=10)
+    test.add_argument("--rocks", type=int, default=0)
+    test.add_argument("--loss", type=float, default=0.0,
+                      help="share of snapshots the clients drop")
+    test.add_argument("--realtime", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = Server(args.host, args.port, args.players,
+                        schedule=spawn.Burst(args.rocks) if args.rocks
+                        else None)
+        sys.stderr.write("serving RiceRocks on %s:%i\n" % server.address)
+        try:
+            server.run()
+        except KeyboardInterrupt:
+            pass
+        server.close()
+    elif args.command == "local":
+        local(args.clients, args.seconds, args.rocks, args.loss,
+              args.realtime)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+""" Fixed-capacity pools for RiceRocks' short-lived sprites.
+
+A Pool caps how many members of a group are alive at once and keeps
+them in spawn order. When it is full, it either evicts the oldest member
+(DROP_OLDEST) or refuses the spawn (REFUSE). Members that are plain
+objects go back to a spare list when released and are handed out again
+by take(). The pool preallocates those spares, so a steady stream of
+spawns and removals allocates nothing.
+"""
+
+from collections import OrderedDict
+
+DROP_OLDEST = "drop_oldest"
+REFUSE = "refuse"
+
+
+class Pool:
+    def __init__(self, capacity, factory=None, overflow=DROP_OLDEST,
+                 on_evict=None):
+        """ Create a pool of capacity members.
+
+        factory builds the spare objects, or is None when members are
+        not recycled objects (like SpriteStore views). on_evict(member)
+        must remove an evicted member from its group and release it.
+        """
+        if overflow not in (DROP_OLDEST, REFUSE):
+            raise ValueError("Unknown overflow policy: %r" % (overflow,))
+        self.capacity = capacity
+        self.factory = factory
+        self.overflow = overflow
+        self.on_evict = on_evict
+        self.live = OrderedDict()
+        # (object, released) pairs; released tells a recycled object
+        # from a preallocated one that was never handed out
+        self.spare = [(factory(), False)
+                      for _ in range(capacity)] if factory else []
+        self.peak = 0
+        self.spawned = 0
+        self.created = len(self.spare)
+        self.reused = 0
+        self.dropped = 0
+        self.refused = 0
+
+    def __len__(self):
+        """ Return the number of live members. """
+        return len(self.live)
+
+    def admit(self):
+        """ Make room for one more member and return whether there is.
+
+        A full pool evicts its oldest member or refuses, depending on
+        its overflow policy.
+        """
+        if len(self.live) < self.capacity:
+            return True
+        if self.overflow == REFUSE or not self.live:
+            self.refused += 1
+            return False
+        self.dropped += 1
+        oldest = next(iter(self.live))
+        self.on_evict(oldest)
+        if oldest in self.live:
+            self.release(oldest)
+        return True
+
+    def take(self):
+        """ Return a spare object to reinitialize, building one if needed. """
+        if self.spare:
+            member, released = self.spare.pop()
+            if released:
+                self.reused += 1
+            return member
+        self.created += 1
+        return self.factory()
+
+    def track(self, member):
+        """ Count member as live, as the newest one. """
+        self.live[member] = None
+        self.spawned += 1
+        if len(self.live) > self.peak:
+            self.peak = len(self.live)
+
+    def release(self, member):
+        """ Stop tracking member and keep it as a spare if recyclable. """
+        if member in self.live:
+            del self.live[member]
+            if self.factory is not None:
+                self.spare.append((member, True))
+
+    def clear(self):
+        """ Release every live member. """
+        for member in list(self.live):
+            self.release(member)
+
+    def stats(self):
+        """ Return a dict describing the pool's occupancy. """
+        return {"capacity": self.capacity, "live": len(self.live),
+                "spare": len(self.spare), "peak": self.peak,
+                "spawned": self.spawned, "created": self.created,
+                "reused": self.reused, "dropped": self.dropped,
+                "refused": self.refused}
@@ -0,0 +1,225 @@
+""" Record RiceRocks sessions and play them back exactly.
+
+An Engine's game only depends on its seed and on the commands it gets
+between ticks; spawning runs on the tick clock, not on a timer. So a
+session is fully described by a small binary log:
+
+    header  "RRPL", version, flags, players, seed  struct "<4sBBBQ"
+    event   tick, op, player * 16 + command        struct "<IBB"
+    end     tick, END, 0, then score, shots fired  struct "<IBB", "<II"
+
+Ticks count every tick() since the recording began, across game overs.
+Recorder wraps an engine and logs what reaches it; Replay feeds a log to
+a fresh engine, at 60 ticks per second or as fast as the CPU allows. A
+log cut short, say by a crash, replays up to its last event.
+
+Set RICEROCKS_RECORD or RICEROCKS_REPLAY to a log path to record or
+watch a session in the game window, or replay a log headless:
+
+    PYTHONPATH=. python ricerocks/replay.py session.rrpl [--realtime]
+"""
+
+import argparse
+import atexit
+import os
+import struct
+import sys
+import time
+
+import engine
+
+MAGIC = b"RRPL"
+VERSION = 6  # Bumped whenever the engine would replay old logs differently
+HEADER = struct.Struct("<4sBBBQ")
+EVENT = struct.Struct("<IBB")
+TRAILER = struct.Struct("<II")
+
+# Event ops, and the commands they apply to
+PRESS, RELEASE, START, END = range(4)
+COMMANDS = ("thrust", "left", "right", "fire")
+
+# Header flags
+FLAG_STORE = 1
+
+RECORD_PATH = os.environ.get("RICEROCKS_RECORD")
+REPLAY_PATH = os.environ.get("RICEROCKS_REPLAY")
+
+
+class ReplayError(ValueError):
+    """ Raised when a log cannot be read or replays differently. """
+
+
+class Session:
+    """ Forwards everything but input and ticks to the wrapped engine. """
+
+    def __getattr__(self, name):
+        return getattr(self.game, name)
+
+
+class Recorder(Session):
+    def __init__(self, game, path):
+        """ Log every command given to game into a new file at path. """
+        if not 0 <= game.seed < 2 ** 64:
+            raise ReplayError("Only integer seeds can be recorded")
+        self.game = game
+        self.ticks = 0
+        self.log = open(path, "wb")
+        self.log.write(HEADER.pack(
+            MAGIC, VERSION, FLAG_STORE if game.use_store else 0,
+            game.players, game.seed))
+
+    def _write(self, op, command=None, player=0):
+        code = 0 if command is None else player * 16 + COMMANDS.index(command)
+        self.log.write(EVENT.pack(self.ticks, op, code))
+
+    def press(self, command, player=0):
+        self._write(PRESS, command, player)
+        self.game.press(command, player)
+
+    def release(self, command, player=0):
+        self._write(RELEASE, command, player)
+        self.game.release(command, player)
+
+    def start(self):
+        self._write(START)
+        self.game.start()
+
+    def tick(self):
+        self.ticks += 1
+        self.game.tick()
+
+    def close(self):
+        """ End the log with the final score, to check replays against. """
+        if not self.log.closed:
+            self._write(END)
+            self.log.write(TRAILER.pack(
+                self.game.score, self.game.shots_fired))
+            self.log.close()
+
+
+def read(path):
+    """ Return the header fields, events and trailer stored at path.
+
+    The trailer is None for a log that was cut short.
+    """
+    with open(path, "rb") as log:
+        data = log.read()
+    if len(data) < HEADER.size:
+        raise ReplayError("%s is not a RiceRocks log" % path)
+    magic, version, flags, players, seed = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ReplayError("%s is not a RiceRocks log" % path)
+
+    events, trailer = [], None
+    offset = HEADER.size
+    while offset + EVENT.size <= len(data):
+        tick, op, code = EVENT.unpack_from(data, offset)
+        offset += EVENT.size
+        if op == END:
+            if offset + TRAILER.size <= len(data):
+                trailer = (tick,) + TRAILER.unpack_from(data, offset)
+            break
+        events.append((tick, op, code))
+    return (flags, players, seed), events, trailer
+
+
+class Replay(Session):
+    def __init__(self, path, skins=None):
+        """ Prepare a fresh engine to replay the log at path.
+
+        Live input is ignored: press, release and start do nothing.
+        """
+        (flags, players, seed), self.events, self.trailer = read(path)
+        use_store = bool(flags & FLAG_STORE)
+        self.game = engine.Engine(seed, skins, use_store, players=players)
+        if use_store != self.game.use_store:
+            sys.stderr.write(
+                "warning: %s was recorded with NumPy sprite stores, which "
+                "are unavailable, and may replay differently\n" % path)
+        self.ticks = 0
+        self.next_event = 0
+        if self.trailer:
+            self.length = self.trailer[0]
+        else:
+            self.length = self.events[-1][0] if self.events else 0
+
+    def press(self, command, player=0):
+        pass
+
+    def release(self, command, player=0):
+        pass
+
+    def start(self):
+        pass
+
+    def done(self):
+        return self.ticks >= self.length
+
+    def tick(self):
+        """ Apply the commands logged before this tick, then tick. """
+        events, game = self.events, self.game
+        while (self.next_event < len(events) and
+               events[self.next_event][0] <= self.ticks):
+            _, op, code = events[self.next_event]
+            self.next_event += 1
+            if op == START:
+                game.start()
+            elif op == PRESS:
+                game.press(COMMANDS[code % 16], code // 16)
+            elif op == RELEASE:
+                game.release(COMMANDS[code % 16], code // 16)
+        self.ticks += 1
+        game.tick()
+
+    def run(self, realtime=False):
+        """ Replay the whole log and check it ended the same way. """
+        begin = time.time()
+        while not self.done():
+            self.tick()
+            if realtime:
+                delay = begin + self.ticks * engine.TICK - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+        if self.trailer and self.trailer[1:] != (
+                self.game.score, self.game.shots_fired):
+            raise ReplayError(
+                "replay diverged: recorded score %i and %i shots, "
+                "replayed %i and %i" % (self.trailer[1], self.trailer[2],
+                                        self.game.score,
+                                        self.game.shots_fired))
+
+
+def session(skins=None, players=1):
+    """ Return the game to play, recorded or replayed if asked to. """
+    if REPLAY_PATH:
+        return Replay(REPLAY_PATH, skins)
+    game = engine.Engine(skins=skins, players=players)
+    if RECORD_PATH:
+        game = Recorder(game, RECORD_PATH)
+        atexit.register(game.close)
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a RiceRocks log headless.")
+    parser.add_argument("log")
+    parser.add_argument("--realtime", action="store_true",
+                        help="run at 60 ticks per second")
+    args = parser.parse_args()
+
+    replay = Replay(args.log)
+    begin = time.time()
+    try:
+        replay.run(args.realtime)
+    except ReplayError as error:
+        sys.exit(str(error))
+    elapsed = time.time() - begin
+    print("%i ticks (%.1f min of play) in %.2f s, %.0f ticks/s; "
+          "score %i" % (replay.ticks, replay.ticks * engine.TICK / 60,
+                        elapsed, replay.ticks / max(elapsed, 1e-9),
+                        replay.score))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+""" Uniform-grid broad phase for RiceRocks' collision checks.
+
+Sprites are bucketed by the grid cell their center falls in. The grid
+wraps around the canvas edges the same way sprites do, so a sprite
+near one border is also reported to sprites near the opposite border.
+"""
+
+import math
+
+from common import ecs
+
+
+class SpatialHash:
+    def __init__(self, cell_size, width, height):
+        # Stretch the cells so that a whole number of them fits the
+        # canvas; otherwise the wrapped column or row would be narrower
+        self.cols = max(1, int(width // cell_size))
+        self.rows = max(1, int(height // cell_size))
+        self.cell_width = float(width) / self.cols
+        self.cell_height = float(height) / self.rows
+        self.cells = {}
+        self.max_radius = 0
+
+    def __len__(self):
+        """ Return the number of sprites in the grid. """
+        return sum(len(bucket) for bucket in self.cells.values())
+
+    def _index(self, pos):
+        """ Return the key of the cell containing pos. """
+        col = int(pos[0] // self.cell_width) % self.cols
+        row = int(pos[1] // self.cell_height) % self.rows
+        return row * self.cols + col
+
+    def _span(self, low, high, size, count):
+        """ Return the wrapped cell indexes covering [low, high]. """
+        first = int(math.floor(low / size))
+        last = int(math.floor(high / size))
+        if last - first + 1 >= count:
+            return range(count)
+        return [index % count for index in range(first, last + 1)]
+
+    def clear(self):
+        """ Remove every sprite from the grid. """
+        self.cells.clear()
+        self.max_radius = 0
+
+    def _add(self, sprite, pos, radius):
+        key = self._index(pos)
+        bucket = self.cells.get(key)
+        if bucket is None:
+            self.cells[key] = [sprite]
+        else:
+            bucket.append(sprite)
+        if radius > self.max_radius:
+            self.max_radius = radius
+
+    def insert(self, sprite):
+        """ Add sprite to the cell containing its center. """
+        self._add(sprite, sprite.get_position(), sprite.get_radius())
+
+    def rebuild(self, group):
+        """ Empty the grid and insert every sprite in group. """
+        self.clear()
+        if isinstance(group, ecs.World):
+            # Read positions straight from the world's columns
+            for sprite, x, y, radius in zip(group.entities, group.x,
+                                            group.y, group.radius):
+                self._add(sprite, (x, y), radius)
+            return
+        for sprite in group:
+            self.insert(sprite)
+
+    def query(self, pos, radius):
+        """ Return the sprites that may lie within radius of pos.
+
+        The result is a superset of the sprites whose circle overlaps
+        the circle (pos, radius); callers still run the exact test.
+        """
+        reach = radius + self.max_radius
+        cols = self._span(
+            pos[0] - reach, pos[0] + reach, self.cell_width, self.cols)
+        rows = self._span(
+            pos[1] - reach, pos[1] + reach, self.cell_height, self.rows)
+
+        found = []
+        for row in rows:
+            base = row * self.cols
+            for col in cols:
+                bucket = self.cells.get(base + col)
+                if bucket:
+                    found.extend(bucket)
+        return found
+
+    def candidate_pairs(self, group, other_group):
+        """ Return the nearby (sprite, other) pairs between two groups.
+
+        sprite always comes from group and other from other_group. The
+        grid is rebuilt from the bigger group and queried with the
+        smaller one, so the cost follows the bigger group only linearly.
+        """
+        if len(group) >= len(other_group):
+            self.rebuild(group)
+            return [(sprite, other)
+                    for other in other_group
+                    for sprite in self.query(other.get_position(),
+                                             other.get_radius())]
+        self.rebuild(other_group)
+        return [(sprite, other)
+                for sprite in group
+                for other in self.query(sprite.get_position(),
+                                        sprite.get_radius())]
@@ -0,0 +1,176 @@
+""" Where and when RiceRocks spawns rocks.
+
+SpawnArea samples rock positions uniformly from the part of the screen
+that is at least a safe distance from every ship, measuring distances on
+the torus the sprites wrap around. Instead of drawing positions until
+one lands far enough, it slices the screen into columns, works out which
+stretches of each column are allowed, and picks a column by its allowed
+length and then a point within it. A spawn therefore costs three random
+numbers and a bisection, and rebuilding the columns after the ships move
+costs one pass over them per ship.
+
+Schedules decide how many rocks spawn on each tick, up to a cap: Steady
+reproduces the old one-rock-a-second timer, Burst drops many rocks at
+once, and Waves sends growing waves, which ramps a stress test up to
+thousands of rocks without any timer.
+"""
+
+import bisect
+import math
+
+COLUMN_WIDTH = 4
+
+
+class SpawnArea:
+    def __init__(self, width, height, safe_distance,
+                 column_width=COLUMN_WIDTH):
+        self.width = width
+        self.height = height
+        self.safe_distance = safe_distance
+        self.column_width = column_width
+        self.columns = int(math.ceil(width / float(column_width)))
+        self.ships = None
+        self.segments = []  # Allowed (low, high) y ranges of each column
+        self.cumulative = []  # Allowed area up to and including a column
+
+    def _bounds(self, column):
+        """ Return the x range [left, right) covered by column. """
+        left = column * self.column_width
+        return left, min(left + self.column_width, self.width)
+
+    def _gap(self, left, right, x):
+        """ Return the torus distance from x to [left, right). """
+        if left <= x < right:
+            return 0
+        return min((left - x) % self.width, (x - right) % self.width)
+
+    def _allowed(self, column, ships):
+        """ Return the y ranges of column far enough from every ship. """
+        left, right = self._bounds(column)
+        reach = self.safe_distance
+        height = self.height
+
+        # Every ship rules out a stretch of the column, measured from the
+        # column's nearest x, and split in two when it wraps around
+        excluded = []
+        for x, y in ships:
+            gap = self._gap(left, right, x)
+            if gap >= reach:
+                continue
+            half = math.sqrt(reach * reach - gap * gap)
+            if 2 * half >= height:
+                return []
+            low, high = (y - half) % height, (y + half) % height
+            if low < high:
+                excluded.append((low, high))
+            else:
+                excluded.extend([(0, high), (low, height)])
+
+        allowed, start = [], 0
+        for low, high in sorted(excluded):
+            if low > start:
+                allowed.append((start, low))
+            start = max(start, high)
+        if start < height:
+            allowed.append((start, height))
+        return allowed
+
+    def update(self, ships):
+        """ Rebuild the columns for ships, a list of (x, y) positions. """
+        ships = [(x, y) for x, y in ships]
+        if ships == self.ships:
+            return
+        self.ships = ships
+        self.segments = [self._allowed(column, ships)
+                         for column in range(self.columns)]
+        total = 0
+        self.cumulative = []
+        for column, segments in enumerate(self.segments):
+            left, right = self._bounds(column)
+            total += (right - left) * sum(
+                high - low for low, high in segments)
+            self.cumulative.append(total)
+
+    def sample(self, rng):
+        """ Return a random allowed [x, y], or None if there is none. """
+        total = self.cumulative[-1] if self.cumulative else 0
+        if total <= 0:
+            return None
+        target = rng.random() * total
+        column = min(bisect.bisect_right(self.cumulative, target),
+                     self.columns - 1)
+        left, right = self._bounds(column)
+        x = left + rng.random() * (right - left)
+
+        segments = self.segments[column]
+        offset = rng.random() * sum(high - low for low, high in segments)
+        for low, high in segments:
+            if offset < high - low:
+                return [x, low + offset]
+            offset -= high - low
+        return [x, segments[-1][0]]  # Only reached through rounding
+
+
+class Steady:
+    """ count rocks every interval seconds, until cap rocks are alive. """
+
+    def __init__(self, interval=1.0, cap=12, count=1):
+        self.interval = interval
+        self.cap = cap
+        self.count = count
+        self.reset()
+
+    def reset(self):
+        self.clock = 0.0
+
+    def due(self, dt, alive):
+        """ Advance by dt seconds; return how many rocks spawn now. """
+        self.clock += dt
+        spawns = 0
+        while self.clock >= self.interval:
+            self.clock -= self.interval
+            spawns += self.count
+        return max(min(spawns, self.cap - alive), 0)
+
+
+class Burst(Steady):
+    """ count rocks at once, then again every interval seconds if set. """
+
+    def __init__(self, count, interval=None, cap=None):
+        Steady.__init__(self, interval, count if cap is None else cap, count)
+
+    def reset(self):
+        self.clock = 0.0
+        self.fired = False
+
+    def due(self, dt, alive):
+        if not self.fired:
+            self.fired = True
+            return max(min(self.count, self.cap - alive), 0)
+        if self.interval is None:
+            return 0
+        return Steady.due(self, dt, alive)
+
+
+class Waves:
+    """ Waves of rocks every interval seconds, each growth times bigger. """
+
+    def __init__(self, interval=10.0, first=4, growth=2.0, cap=5000):
+        self.interval = interval
+        self.first = first
+        self.growth = growth
+        self.cap = cap
+        self.reset()
+
+    def reset(self):
+        self.clock = self.interval
+        self.wave = 0
+
+    def due(self, dt, alive):
+        self.clock += dt
+        spawns = 0
+        while self.clock >= self.interval:
+            self.clock -= self.interval
+            spawns += int(round(self.first * self.growth ** self.wave))
+            self.wave += 1
+        return max(min(spawns, self.cap - alive), 0)
@@ -0,0 +1,202 @@
+""" Struct-of-arrays storage for RiceRocks' sprite groups.
+
+A SpriteStore keeps the moving state of a whole group (position,
+velocity, angle, angular velocity, age and lifespan) in contiguous NumPy
+arrays, so updating, wrapping, expiring and colliding the group each
+take one vectorized pass. It behaves like the ECS worlds the game
+keeps sprites in otherwise, and iterating it yields SpriteView objects
+that answer the same calls as a world's sprites.
+
+NumPy is optional: when it is missing, available() returns False and
+the game keeps every sprite in common.ecs worlds.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INITIAL_CAPACITY = 16
+
+
+def available():
+    """ Return whether NumPy can be imported. """
+    return np is not None
+
+
+class SpriteView(object):
+    """ A Sprite-like handle to one slot of a SpriteStore. """
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+        self.image = None
+        self.frames = None
+        self.last_frame = 0
+        self.animated = False
+
+    @property
+    def pos(self):
+        return self.store.pos[self.index]
+
+    @property
+    def vel(self):
+        return self.store.vel[self.index]
+
+    @property
+    def angle(self):
+        return self.store.angle[self.index]
+
+    @property
+    def angle_vel(self):
+        return self.store.angle_vel[self.index]
+
+    @property
+    def age(self):
+        return self.store.age[self.index]
+
+    @property
+    def lifespan(self):
+        return self.store.lifespan[self.index]
+
+    @property
+    def radius(self):
+        return self.store.radius[self.index]
+
+    def draw(self, canvas, lag=0):
+        """ Draw the sprite where it was lag updates ago. """
+        store, i = self.store, self.index
+        if self.animated:
+            center, size = self.frames[
+                min(int(store.age[i]), self.last_frame)]
+        else:
+            center, size = self.frames[0]
+        pos, angle = store.pos[i], store.angle[i]
+        if lag:
+            pos = (pos - store.vel[i] * lag) % store.bounds
+            angle = angle - store.angle_vel[i] * lag
+        canvas.draw_image(
+            self.image, center, size, pos.tolist(), size, angle)
+
+    def update(self):
+        """ Advance this slot alone; return whether it expired. """
+        store, i = self.store, self.index
+        store.angle[i] += store.angle_vel[i]
+        store.pos[i] = (store.pos[i] + store.vel[i]) % store.bounds
+        store.age[i] += 1
+        return bool(store.age[i] > store.lifespan[i])
+
+    def get_position(self):
+        return self.pos
+
+    def get_radius(self):
+        return self.radius
+
+    def collide(self, other_object):
+        half = self.store.bounds / 2
+        gap = (self.pos - other_object.get_position() + half) % \
+            self.store.bounds - half
+        reach = self.radius + other_object.get_radius()
+        return bool(reach * reach > gap[0] * gap[0] + gap[1] * gap[1])
+
+
+class SpriteStore:
+    def __init__(self, width, height, capacity=INITIAL_CAPACITY):
+        self.bounds = np.array([width, height], dtype=float)
+        self.pos = np.zeros((capacity, 2))
+        self.vel = np.zeros((capacity, 2))
+        self.angle = np.zeros(capacity)
+        self.angle_vel = np.zeros(capacity)
+        self.age = np.zeros(capacity)
+        self.lifespan = np.zeros(capacity)
+        self.radius = np.zeros(capacity)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.views = [SpriteView(self, i) for i in range(capacity)]
+        # Free slots, popped from the end so low indexes are reused first
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        """ Return the number of live sprites in the store. """
+        return len(self.views) - len(self.free)
+
+    def __iter__(self):
+        """ Iterate over a snapshot of the live sprites. """
+        views = self.views
+        return iter([views[i] for i in np.flatnonzero(self.alive)])
+
+    def __contains__(self, view):
+        return (isinstance(view, SpriteView) and view.store is self and
+                bool(self.alive[view.index]))
+
+    def _grow(self):
+        """ Double the capacity of every array. """
+        old = len(self.views)
+        for name in ("pos", "vel", "angle", "angle_vel", "age",
+                     "lifespan", "radius", "alive"):
+            array = getattr(self, name)
+            grown = np.zeros((old * 2,) + array.shape[1:], dtype=array.dtype)
+            grown[:old] = array
+            setattr(self, name, grown)
+        self.views.extend(SpriteView(self, i) for i in range(old, old * 2))
+        self.free.extend(range(old * 2 - 1, old - 1, -1))
+
+    def add(self, sprite):
+        """ Copy sprite into a free slot and return its view. """
+        if not self.free:
+            self._grow()
+        i = self.free.pop()
+        self.pos[i] = sprite.pos
+        self.vel[i] = sprite.vel
+        self.angle[i] = sprite.angle
+        self.angle_vel[i] = sprite.angle_vel
+        self.age[i] = sprite.age
+        self.lifespan[i] = sprite.lifespan
+        self.radius[i] = sprite.radius
+        self.alive[i] = True
+
+        view = self.views[i]
+        view.image = sprite.image
+        view.frames = sprite.frames
+        view.last_frame = sprite.last_frame
+        view.animated = sprite.animated
+        return view
+
+    def discard(self, view):
+        """ Free the slot behind view if it belongs to this store. """
+        if view in self:
+            self.alive[view.index] = False
+            self.free.append(view.index)
+
+    def update(self):
+        """ Advance every slot by one tick in a single pass. """
+        self.angle += self.angle_vel
+        self.pos += self.vel
+        self.pos %= self.bounds
+        self.age += 1
+
+    def expired(self):
+        """ Return the views of live sprites older than their lifespan. """
+        views = self.views
+        return [views[i] for i in
+                np.flatnonzero(self.alive & (self.age > self.lifespan))]
+
+    def colliding_pairs(self, other):
+        """ Return every (view, other_view) pair of overlapping sprites.
+
+        Distances between all live sprites of both stores are computed
+        at once, across the canvas edges too; the result is ordered
+        like nested loops over both.
+        """
+        mine = np.flatnonzero(self.alive)
+        theirs = np.flatnonzero(other.alive)
+        if not len(mine) or not len(theirs):
+            return []
+        gap = self.pos[mine][:, None, :] - other.pos[theirs][None, :, :]
+        # Sprites wrap around, so measure the short way round
+        half = self.bounds / 2
+        gap = (gap + half) % self.bounds - half
+        reach = self.radius[mine][:, None] + other.radius[theirs][None, :]
+        rows, cols = np.nonzero(
+            reach * reach > np.einsum("ijk,ijk->ij", gap, gap))
+        return [(self.views[mine[r]], other.views[theirs[c]])
+                for r, c in zip(rows.tolist(), cols.tolist())]
@@ -3,6 +3,8 @@ Try to stop the count on whole seconds to score points. """
 
 import simplegui as sg
 
+from common import profiler, textmetrics
+
 # Constants
 CTRLA_WIDTH = 85
 CANVAS_WIDTH = 300
@@ -18,18 +20,22 @@ tenths, total, correct = 0, 0, 0
 # Create frame
 frame = sg.create_frame('Stopwatch', CANVAS_WIDTH, CANVAS_HEIGHT, CTRLA_WIDTH)
 
+# Measure the stopwatch glyph by glyph instead of on every frame
+metrics = textmetrics.TextMetrics(frame)
+metrics.prewarm_digits(STOPWATCH_FONT_SIZE, CANVAS_FONT_FAMILY, ":.")
+
 # Helper functions
 def format_time(tenths):
     """ Format count with a:bc.d style. """
     a, b, c, d = 0, 0, 0, tenths
     if tenths > 9:
-        c = tenths / 10
+        c = tenths // 10
         d = str(d)[-1]
     if c > 9:
-        b = c / 10
+        b = c // 10
         c = str(c)[-1]
     if b > 5:
-        a = str(b / 6)
+        a = str(b // 6)
         b = str(b % 6)
     return "%s:%s%s.%s" % (a, b, c, d)
 
@@ -45,7 +51,7 @@ def abs_center():
     """ Return coordinates to absolutely center align the stopwatch. """
 
     # Pixels occupied by the counter on the canvas
-    stopwatch_text_width = frame.get_canvas_textwidth(
+    stopwatch_text_width = metrics.width(
         format_time(tenths), STOPWATCH_FONT_SIZE, CANVAS_FONT_FAMILY)
 
     hor_pos = (CANVAS_WIDTH - stopwatch_text_width) / 2
@@ -96,7 +102,9 @@ timer = sg.create_timer(100, count)
 
 # Register event handlers
 frame.set_canvas_background('#333')
-frame.set_draw_handler(draw)
+frame.set_draw_handler(
+    profiler.wrap_draw(draw, CANVAS_WIDTH, CANVAS_HEIGHT))
+frame.set_keydown_handler(profiler.wrap_keydown())
 frame.add_button('Start', start, CTRLA_WIDTH)
 frame.add_label('')
 frame.add_button('Stop', stop, CTRLA_WIDTH)